@@ -3,14 +3,35 @@ Home page for the Sotis Immobilier application.
 This module handles the main page layout and user interactions.
 """
 
+import time
+from concurrent.futures import TimeoutError as FutureTimeoutError
+
+import numpy as np
+import pandas as pd
 import streamlit as st
+from streamlit.runtime.scriptrunner import get_script_run_ctx
 
 from src.components.charts.plotter import PropertyPlotter
+from src.components.charts.preview import render_partition_preview
 from src.config.config import get_config
 from src.config.departments import DEFAULT_DEPARTMENT, DEPARTMENTS
 from src.config.property_types import DEFAULT_PROPERTY_TYPE, PROPERTY_TYPES
 from src.config.years import AVAILABLE_YEARS, DEFAULT_YEAR
+from src.core.data.export import TransactionFilters
+from src.core.data.filter_index import FilterIndex, clear_filter_indexes, get_filter_index
+from src.core.data.live_ingester import get_live_year
 from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.percentiles import DEPARTMENT_KEY, PercentileTable, clear_percentile_tables, get_percentile_table
+from src.core.data.progressive import (
+    PREVIEW_POLL_SECONDS,
+    get_partition_preview,
+    record_first_paint,
+    start_partition_ingestion,
+)
+from src.core.data.spatial_index import clear_spatial_indexes
+from src.core.data.transforms import get_value_column
+from src.core.monitoring.memory_governor import get_memory_governor
 
 
 def initialize_session_state():
@@ -27,12 +48,35 @@ def initialize_session_state():
         st.session_state.show_price_per_sqm = True
     if "remove_outliers" not in st.session_state:
         st.session_state.remove_outliers = True
+    if "progressive_loading" not in st.session_state:
+        st.session_state.progressive_loading = True
     if "original_data" not in st.session_state:
         st.session_state.original_data = None
+    if "filtered_data" not in st.session_state:
+        st.session_state.filtered_data = None
+
+
+def govern_memory():
+    """Record the activity of the session and free memory if the process is close to its ceiling."""
+    governor = get_memory_governor()
+    governor.register_cache(DataLoader.clear_partitions)
+    governor.register_cache(clear_spatial_indexes)
+    governor.register_cache(clear_filter_indexes)
+    governor.register_cache(clear_percentile_tables)
+
+    ctx = get_script_run_ctx()
+    if ctx is not None:
+        governor.touch(ctx.session_id, ctx.session_state)
+    governor.enforce()
 
 
 def create_sidebar():
-    """Create the sidebar with user controls."""
+    """
+    Create the sidebar with user controls.
+
+    Returns:
+        DeltaGenerator: The sidebar container of the filters on the loaded data.
+    """
     config = get_config()
     
     st.sidebar.image(
@@ -46,9 +90,10 @@ def create_sidebar():
     
     # Year selection
     st.sidebar.markdown("### 📅 Année")
+    # The year after the last published one shows the listings scraped by the live ingester
     st.session_state.selected_year = st.sidebar.selectbox(
         "Sélectionnez l'année",
-        options=AVAILABLE_YEARS,
+        options=AVAILABLE_YEARS + [get_live_year()],
         index=len(AVAILABLE_YEARS) - 1
     )
     
@@ -90,13 +135,236 @@ def create_sidebar():
         help="Supprime les valeurs extrêmes (>1.5*IQR) pour améliorer la lisibilité des visualisations"
     )
     
+    st.session_state.progressive_loading = st.sidebar.checkbox(
+        "Affichage progressif",
+        value=st.session_state.progressive_loading,
+        help="Affiche des estimations à partir des premières transactions pendant le chargement d'un nouveau département"
+    )
+
+    # Placeholder for the filters, created once the data is loaded
+    filters_container = st.sidebar.container()
+
     # Footer
     st.sidebar.markdown("---")
     st.sidebar.markdown(config["page"].footer)
 
+    return filters_container
+
+
+def create_filter_controls(container, filter_index: FilterIndex) -> dict:
+    """
+    Create the surface, price and commune filters of the loaded data.
+
+    Args:
+        container (DeltaGenerator): The sidebar container of the filters.
+        filter_index (FilterIndex): The filter index of the loaded data.
+
+    Returns:
+        dict: The "ranges" and "communes" arguments of FilterIndex.filter, only for the active filters.
+    """
+    ranges = {}
+    price_column = get_value_column(st.session_state.show_price_per_sqm)
+    with container:
+        st.markdown("### 🔎 Filtres")
+        if len(filter_index) == 0:
+            return {"ranges": ranges, "communes": []}
+
+        for column, label, unit in (
+            ("surface_reelle_bati", "Surface", "m²"),
+            (price_column, "Prix", "€/m²" if price_column == "prix_m2" else "€"),
+        ):
+            # Sliders stop at the 99th percentile, their upper end keeps everything above it
+            low, _ = filter_index.value_range(column)
+            high = max(filter_index.quantile(column, 0.99), low + 1)
+            selected_low, selected_high = st.slider(
+                f"{label} ({unit})", min_value=float(low), max_value=float(high), value=(float(low), float(high))
+            )
+            if selected_low > low or selected_high < high:
+                ranges[column] = (selected_low, selected_high if selected_high < high else np.inf)
+
+        communes = st.multiselect(
+            "Communes", options=filter_index.commune_names(), placeholder="Toutes les communes"
+        )
+
+    return {"ranges": ranges, "communes": communes}
+
+
+def get_filtered_data(filter_index: FilterIndex, filters: dict) -> pd.DataFrame:
+    """
+    Get the transactions matching the filters, kept in the session state while the filters do not change.
+
+    The filtered frame is the data owned by the session, the unfiltered partition being shared: the
+    memory governor counts it and frees it when the session is idle.
+
+    Args:
+        filter_index (FilterIndex): The filter index of the loaded data.
+        filters (dict): The "ranges" and "communes" of the active filters.
+
+    Returns:
+        pd.DataFrame: The matching transactions.
+    """
+    if not filters["ranges"] and not filters["communes"]:
+        st.session_state.filtered_data = None
+        return filter_index.filter()
+
+    key = (
+        st.session_state.selected_department,
+        st.session_state.selected_year,
+        get_partition_store().version(st.session_state.selected_department, st.session_state.selected_year),
+        st.session_state.selected_local_type,
+        sorted(filters["ranges"].items()),
+        filters["communes"],
+    )
+    if st.session_state.get("filtered_data") is None or st.session_state.get("filtered_key") != key:
+        st.session_state.filtered_data = filter_index.filter(**filters)
+        st.session_state.filtered_key = key
+    return st.session_state.filtered_data
+
+
+def create_export_controls(container, filters: dict):
+    """
+    Create the links downloading the filtered transactions and the commune statistics from the API.
+
+    The files are streamed by the API from the partition store, so they are never built in memory.
+
+    Args:
+        container (DeltaGenerator): The sidebar container of the filters.
+        filters (dict): The "ranges" and "communes" of the active filters.
+    """
+    config = get_config()["data"]
+    transaction_filters = TransactionFilters(
+        local_type=st.session_state.selected_local_type,
+        show_price_per_sqm=st.session_state.show_price_per_sqm,
+        remove_outliers=st.session_state.remove_outliers,
+        ranges=filters["ranges"],
+        communes=filters["communes"],
+    )
+    base_url = (
+        f"{config.api_url}/departments/{st.session_state.selected_department}/{st.session_state.selected_year}"
+    )
+    query = transaction_filters.to_query()
+
+    with container:
+        st.markdown("### 📥 Export")
+        col1, col2 = st.columns(2)
+        with col1:
+            st.link_button("Transactions CSV", f"{base_url}/transactions.csv?{query}", use_container_width=True)
+            st.link_button("Communes CSV", f"{base_url}/communes?{query}&format=csv", use_container_width=True)
+        with col2:
+            st.link_button(
+                "Transactions Parquet", f"{base_url}/transactions.parquet?{query}", use_container_width=True
+            )
+            st.link_button(
+                "Communes Parquet", f"{base_url}/communes?{query}&format=parquet", use_container_width=True
+            )
+
+
+def create_percentile_controls(container, percentile_table: PercentileTable, filters: dict):
+    """
+    Create the widget ranking a price among the transactions of the department, a postal code or a commune.
+
+    Args:
+        container (DeltaGenerator): The sidebar container of the filters.
+        percentile_table (PercentileTable): The percentile table of the loaded data.
+        filters (dict): The "ranges" and "communes" of the active filters.
+    """
+    value_column = get_value_column(st.session_state.show_price_per_sqm)
+    unit = "€/m²" if value_column == "prix_m2" else "€"
+    levels = {"department": "Département", "postal-codes": "Code postal", "communes": "Commune"}
+
+    with container:
+        st.markdown("### 🎯 Situer un prix")
+        level = st.radio("Comparer au niveau", list(levels), format_func=levels.get, horizontal=True)
+
+        key = DEPARTMENT_KEY
+        if level != "department":
+            options = percentile_table.keys(level, value_column)
+            if not options:
+                st.caption("Aucune transaction de ce type.")
+                return
+            # The first commune of the filters, if any, is preselected
+            selected = [commune for commune in filters["communes"] if commune in options] if level == "communes" else []
+            key = st.selectbox(levels[level], options, index=options.index(selected[0]) if selected else 0)
+
+        distribution = percentile_table.distribution(level, value_column, key)
+        if len(distribution) == 0:
+            st.caption("Aucune transaction de ce type.")
+            return
+
+        price = st.number_input(
+            f"Prix ({unit})",
+            min_value=0.0,
+            value=float(np.median(distribution)),
+            step=100.0 if value_column == "prix_m2" else 10000.0,
+        )
+        rank = float(percentile_table.rank(level, value_column, key, price))
+        st.metric("Rang centile", f"{rank:.0f}e centile")
+        st.caption(
+            f"Ce prix dépasse {rank:.0f} % des {len(distribution):,} ventes de ce type "
+            f"en {st.session_state.selected_year} (sans filtre ni suppression des valeurs extrêmes)."
+        )
+
+
+def show_partition_preview(start_time: float) -> bool:
+    """
+    Show approximate results while the selected partition loads in the background.
+
+    The run waits a little for the partition, then reruns with the latest preview until the partition
+    is stored: the estimates are refined in place as the source file downloads, the controls stay
+    responsive, and the complete visualizations finally replace the preview.
+
+    Args:
+        start_time (float): Start time of the run, to measure the time to the first results.
+
+    Returns:
+        bool: True if a preview was shown.
+    """
+    selected_dept = st.session_state.selected_department
+    selected_year = st.session_state.selected_year
+    partition = (selected_dept, selected_year)
+
+    placeholder = st.empty()
+    try:
+        ingestion = start_partition_ingestion(selected_dept, selected_year)
+        preview = get_partition_preview(selected_dept, selected_year)
+        if ingestion.done():
+            return False
+
+        with placeholder.container():
+            if preview is None:
+                st.info("⏳ Chargement du département, les premières estimations arrivent...")
+            else:
+                render_partition_preview(
+                    preview,
+                    st.session_state.selected_local_type,
+                    st.session_state.show_price_per_sqm,
+                    st.session_state.remove_outliers,
+                )
+    except Exception as e:
+        # The preview is optional: the complete load reports the errors
+        print(f"Error showing the preview: {str(e)}")
+        placeholder.empty()
+        return False
+
+    if preview is not None and st.session_state.get("previewed_partition") != partition:
+        st.session_state.previewed_partition = partition
+        record_first_paint(time.perf_counter() - start_time, "partial")
+
+    try:
+        ingestion.result(timeout=PREVIEW_POLL_SECONDS)
+    except FutureTimeoutError:
+        st.rerun()
+    except Exception:
+        # Retried and reported by the complete load
+        pass
+    placeholder.empty()
+    return True
+
 
 def main():
     """Main function to run the application."""
+    start_time = time.perf_counter()
+
     # Initialize session state
     initialize_session_state()
     
@@ -109,8 +377,17 @@ def main():
         initial_sidebar_state=config["page"].initial_sidebar_state
     )
     
+    # Keep the memory of the process under control
+    govern_memory()
+
     # Create sidebar
-    create_sidebar()
+    filters_container = create_sidebar()
+
+    # Partitions not stored yet are previewed from the first rows of their source file
+    if st.session_state.progressive_loading and not get_partition_store().exists(
+        st.session_state.selected_department, st.session_state.selected_year
+    ):
+        show_partition_preview(start_time)
     
     # Load data
     properties_data = DataLoader.fetch_data_gouv(
@@ -120,8 +397,31 @@ def main():
     
     # Store original data and create filtered version if needed
     if properties_data is not None:
-        st.session_state.original_data = properties_data.copy()
+        # The loaded partition is shared read-only between sessions, no need for a private copy
+        st.session_state.original_data = properties_data
         
+        # Filter the transactions through the shared index of the partition
+        filters = {"ranges": {}, "communes": []}
+        filter_index = get_filter_index(
+            st.session_state.selected_department,
+            st.session_state.selected_year,
+            st.session_state.selected_local_type
+        )
+        if filter_index is not None:
+            filters = create_filter_controls(filters_container, filter_index)
+            create_export_controls(filters_container, filters)
+            percentile_table = get_percentile_table(
+                st.session_state.selected_department,
+                st.session_state.selected_year,
+                st.session_state.selected_local_type
+            )
+            if percentile_table is not None:
+                create_percentile_controls(filters_container, percentile_table, filters)
+            properties_data = get_filtered_data(filter_index, filters)
+            if properties_data.empty:
+                st.warning("Aucune transaction ne correspond aux filtres sélectionnés.")
+                return
+
         # Create visualizations
         plotter = PropertyPlotter(
             properties_data=properties_data,
@@ -129,9 +429,15 @@ def main():
             selected_department=st.session_state.selected_department,
             show_price_per_sqm=st.session_state.show_price_per_sqm,
             selected_local_type=st.session_state.selected_local_type,
-            remove_outliers=st.session_state.remove_outliers
+            remove_outliers=st.session_state.remove_outliers,
+            filters=filters
         )
         plotter.create_visualization_tabs()
+        # The first paint of a previewed partition was recorded by its preview
+        if st.session_state.pop("previewed_partition", None) != (
+            st.session_state.selected_department, st.session_state.selected_year
+        ):
+            record_first_paint(time.perf_counter() - start_time, "complete")
 
 
 if __name__ == "__main__":
@@ -0,0 +1,333 @@
+"""
+Load test for the Sotis Immobilier application.
+This script serves synthetic data.gouv files from a local HTTP server, drives concurrent
+sessions of the Home page with Streamlit's AppTest, and reports the rerun latencies, the
+throughput and the resident memory of the process over time.
+
+Usage:
+    python -m benchmarks.load_test --sessions 8 --steps 20 --departments 72 75 --years 2023 2024
+"""
+
+import argparse
+import functools
+import json
+import os
+import random
+import tempfile
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+from pathlib import Path
+from typing import Dict, Iterator, List, Optional, Tuple
+from unittest.mock import MagicMock, patch
+
+import numpy as np
+
+from benchmarks.synthetic import generate_transactions, write_data_gouv_file
+from src.config.config_env import REQUIRED_ENV_VARS
+from src.config.years import AVAILABLE_YEARS
+
+HOME_PAGE = str(Path(__file__).resolve().parent.parent / "1_🏠_Home.py")
+
+# Relative frequency of the user actions between two reruns
+ACTIONS = {
+    "department": 2,
+    "year": 2,
+    "property_type": 3,
+    "price_per_sqm": 2,
+    "outliers": 1,
+}
+
+
+@dataclass
+class LoadTestResult:
+    """Measures of a load test run."""
+    latencies: List[float] = field(default_factory=list)
+    errors: List[str] = field(default_factory=list)
+    rss_samples: List[Tuple[float, int]] = field(default_factory=list)
+    duration: float = 0.0
+
+    def summary(self) -> Dict:
+        """
+        Get the aggregated figures of the run.
+
+        Returns:
+            Dict: The rerun latency percentiles (seconds), the throughput (reruns per second),
+            the number of errors and the peak and final resident memory (bytes).
+        """
+        latencies = np.array(self.latencies) if self.latencies else np.zeros(1)
+        rss = [sample for _, sample in self.rss_samples] or [0]
+        return {
+            "reruns": len(self.latencies),
+            "errors": len(self.errors),
+            "p50_seconds": float(np.percentile(latencies, 50)),
+            "p95_seconds": float(np.percentile(latencies, 95)),
+            "p99_seconds": float(np.percentile(latencies, 99)),
+            "throughput_per_second": len(self.latencies) / self.duration if self.duration else 0.0,
+            "peak_rss_bytes": max(rss),
+            "final_rss_bytes": rss[-1],
+        }
+
+
+def write_synthetic_files(root: Path, departments: List[str], years: List[int], rows: int) -> None:
+    """
+    Write synthetic files laid out as on the open data portal: {year}/departements/{dept}.csv.gz.
+
+    Args:
+        root (Path): The root directory served over HTTP.
+        departments (List[str]): The department codes.
+        years (List[int]): The years.
+        rows (int): The number of transactions per file.
+    """
+    for seed, (year, dept) in enumerate((year, dept) for year in years for dept in departments):
+        path = root / str(year) / "departements" / f"{dept}.csv.gz"
+        path.parent.mkdir(parents=True, exist_ok=True)
+        write_data_gouv_file(generate_transactions(rows, seed=seed), str(path))
+
+
+def start_file_server(root: Path) -> ThreadingHTTPServer:
+    """
+    Serve a directory over HTTP on a free local port, in a background thread.
+
+    Args:
+        root (Path): The directory to serve.
+
+    Returns:
+        ThreadingHTTPServer: The running server.
+    """
+
+    class QuietHandler(SimpleHTTPRequestHandler):
+        def log_message(self, format: str, *args) -> None:
+            pass
+
+    server = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(QuietHandler, directory=str(root)))
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    return server
+
+
+@contextmanager
+def shared_test_runtime() -> Iterator[None]:
+    """
+    Keep a Streamlit runtime available to concurrent AppTest sessions.
+
+    AppTest installs a mock runtime at the start of each run and removes it at the end, so a session
+    finishing its run would remove the runtime under the sessions still running. A shared mock
+    runtime stands in whenever no run has installed its own.
+    """
+    from streamlit.runtime import Runtime
+    from streamlit.runtime.caching.storage.dummy_cache_storage import MemoryCacheStorageManager
+    from streamlit.runtime.media_file_manager import MediaFileManager
+    from streamlit.runtime.memory_media_file_storage import MemoryMediaFileStorage
+
+    runtime = MagicMock(spec=Runtime)
+    runtime.media_file_mgr = MediaFileManager(MemoryMediaFileStorage("/mock/media"))
+    runtime.cache_storage_manager = MemoryCacheStorageManager()
+    with patch.object(Runtime, "instance", classmethod(lambda cls: cls._instance or runtime)):
+        yield
+
+
+def _find_widget(widgets, label: str):
+    """Get the widget of a list of AppTest widgets with the given label, None if it is not rendered."""
+    return next((widget for widget in widgets if widget.label == label), None)
+
+
+def _get_page_errors(app) -> List[str]:
+    """Get the messages of the errors and exceptions shown by the last run of an AppTest."""
+    return [element.value for element in app.error] + [element.message for element in app.exception]
+
+
+def run_session(
+    session_id: int, steps: int, departments: List[str], years: List[int], timeout: float, result: LoadTestResult
+) -> None:
+    """
+    Drive one session of the Home page through random user actions.
+
+    Args:
+        session_id (int): The id of the session, also the seed of its actions.
+        steps (int): The number of actions after the first run.
+        departments (List[str]): The departments the session can select.
+        years (List[int]): The years the session can select.
+        timeout (float): The maximum duration of a rerun in seconds.
+        result (LoadTestResult): The result the latencies and errors are appended to.
+    """
+    from streamlit.testing.v1 import AppTest
+
+    from src.config.property_types import PROPERTY_TYPES
+
+    rng = random.Random(session_id)
+    app = AppTest.from_file(HOME_PAGE, default_timeout=timeout)
+    # The preview reruns the page until the partition is loaded, which would be timed as a single rerun
+    app.session_state["progressive_loading"] = False
+
+    for step in range(steps + 1):
+        if step > 0:
+            action = rng.choices(list(ACTIONS), weights=list(ACTIONS.values()))[0]
+            label, value = {
+                "department": ("Sélectionnez le département", rng.choice(departments)),
+                "year": ("Sélectionnez l'année", rng.choice(years)),
+                "property_type": ("Sélectionnez le type de bien", rng.choice(list(PROPERTY_TYPES))),
+                "price_per_sqm": ("Afficher les prix au m²", None),
+                "outliers": ("Supprimer les valeurs extrêmes", None),
+            }[action]
+            widget = _find_widget(app.selectbox if value is not None else app.checkbox, label)
+            if widget is None:
+                result.errors.append(f"session {session_id}, step {step}: widget not rendered: {label}")
+            elif value is not None:
+                widget.select(value)
+            else:
+                widget.set_value(not widget.value)
+
+        start = time.perf_counter()
+        try:
+            app.run()
+        except Exception as e:
+            result.errors.append(f"session {session_id}, step {step}: {e}")
+            continue
+        result.latencies.append(time.perf_counter() - start)
+        result.errors.extend(f"session {session_id}, step {step}: {message}" for message in _get_page_errors(app))
+
+
+def sample_rss(result: LoadTestResult, stop: threading.Event, interval: float, start: float) -> None:
+    """
+    Record the resident memory of the process until stopped.
+
+    Args:
+        result (LoadTestResult): The result the samples are appended to.
+        stop (threading.Event): Set to stop sampling.
+        interval (float): Time between two samples in seconds.
+        start (float): Start time of the run, samples are timed relative to it.
+    """
+    from src.core.monitoring.memory_governor import get_process_rss
+
+    while not stop.is_set():
+        result.rss_samples.append((time.perf_counter() - start, get_process_rss()))
+        stop.wait(interval)
+
+
+def run_load_test(
+    sessions: int,
+    steps: int,
+    departments: List[str],
+    years: List[int],
+    rows: int,
+    timeout: float = 120.0,
+    rss_interval: float = 1.0,
+) -> LoadTestResult:
+    """
+    Run a load test against a local stand-in of the open data portal.
+
+    The partitions are cached in a temporary directory, so the first sessions also measure the
+    download and ingestion of the files. The files of the default year of the page are always
+    served, and the sessions load their partitions without the progressive preview.
+
+    Args:
+        sessions (int): The number of concurrent sessions.
+        steps (int): The number of actions per session.
+        departments (List[str]): The department codes served.
+        years (List[int]): The years served.
+        rows (int): The number of transactions per file.
+        timeout (float): The maximum duration of a rerun in seconds.
+        rss_interval (float): Time between two memory samples in seconds.
+
+    Returns:
+        LoadTestResult: The measures of the run.
+    """
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        data_dir = Path(tmp_dir) / "data"
+        # The first run of every session selects the default year of the page
+        write_synthetic_files(data_dir, departments, sorted(set(years) | {AVAILABLE_YEARS[-1]}), rows)
+        server = start_file_server(data_dir)
+        server_url = f"http://127.0.0.1:{server.server_address[1]}"
+
+        # The configuration is read from the environment, before the app modules are imported
+        os.environ["DATA_GOUV_URL"] = server_url
+        os.environ["CACHE_DIR"] = str(Path(tmp_dir) / "cache")
+        # The logo is a URL the page passes to the browser, a missing file does not matter
+        if not os.environ.get("AWS_S3_URL"):
+            os.environ["AWS_S3_URL"] = server_url
+        for name in REQUIRED_ENV_VARS:
+            os.environ.setdefault(name, "")
+
+        result = LoadTestResult()
+        stop = threading.Event()
+        start = time.perf_counter()
+        sampler = threading.Thread(target=sample_rss, args=(result, stop, rss_interval, start), daemon=True)
+        sampler.start()
+
+        try:
+            with shared_test_runtime(), ThreadPoolExecutor(max_workers=sessions) as executor:
+                futures = [
+                    executor.submit(run_session, session_id, steps, departments, years, timeout, result)
+                    for session_id in range(sessions)
+                ]
+                for future in futures:
+                    future.result()
+        finally:
+            result.duration = time.perf_counter() - start
+            stop.set()
+            sampler.join()
+            server.shutdown()
+
+    return result
+
+
+def print_report(result: LoadTestResult, rss_interval: Optional[float] = None) -> None:
+    """
+    Print the figures of a load test run.
+
+    Args:
+        result (LoadTestResult): The measures of the run.
+        rss_interval (Optional[float]): Time between two printed memory samples, all of them if None.
+    """
+    summary = result.summary()
+    print(f"Reruns: {summary['reruns']}, errors: {summary['errors']}, duration: {result.duration:.1f} s")
+    print(
+        f"Rerun latency: p50 {summary['p50_seconds'] * 1000:,.0f} ms, "
+        f"p95 {summary['p95_seconds'] * 1000:,.0f} ms, p99 {summary['p99_seconds'] * 1000:,.0f} ms"
+    )
+    print(f"Throughput: {summary['throughput_per_second']:.2f} reruns/s")
+    print(f"RSS: peak {summary['peak_rss_bytes'] / 1e6:,.0f} MB, final {summary['final_rss_bytes'] / 1e6:,.0f} MB")
+
+    print("RSS over time:")
+    next_time = 0.0
+    for elapsed, rss in result.rss_samples:
+        if rss_interval is None or elapsed >= next_time:
+            print(f"  {elapsed:>7.1f} s {rss / 1e6:>10,.0f} MB")
+            next_time = elapsed + (rss_interval or 0.0)
+
+    for error in result.errors[:10]:
+        print(f"  error: {error}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Load test the Home page with concurrent simulated sessions.")
+    parser.add_argument("--sessions", type=int, default=8, help="Number of concurrent sessions")
+    parser.add_argument("--steps", type=int, default=20, help="Number of actions per session")
+    parser.add_argument("--departments", nargs="*", default=["72", "75"], help="Department codes served")
+    parser.add_argument("--years", nargs="*", type=int, default=[2023, 2024], help="Years served")
+    parser.add_argument("--rows", type=int, default=20_000, help="Transactions per synthetic file")
+    parser.add_argument("--timeout", type=float, default=120.0, help="Maximum duration of a rerun (seconds)")
+    parser.add_argument("--rss-interval", type=float, default=1.0, help="Time between memory samples (seconds)")
+    parser.add_argument("--output", help="Write the summary and the raw measures to this JSON file")
+    args = parser.parse_args()
+
+    load_test_result = run_load_test(
+        args.sessions, args.steps, args.departments, args.years, args.rows, args.timeout, args.rss_interval
+    )
+    print_report(load_test_result, rss_interval=max(args.rss_interval, 5.0))
+
+    if args.output:
+        with open(args.output, "w") as file:
+            json.dump(
+                {
+                    "summary": load_test_result.summary(),
+                    "latencies": load_test_result.latencies,
+                    "rss_samples": load_test_result.rss_samples,
+                    "errors": load_test_result.errors,
+                },
+                file,
+                indent=2,
+            )
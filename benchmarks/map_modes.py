@@ -0,0 +1,86 @@
+"""
+Map modes benchmark for the Sotis Immobilier application.
+This script measures, for each map mode, the server time to build what is sent to the browser
+and the size of the payload, on synthetic transactions.
+
+Usage:
+    python -m benchmarks.map_modes --sizes 10000 50000 200000
+"""
+
+import argparse
+import time
+from typing import Callable, List, Tuple
+
+from benchmarks.synthetic import generate_transactions
+from src.components.charts.deck_map import build_deck_payload, render_deck_map
+from src.components.charts.plotter import PropertyPlotter
+from src.core.data.transforms import get_value_column
+
+
+def measure(build: Callable[[], str], repeat: int) -> Tuple[float, int]:
+    """
+    Measure the build time and the size of a payload.
+
+    Args:
+        build (Callable[[], str]): Function building the payload sent to the browser.
+        repeat (int): The number of runs, the fastest one is kept.
+
+    Returns:
+        Tuple[float, int]: The build time in seconds and the payload size in bytes.
+    """
+    timings = []
+    for _ in range(repeat):
+        start = time.perf_counter()
+        payload = build()
+        timings.append(time.perf_counter() - start)
+    return min(timings), len(payload.encode("utf-8"))
+
+
+def run(sizes: List[int], repeat: int, max_clustered_points: int) -> List[Tuple[int, str, float, int]]:
+    """
+    Benchmark the map modes.
+
+    Args:
+        sizes (List[int]): The numbers of transactions.
+        repeat (int): The number of runs of each measure.
+        max_clustered_points (int): Above this size, the clustered map (one marker per row) is skipped.
+
+    Returns:
+        List[Tuple[int, str, float, int]]: One (size, mode, seconds, bytes) row per measure.
+    """
+    results = []
+    for size in sizes:
+        transactions = generate_transactions(size, property_types=["Appartement"])
+        plotter = PropertyPlotter(
+            transactions, 2024, "75", show_price_per_sqm=True, selected_local_type="Appartement"
+        )
+        value_column = get_value_column(plotter.show_price_per_sqm)
+
+        # Plotly figures are sent to the browser as their JSON serialization
+        modes = {
+            "Points (plotly)": lambda: plotter._create_scatter_map(plotter._prepare_map_data()).to_json(),
+            "GPU (deck.gl)": lambda: render_deck_map(build_deck_payload(plotter.properties_data, value_column)),
+        }
+        if size <= max_clustered_points:
+            modes["Groupement (folium)"] = lambda: plotter._create_clustered_map(
+                plotter._prepare_map_data()
+            )._repr_html_()
+
+        for mode, build in modes.items():
+            seconds, payload_bytes = measure(build, repeat)
+            results.append((size, mode, seconds, payload_bytes))
+            print(f"{size:>9,} {mode:<22} {seconds * 1000:>10,.0f} ms {payload_bytes / 1e6:>10,.1f} MB")
+    return results
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Benchmark the build time and payload size of the map modes.")
+    parser.add_argument("--sizes", nargs="*", type=int, default=[10_000, 50_000, 200_000], help="Numbers of points")
+    parser.add_argument("--repeat", type=int, default=3, help="Runs per measure, the fastest is kept")
+    parser.add_argument(
+        "--max-clustered-points", type=int, default=50_000, help="Skip the clustered map above this size"
+    )
+    args = parser.parse_args()
+
+    print(f"{'Points':>9} {'Mode':<22} {'Build':>13} {'Payload':>13}")
+    run(args.sizes, args.repeat, args.max_clustered_points)
@@ -0,0 +1,73 @@
+"""
+Synthetic data module for the Sotis Immobilier benchmarks.
+This module generates transactions shaped like the cleaned data.gouv partitions, so that the
+benchmarks run without network access and at any volume.
+"""
+
+from typing import Optional, Sequence
+
+import numpy as np
+import pandas as pd
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.transforms import DATA_GOUV_COLUMNS
+
+# Center and spread (degrees) of the generated coordinates, around Paris by default
+DEFAULT_CENTER = (48.8566, 2.3522)
+DEFAULT_SPREAD = 0.25
+
+
+def generate_transactions(
+    n_rows: int,
+    seed: int = 0,
+    property_types: Optional[Sequence[str]] = None,
+    center: tuple = DEFAULT_CENTER,
+    spread: float = DEFAULT_SPREAD,
+    n_communes: int = 100,
+) -> pd.DataFrame:
+    """
+    Generate cleaned transactions.
+
+    Args:
+        n_rows (int): The number of transactions.
+        seed (int): The seed of the random generator.
+        property_types (Optional[Sequence[str]]): The property types to draw from. Defaults to all of them.
+        center (tuple): The latitude and longitude around which transactions are located.
+        spread (float): The standard deviation of the coordinates in degrees.
+        n_communes (int): The number of distinct communes.
+
+    Returns:
+        pd.DataFrame: The transactions, with the columns of the data.gouv partitions.
+    """
+    rng = np.random.default_rng(seed)
+    property_types = list(property_types or PROPERTY_TYPES)
+
+    # Each commune has its own price level, so that the aggregates are not flat
+    commune_ids = rng.integers(0, n_communes, size=n_rows)
+    commune_price_levels = rng.lognormal(mean=8.3, sigma=0.35, size=n_communes)
+    surfaces = np.round(rng.lognormal(mean=4.0, sigma=0.45, size=n_rows))
+    prices = np.round(surfaces * commune_price_levels[commune_ids] * rng.lognormal(0.0, 0.25, size=n_rows), -2)
+
+    transactions = pd.DataFrame(
+        {
+            "type_local": rng.choice(property_types, size=n_rows),
+            "valeur_fonciere": prices,
+            "code_postal": (75001 + commune_ids % 20 + 100 * (commune_ids // 20)).astype(str),
+            "nom_commune": np.char.add("Commune ", commune_ids.astype(str)),
+            "surface_reelle_bati": np.maximum(surfaces, 9.0),
+            "longitude": rng.normal(center[1], spread, size=n_rows),
+            "latitude": rng.normal(center[0], spread * 0.7, size=n_rows),
+        }
+    )
+    return transactions[DATA_GOUV_COLUMNS].sort_values("code_postal", ignore_index=True)
+
+
+def write_data_gouv_file(transactions: pd.DataFrame, path: str) -> None:
+    """
+    Write transactions as a gzipped CSV file shaped like the files of the open data portal.
+
+    Args:
+        transactions (pd.DataFrame): The transactions.
+        path (str): The destination, e.g. "2024/departements/75.csv.gz".
+    """
+    transactions.to_csv(path, index=False, compression="gzip")
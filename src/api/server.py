@@ -0,0 +1,601 @@
+"""
+Headless API module for the Sotis Immobilier application.
+This module serves the department and commune aggregates and the raw partitions over HTTP,
+reading from the same partition store as the Streamlit app.
+
+Usage:
+    python -m src.api.server --port 8502
+"""
+
+import argparse
+import gzip
+import hashlib
+import io
+import json
+import re
+import traceback
+from functools import lru_cache
+from http import HTTPStatus
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any, Dict, Iterable, Optional
+from urllib.parse import parse_qs, urlparse
+
+import pandas as pd
+import pyarrow as pa
+import requests
+from PIL import Image
+
+from src.config.property_types import DEFAULT_PROPERTY_TYPE, PROPERTY_TYPES
+from src.core.data.aggregates import load_partition_aggregate
+from src.core.data.artifacts import slugify
+from src.core.data.export import (
+    EXPORT_FORMATS,
+    TransactionFilters,
+    compute_filtered_statistics,
+    get_transactions_schema,
+    iter_export_chunks,
+    iter_filtered_transactions,
+)
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.percentiles import PERCENTILE_LEVELS, load_percentile_table
+from src.core.data.transforms import (
+    compute_commune_statistics,
+    compute_postal_code_statistics,
+    get_value_column,
+    remove_outliers,
+    select_property_type,
+)
+from src.core.geo.communes import GEOMETRY_LEVELS, get_geometry_path, load_commune_geometries
+from src.core.monitoring.metrics import read_snapshots, render_prometheus
+from src.core.tiles.builder import TILE_LAYERS, TILE_SIZE, get_tile_metadata, get_tiles_dir
+
+# Routes of the API, matched against the request path
+PARTITION_ROUTE = re.compile(r"^/departments/(?P<dept>[0-9AB]{2,3})/(?P<year>\d{4})/(?P<resource>[\w.-]+)$")
+
+TILE_ROUTE = re.compile(
+    r"^/tiles/(?P<year>\d{4})/(?P<dept>[0-9AB]{2,3})/(?P<type>[a-z0-9_]+)/(?P<layer>[a-z0-9_]+)"
+    r"/(?P<z>\d+)/(?P<x>\d+)/(?P<y>\d+)\.png$"
+)
+
+GEOMETRY_ROUTE = re.compile(r"^/geometries/(?P<dept>[0-9AB]{2,3})/communes/(?P<level>[a-z]+)\.geojson$")
+
+# Responses smaller than this are never compressed (bytes)
+GZIP_MIN_SIZE = 1024
+
+# Largest accepted request body (bytes)
+MAX_REQUEST_BYTES = 8 * 1024 * 1024
+
+# Browser cache lifetime of the map tiles (seconds)
+TILE_MAX_AGE = 3600
+
+# Browser cache lifetime of the commune geometries, which only change with the boundaries (seconds)
+GEOMETRY_MAX_AGE = 7 * 24 * 3600
+
+
+@lru_cache(maxsize=1)
+def get_empty_tile() -> bytes:
+    """
+    Get a transparent PNG tile, served where there is no transaction.
+
+    Returns:
+        bytes: The PNG file.
+    """
+    buffer = io.BytesIO()
+    Image.new("RGBA", (TILE_SIZE, TILE_SIZE)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+class ApiError(Exception):
+    """Error returned to the client with an HTTP status."""
+
+    def __init__(self, status: HTTPStatus, message: str):
+        """
+        Initialize the ApiError.
+
+        Args:
+            status (HTTPStatus): The HTTP status of the response.
+            message (str): The error message.
+        """
+        super().__init__(message)
+        self.status = status
+        self.message = message
+
+
+@lru_cache(maxsize=128)
+def compute_aggregate(
+    resource: str,
+    selected_dept: str,
+    selected_year: int,
+    selected_local_type: str,
+    show_price_per_sqm: bool,
+    remove_extreme_values: bool,
+    version: str,
+) -> pd.DataFrame:
+    """
+    Compute the statistics of a partition, as displayed in the Streamlit tabs.
+
+    Args:
+        resource (str): "postal-codes" or "communes".
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        selected_local_type (str): The property type.
+        show_price_per_sqm (bool): Whether to aggregate prices per square meter.
+        remove_extreme_values (bool): Whether to remove outliers before aggregating.
+        version (str): Version of the stored partition, part of the cache key only.
+
+    Returns:
+        pd.DataFrame: The aggregated statistics.
+    """
+    aggregate = load_partition_aggregate(
+        resource, selected_dept, selected_year, selected_local_type, show_price_per_sqm, remove_extreme_values
+    )
+    if aggregate is not None:
+        return aggregate
+
+    properties_data = select_property_type(get_partition_store().read(selected_dept, selected_year), selected_local_type)
+    value_column = get_value_column(show_price_per_sqm)
+    if remove_extreme_values:
+        properties_data = remove_outliers(properties_data, value_column)
+
+    if resource == "postal-codes":
+        return compute_postal_code_statistics(properties_data, value_column)
+    return compute_commune_statistics(properties_data, value_column)
+
+
+class ApiRequestHandler(BaseHTTPRequestHandler):
+    """Request handler of the headless API."""
+
+    protocol_version = "HTTP/1.1"
+    server_version = "SotisImmoAPI/1.0"
+
+    def handle_one_request(self) -> None:
+        """Handle a request, on a connection which may be reused for the next ones."""
+        self._response_started = False
+        super().handle_one_request()
+
+    def do_GET(self) -> None:
+        """Handle a GET request."""
+        url = urlparse(self.path)
+        try:
+            if url.path == "/health":
+                self._send_json({"status": "ok"})
+                return
+
+            if url.path == "/metrics":
+                self._send_text(render_prometheus(read_snapshots()), "text/plain; version=0.0.4")
+                return
+
+            match = TILE_ROUTE.match(url.path)
+            if match is not None:
+                self._handle_tile_request(match)
+                return
+
+            match = GEOMETRY_ROUTE.match(url.path)
+            if match is not None:
+                self._handle_geometry_request(match["dept"], match["level"])
+                return
+
+            match = PARTITION_ROUTE.match(url.path)
+            if match is None:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown route: {url.path}")
+
+            self._handle_partition_request(
+                match["dept"], int(match["year"]), match["resource"], parse_qs(url.query)
+            )
+        except ApiError as e:
+            self._send_json({"error": e.message}, status=e.status)
+        except Exception:
+            self._send_internal_error()
+
+    def do_POST(self) -> None:
+        """Handle a POST request."""
+        url = urlparse(self.path)
+        try:
+            match = PARTITION_ROUTE.match(url.path)
+            if match is None or match["resource"] != "percentiles":
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown route: {url.path}")
+
+            self._handle_percentile_request(match["dept"], int(match["year"]), self._read_json_body())
+        except ApiError as e:
+            self._send_json({"error": e.message}, status=e.status)
+        except Exception:
+            self._send_internal_error()
+
+    def _handle_partition_request(
+        self, selected_dept: str, selected_year: int, resource: str, query: Dict[str, list]
+    ) -> None:
+        """
+        Serve an aggregate or the raw transactions of a partition.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            resource (str): The requested resource.
+            query (Dict[str, list]): The parsed query string.
+        """
+        # Raw transactions are exported whole unless outliers are explicitly removed
+        try:
+            filters = TransactionFilters.from_query(
+                query, DEFAULT_PROPERTY_TYPE, default_remove_outliers=not resource.startswith("transactions.")
+            )
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid filter: {e}") from e
+        if filters.local_type not in PROPERTY_TYPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown property type: {filters.local_type}")
+        output_format = self._get_param(query, "format", "json")
+
+        version = self._ensure_partition(selected_dept, selected_year)
+        etag = self._build_etag(self.path, version)
+        is_json = not resource.startswith("transactions.") and output_format not in EXPORT_FORMATS
+        if self._send_not_modified_if_match(etag, json_variants=is_json):
+            return
+
+        if resource.startswith("transactions."):
+            output_format = resource.split(".", 1)[1]
+            if output_format not in EXPORT_FORMATS:
+                raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown resource: {resource}")
+            self._send_stream(
+                iter_export_chunks(
+                    iter_filtered_transactions(selected_dept, selected_year, filters),
+                    output_format,
+                    get_transactions_schema(selected_dept, selected_year),
+                ),
+                EXPORT_FORMATS[output_format][0],
+                etag,
+                filename=f"transactions_{selected_dept}_{selected_year}_{slugify(filters.local_type)}.{output_format}",
+            )
+            return
+
+        if resource not in ("postal-codes", "communes"):
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown resource: {resource}")
+
+        if filters.is_default:
+            aggregate = compute_aggregate(
+                resource,
+                selected_dept,
+                selected_year,
+                filters.local_type,
+                filters.show_price_per_sqm,
+                filters.remove_outliers,
+                version,
+            )
+        else:
+            aggregate = compute_filtered_statistics(resource, selected_dept, selected_year, filters)
+
+        if output_format in EXPORT_FORMATS:
+            self._send_stream(
+                iter_export_chunks(pa.Table.from_pandas(aggregate, preserve_index=False), output_format),
+                EXPORT_FORMATS[output_format][0],
+                etag,
+                filename=f"{resource}_{selected_dept}_{selected_year}_{slugify(filters.local_type)}.{output_format}",
+            )
+        else:
+            self._send_json(
+                {
+                    "department": selected_dept,
+                    "year": selected_year,
+                    "type": filters.local_type,
+                    "value_column": get_value_column(filters.show_price_per_sqm),
+                    "rows": json.loads(aggregate.to_json(orient="records")),
+                },
+                etag=etag,
+            )
+
+    def _handle_percentile_request(self, selected_dept: str, selected_year: int, body: Dict) -> None:
+        """
+        Serve the percentile ranks of a batch of prices among the transactions of a partition.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            body (Dict): The request, with "values" (the prices), "level" ("department", "postal-codes"
+                or "communes"), "keys" (the postal code or commune of each price, unless the level is
+                "department"), "type" and "price" ("m2" or "total").
+        """
+        local_type = body.get("type", DEFAULT_PROPERTY_TYPE)
+        if local_type not in PROPERTY_TYPES:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown property type: {local_type}")
+        level = body.get("level", "department")
+        if level not in PERCENTILE_LEVELS:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Unknown level: {level}")
+
+        values, keys = body.get("values"), body.get("keys")
+        if not isinstance(values, list):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "The values must be a list of prices")
+        if level != "department" and (not isinstance(keys, list) or len(keys) != len(values)):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "The keys must be a list with one key per value")
+
+        value_column = get_value_column(body.get("price", "m2") == "m2")
+        version = self._ensure_partition(selected_dept, selected_year)
+        percentile_table = load_percentile_table(selected_dept, selected_year, local_type, version)
+        try:
+            ranks = percentile_table.rank_batch(level, value_column, keys, values)
+        except (TypeError, ValueError) as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid values: {e}") from e
+
+        self._send_json(
+            {
+                "department": selected_dept,
+                "year": selected_year,
+                "type": local_type,
+                "value_column": value_column,
+                "level": level,
+                "ranks": [None if pd.isna(rank) else round(float(rank), 2) for rank in ranks],
+            }
+        )
+
+    def _handle_tile_request(self, match: re.Match) -> None:
+        """
+        Serve a pre-rendered map tile, or a transparent tile where there is no transaction.
+
+        Args:
+            match (re.Match): The match of the tile route.
+        """
+        local_types = {slugify(local_type): local_type for local_type in PROPERTY_TYPES}
+        if match["type"] not in local_types or match["layer"] not in TILE_LAYERS:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown tile layer: {match['type']}/{match['layer']}")
+
+        selected_dept, selected_year = match["dept"], int(match["year"])
+        local_type, layer = local_types[match["type"]], match["layer"]
+        metadata = get_tile_metadata(selected_dept, selected_year, local_type, layer)
+        if metadata is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No data for department {selected_dept} in {selected_year}")
+
+        tiles_dir = get_tiles_dir(selected_dept, selected_year, local_type, layer)
+        tile_path = tiles_dir / match["z"] / match["x"] / f"{match['y']}.png"
+        etag = self._build_etag(self.path, get_partition_store().version(selected_dept, selected_year))
+        if self._send_not_modified_if_match(etag):
+            return
+
+        body = tile_path.read_bytes() if tile_path.exists() else get_empty_tile()
+
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", "image/png")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Cache-Control", f"public, max-age={TILE_MAX_AGE}")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        self.send_header("ETag", etag)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _handle_geometry_request(self, selected_dept: str, level: str) -> None:
+        """
+        Serve a simplification level of the commune boundaries of a department.
+
+        Args:
+            selected_dept (str): The department code.
+            level (str): A key of GEOMETRY_LEVELS.
+        """
+        if level not in GEOMETRY_LEVELS:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"Unknown geometry level: {level}")
+
+        geometries = load_commune_geometries(selected_dept, level)
+        if geometries is None:
+            raise ApiError(HTTPStatus.NOT_FOUND, f"No commune boundaries for department {selected_dept}")
+
+        etag = self._build_etag(self.path, str(get_geometry_path(selected_dept, level).stat().st_mtime_ns))
+        if self._send_not_modified_if_match(etag, json_variants=True):
+            return
+        self._send_json(geometries, etag=etag, max_age=GEOMETRY_MAX_AGE)
+
+    @staticmethod
+    def _ensure_partition(selected_dept: str, selected_year: int) -> str:
+        """
+        Make sure a partition is in the store, loading it from its source if needed.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            str: The version of the stored partition.
+        """
+        try:
+            return get_partition_store().ensure(selected_dept, selected_year, DataLoader.ingest_partition)
+        except requests.RequestException as e:
+            raise ApiError(
+                HTTPStatus.NOT_FOUND, f"No data for department {selected_dept} in {selected_year}: {e}"
+            ) from e
+
+    def _read_json_body(self) -> Dict:
+        """
+        Read the JSON object sent as the body of the request.
+
+        Returns:
+            Dict: The parsed body.
+        """
+        length = int(self.headers.get("Content-Length", 0))
+        if length > MAX_REQUEST_BYTES:
+            # The body is left unread, the connection cannot be reused
+            self.close_connection = True
+            raise ApiError(HTTPStatus.REQUEST_ENTITY_TOO_LARGE, f"Request body larger than {MAX_REQUEST_BYTES} bytes")
+        try:
+            body = json.loads(self.rfile.read(length) or b"{}")
+        except ValueError as e:
+            raise ApiError(HTTPStatus.BAD_REQUEST, f"Invalid JSON body: {e}") from e
+        if not isinstance(body, dict):
+            raise ApiError(HTTPStatus.BAD_REQUEST, "The body must be a JSON object")
+        return body
+
+    @staticmethod
+    def _get_param(query: Dict[str, list], name: str, default: str) -> str:
+        """Get the first value of a query string parameter."""
+        return query.get(name, [default])[0]
+
+    @staticmethod
+    def _build_etag(path: str, version: str) -> str:
+        """Build a strong ETag from the request path and the partition version."""
+        return '"' + hashlib.sha1(f"{path}|{version}".encode()).hexdigest() + '"'
+
+    @staticmethod
+    def _gzip_etag(etag: str) -> str:
+        """Build the ETag of the gzip-encoded representation from the ETag of the identity one."""
+        return etag[:-1] + '-gzip"'
+
+    def _send_not_modified_if_match(self, etag: str, json_variants: bool = False) -> bool:
+        """
+        Send a 304 response if the client already holds the current representation.
+
+        Args:
+            etag (str): The ETag of the identity representation.
+            json_variants (bool): Whether the response is sent by _send_json, which may gzip it.
+
+        Returns:
+            bool: True if the 304 response was sent.
+        """
+        candidates = [etag]
+        if json_variants and self._accepts_gzip():
+            candidates.append(self._gzip_etag(etag))
+
+        # Weak comparison of every listed entity-tag, as specified for If-None-Match
+        header = self.headers.get("If-None-Match")
+        if header is None:
+            return False
+        tags = [tag.strip() for tag in header.split(",")]
+        if "*" in tags:
+            self._send_not_modified(etag, vary=json_variants)
+            return True
+        tags = {tag[2:] if tag.startswith("W/") else tag for tag in tags}
+        for candidate in candidates:
+            if candidate in tags:
+                self._send_not_modified(candidate, vary=json_variants)
+                return True
+        return False
+
+    def _accepts_gzip(self) -> bool:
+        """Check whether the client accepts gzip-encoded responses."""
+        return "gzip" in self.headers.get("Accept-Encoding", "")
+
+    def _send_json(
+        self,
+        payload: Any,
+        status: HTTPStatus = HTTPStatus.OK,
+        etag: Optional[str] = None,
+        max_age: Optional[int] = None,
+    ) -> None:
+        """
+        Send a JSON response, gzip-encoded when the client accepts it.
+
+        Args:
+            payload (Any): The JSON-serializable payload.
+            status (HTTPStatus): The HTTP status.
+            etag (Optional[str]): The ETag of the response.
+            max_age (Optional[int]): Browser cache lifetime of the response (seconds), revalidated if None.
+        """
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        gzipped = self._accepts_gzip() and len(body) >= GZIP_MIN_SIZE
+        if gzipped:
+            body = gzip.compress(body)
+            # The encoded bytes differ from the identity ones: they need their own entity-tag
+            if etag:
+                etag = self._gzip_etag(etag)
+
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json; charset=utf-8")
+        self.send_header("Content-Length", str(len(body)))
+        self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Access-Control-Allow-Origin", "*")
+        if gzipped:
+            self.send_header("Content-Encoding", "gzip")
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", f"public, max-age={max_age}" if max_age else "no-cache")
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_text(self, text: str, content_type: str) -> None:
+        """
+        Send a plain text response.
+
+        Args:
+            text (str): The body of the response.
+            content_type (str): The content type of the body.
+        """
+        body = text.encode("utf-8")
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def _send_not_modified(self, etag: str, vary: bool = False) -> None:
+        """Send a 304 response for a conditional request."""
+        self.send_response(HTTPStatus.NOT_MODIFIED)
+        self.send_header("ETag", etag)
+        if vary:
+            self.send_header("Vary", "Accept-Encoding")
+        self.send_header("Content-Length", "0")
+        self.end_headers()
+
+    def _send_internal_error(self) -> None:
+        """Log an unexpected error and report it to the client as a JSON 500 response."""
+        print(f"Unhandled error on {self.command} {self.path}:")
+        traceback.print_exc()
+        if self._response_started:
+            # The status line is already sent: the client can only notice the truncated body
+            self.close_connection = True
+            return
+        self._send_json({"error": "Internal server error"}, status=HTTPStatus.INTERNAL_SERVER_ERROR)
+
+    def end_headers(self) -> None:
+        """Mark the response as started before sending the headers."""
+        self._response_started = True
+        super().end_headers()
+
+    def _send_stream(
+        self,
+        chunks: Iterable[bytes],
+        content_type: str,
+        etag: Optional[str] = None,
+        filename: Optional[str] = None,
+    ) -> None:
+        """
+        Send a response with chunked transfer encoding, one chunk per yielded piece.
+
+        Args:
+            chunks (Iterable[bytes]): The pieces of the response body.
+            content_type (str): The content type of the body.
+            etag (Optional[str]): The ETag of the response.
+            filename (Optional[str]): The name of the file downloaded by browsers.
+        """
+        self.send_response(HTTPStatus.OK)
+        self.send_header("Content-Type", content_type)
+        self.send_header("Transfer-Encoding", "chunked")
+        if filename:
+            self.send_header("Content-Disposition", f'attachment; filename="{filename}"')
+        if etag:
+            self.send_header("ETag", etag)
+            self.send_header("Cache-Control", "no-cache")
+        self.end_headers()
+
+        for chunk in chunks:
+            if chunk:
+                self.wfile.write(f"{len(chunk):x}\r\n".encode() + chunk + b"\r\n")
+        self.wfile.write(b"0\r\n\r\n")
+
+
+def run_server(host: str = "0.0.0.0", port: int = 8502) -> None:
+    """
+    Run the headless API until interrupted.
+
+    Args:
+        host (str): The address to bind.
+        port (int): The port to listen on.
+    """
+    server = ThreadingHTTPServer((host, port), ApiRequestHandler)
+    print(f"Serving the Sotis Immobilier API on http://{host}:{port}")
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        pass
+    finally:
+        server.server_close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Headless API of the Sotis Immobilier application.")
+    parser.add_argument("--host", default="0.0.0.0", help="Address to bind")
+    parser.add_argument("--port", type=int, default=8502, help="Port to listen on")
+    args = parser.parse_args()
+    run_server(args.host, args.port)
@@ -0,0 +1,163 @@
+"""
+Choropleth map module for the Sotis Immobilier application.
+This module colors the communes of a department by their median price. The commune values are
+computed from the displayed transactions, while the boundaries are fetched by the browser from
+the API, one pre-simplified level at a time, as the zoom changes.
+"""
+
+import json
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from matplotlib import colormaps
+from matplotlib.colors import to_hex
+
+from src.core.geo.communes import GEOMETRY_LEVELS, get_commune_key
+
+LEAFLET_URL = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.js"
+LEAFLET_CSS_URL = "https://unpkg.com/leaflet@1.9.4/dist/leaflet.css"
+
+# Base map drawn under the communes
+BASEMAP_URL = "https://{s}.basemaps.cartocdn.com/light_all/{z}/{x}/{y}{r}.png"
+
+CHOROPLETH_MAP_TEMPLATE = """
+<div id="choropleth-map" style="width: 100%; height: __HEIGHT__px;"></div>
+<link href="__LEAFLET_CSS_URL__" rel="stylesheet" />
+<script src="__LEAFLET_URL__"></script>
+<script>
+const payload = __PAYLOAD__;
+
+const map = L.map("choropleth-map").fitBounds(payload.bounds);
+L.tileLayer("__BASEMAP_URL__", {attribution: "&copy; OpenStreetMap &copy; CARTO"}).addTo(map);
+
+// Boundaries are fetched once per simplification level, the finest level is only loaded when zoomed in
+const geometries = {};
+let layer = null;
+let currentLevel = null;
+
+function levelForZoom(zoom) {
+    return payload.levels.filter(([, minZoom]) => zoom >= minZoom).pop()[0];
+}
+
+function style(feature) {
+    const value = payload.values[feature.properties.cle];
+    return value
+        ? {color: "#555", weight: 0.5, fillColor: value[2], fillOpacity: 0.7}
+        : {color: "#999", weight: 0.5, fillColor: "#ccc", fillOpacity: 0.2};
+}
+
+function tooltip(feature) {
+    const value = payload.values[feature.properties.cle];
+    if (!value) return `<b>${feature.properties.nom}</b><br>Aucune transaction`;
+    const price = value[0].toLocaleString("fr-FR", {maximumFractionDigits: 0});
+    return `<b>${feature.properties.nom}</b><br>Prix médian : ${price} €${payload.unit}<br>Transactions : ${value[1]}`;
+}
+
+async function update() {
+    const level = levelForZoom(map.getZoom());
+    if (level === currentLevel) return;
+    currentLevel = level;
+    if (!geometries[level]) {
+        geometries[level] = fetch(payload.geometry_url.replace("{level}", level)).then((response) => response.json());
+    }
+    const data = await geometries[level];
+    if (level !== currentLevel || !data.features) return;
+    if (layer) map.removeLayer(layer);
+    layer = L.geoJSON(data, {style, onEachFeature: (feature, path) => path.bindTooltip(tooltip(feature))}).addTo(map);
+}
+
+const legend = L.control({position: "bottomright"});
+legend.onAdd = () => {
+    const div = L.DomUtil.create("div");
+    div.style.cssText = "background: white; padding: 6px 8px; font: 12px sans-serif; border-radius: 4px;";
+    const format = (value) => value.toLocaleString("fr-FR", {maximumFractionDigits: 0});
+    div.innerHTML = `${payload.caption}<br>`
+        + `<div style="width: 200px; height: 10px; background: linear-gradient(to right, ${payload.colors.join(",")});"></div>`
+        + `<span>${format(payload.vmin)}</span><span style="float: right;">${format(payload.vmax)}</span>`;
+    return div;
+};
+legend.addTo(map);
+
+map.on("zoomend", update);
+update();
+</script>
+"""
+
+
+def build_choropleth_payload(
+    properties_data: pd.DataFrame,
+    value_column: str,
+    geometry_url: str,
+    colormap_name: str = "turbo",
+) -> Dict:
+    """
+    Compute the median price of every commune and its color.
+
+    Args:
+        properties_data (pd.DataFrame): The transactions, with "nom_commune", "latitude", "longitude"
+            and the value column.
+        value_column (str): The price column to aggregate.
+        geometry_url (str): URL of the commune boundaries, with a "{level}" placeholder.
+        colormap_name (str): The name of the matplotlib colormap.
+
+    Returns:
+        Dict: The payload, with the median price, number of transactions and color of each
+        commune, keyed by the join key of the boundaries.
+    """
+    commune_values = properties_data.groupby("nom_commune")[value_column].agg(["median", "count"])
+
+    # Color scale robust to extreme communes, as for the tiles
+    medians = commune_values["median"].to_numpy(dtype=np.float64)
+    if len(medians):
+        vmin, vmax = np.percentile(medians, [2, 98])
+    else:
+        vmin, vmax = 0.0, 1.0
+    colormap = colormaps[colormap_name]
+    colors = colormap(np.clip((medians - vmin) / max(vmax - vmin, 1e-9), 0.0, 1.0))
+
+    values = {
+        get_commune_key(commune): [round(float(median), 2), int(count), to_hex(color)]
+        for commune, median, count, color in zip(commune_values.index, medians, commune_values["count"], colors)
+    }
+
+    return {
+        "values": values,
+        "geometry_url": geometry_url,
+        "levels": sorted(
+            ([level, min_zoom] for level, (_, min_zoom) in GEOMETRY_LEVELS.items()), key=lambda item: item[1]
+        ),
+        "bounds": [
+            [float(properties_data["latitude"].min()), float(properties_data["longitude"].min())],
+            [float(properties_data["latitude"].max()), float(properties_data["longitude"].max())],
+        ],
+        "vmin": float(vmin),
+        "vmax": float(vmax),
+        "colors": [to_hex(colormap(position)) for position in np.linspace(0, 1, 8)],
+        "unit": "/m²" if value_column == "prix_m2" else "",
+        "caption": "Prix médian au m² (€)" if value_column == "prix_m2" else "Prix médian (€)",
+    }
+
+
+def render_choropleth_map(payload: Dict, height: int = 800) -> str:
+    """
+    Render the HTML page drawing a choropleth payload.
+
+    Args:
+        payload (Dict): The payload built by build_choropleth_payload.
+        height (int): Height of the map in pixels.
+
+    Returns:
+        str: The HTML page, to display with st.components.v1.html.
+    """
+    replacements = {
+        "__HEIGHT__": str(height),
+        "__LEAFLET_CSS_URL__": LEAFLET_CSS_URL,
+        "__LEAFLET_URL__": LEAFLET_URL,
+        "__BASEMAP_URL__": BASEMAP_URL,
+        "__PAYLOAD__": json.dumps(payload),
+    }
+    html = CHOROPLETH_MAP_TEMPLATE
+    for placeholder, value in replacements.items():
+        html = html.replace(placeholder, value)
+    return html
@@ -0,0 +1,153 @@
+"""
+Deck map module for the Sotis Immobilier application.
+This module renders transactions with deck.gl in the browser. Coordinates, colors and prices
+are sent as packed binary typed arrays built from the NumPy columns, without per-row objects.
+"""
+
+import base64
+import json
+from typing import Dict
+
+import numpy as np
+import pandas as pd
+from matplotlib import colormaps
+
+# Version of deck.gl loaded by the browser
+DECK_GL_URL = "https://unpkg.com/deck.gl@9.1.11/dist.min.js"
+
+# Base map drawn under the transactions
+BASEMAP_STYLE = "https://basemaps.cartocdn.com/gl/positron-gl-style/style.json"
+MAPLIBRE_URL = "https://unpkg.com/maplibre-gl@4.7.1/dist/maplibre-gl.js"
+MAPLIBRE_CSS_URL = "https://unpkg.com/maplibre-gl@4.7.1/dist/maplibre-gl.css"
+
+DECK_MAP_TEMPLATE = """
+<div id="deck-map" style="position: relative; width: 100%; height: __HEIGHT__px;"></div>
+<link href="__MAPLIBRE_CSS_URL__" rel="stylesheet" />
+<script src="__MAPLIBRE_URL__"></script>
+<script src="__DECK_GL_URL__"></script>
+<script>
+const payload = __PAYLOAD__;
+
+function decode(base64, ArrayType) {
+    const bytes = Uint8Array.from(atob(base64), (c) => c.charCodeAt(0));
+    return new ArrayType(bytes.buffer);
+}
+
+const positions = decode(payload.positions, Float32Array);
+const colors = decode(payload.colors, Uint8Array);
+const values = decode(payload.values, Float32Array);
+const data = {
+    length: payload.length,
+    attributes: {
+        getPosition: {value: positions, size: 2},
+        getFillColor: {value: colors, size: 4, normalized: true},
+        getWeight: {value: values, size: 1},
+    },
+};
+
+const layer = payload.layer === "heatmap"
+    ? new deck.HeatmapLayer({id: "transactions", data, radiusPixels: 30, aggregation: "MEAN"})
+    : new deck.ScatterplotLayer({
+        id: "transactions",
+        data,
+        radiusUnits: "pixels",
+        getRadius: payload.radius,
+        opacity: 0.8,
+        pickable: true,
+    });
+
+new deck.DeckGL({
+    container: "deck-map",
+    mapStyle: "__BASEMAP_STYLE__",
+    initialViewState: payload.view,
+    controller: true,
+    layers: [layer],
+    getTooltip: ({index}) => index >= 0 && payload.layer !== "heatmap"
+        ? `${values[index].toLocaleString("fr-FR", {maximumFractionDigits: 0})} €${payload.unit}`
+        : null,
+});
+</script>
+"""
+
+
+def _encode(array: np.ndarray) -> str:
+    """Encode the buffer of a contiguous array in base64."""
+    return base64.b64encode(np.ascontiguousarray(array).tobytes()).decode("ascii")
+
+
+def build_deck_payload(
+    properties_data: pd.DataFrame,
+    value_column: str,
+    colormap_name: str = "turbo",
+    layer: str = "scatterplot",
+    radius: int = 3,
+) -> Dict:
+    """
+    Pack the transactions into binary columns for deck.gl.
+
+    Args:
+        properties_data (pd.DataFrame): The transactions, with "latitude", "longitude" and the value column.
+        value_column (str): The price column coloring the points.
+        colormap_name (str): The name of the matplotlib colormap.
+        layer (str): "scatterplot" or "heatmap".
+        radius (int): Radius of the points in pixels.
+
+    Returns:
+        Dict: The payload, with the base64-encoded interleaved positions (float32), RGBA colors
+        (uint8) and values (float32).
+    """
+    longitude = properties_data["longitude"].to_numpy(dtype=np.float32)
+    latitude = properties_data["latitude"].to_numpy(dtype=np.float32)
+    values = properties_data[value_column].to_numpy(dtype=np.float32)
+
+    positions = np.empty((len(values), 2), dtype=np.float32)
+    positions[:, 0] = longitude
+    positions[:, 1] = latitude
+
+    # Color scale robust to extreme values, as for the tiles
+    if len(values):
+        vmin, vmax = np.percentile(values, [2, 98])
+    else:
+        vmin, vmax = 0.0, 1.0
+    normalized = np.clip((values - vmin) / max(vmax - vmin, 1e-9), 0.0, 1.0)
+    colors = colormaps[colormap_name](normalized, bytes=True)
+
+    return {
+        "length": int(len(values)),
+        "layer": layer,
+        "radius": radius,
+        "unit": "/m²" if value_column == "prix_m2" else "",
+        "positions": _encode(positions),
+        "colors": _encode(colors),
+        "values": _encode(values),
+        "view": {
+            "latitude": float(latitude.mean()) if len(values) else 46.6,
+            "longitude": float(longitude.mean()) if len(values) else 2.4,
+            "zoom": 8,
+        },
+    }
+
+
+def render_deck_map(payload: Dict, height: int = 800) -> str:
+    """
+    Render the HTML page drawing a deck.gl payload.
+
+    Args:
+        payload (Dict): The payload built by build_deck_payload.
+        height (int): Height of the map in pixels.
+
+    Returns:
+        str: The HTML page, to display with st.components.v1.html.
+    """
+    replacements = {
+        "__HEIGHT__": str(height),
+        "__MAPLIBRE_CSS_URL__": MAPLIBRE_CSS_URL,
+        "__MAPLIBRE_URL__": MAPLIBRE_URL,
+        "__DECK_GL_URL__": DECK_GL_URL,
+        "__BASEMAP_STYLE__": BASEMAP_STYLE,
+        "__PAYLOAD__": json.dumps(payload),
+    }
+    html = DECK_MAP_TEMPLATE
+    for placeholder, value in replacements.items():
+        html = html.replace(placeholder, value)
+    return html
@@ -3,6 +3,8 @@ Visualization module for the Sotis Immobilier application.
 This module handles all data visualization components using Plotly.
 """
 
+from typing import Dict, Optional
+
 import folium
 import numpy as np
 import pandas as pd
@@ -11,9 +13,36 @@ import plotly.graph_objects as go
 import streamlit as st
 from branca.colormap import LinearColormap
 from folium.plugins import MarkerCluster
-from scipy import stats
+from matplotlib import colormaps
 
+from src.components.charts.choropleth_map import build_choropleth_payload, render_choropleth_map
+from src.components.charts.deck_map import build_deck_payload, render_deck_map
 from src.config.config import get_data_config
+from src.core.data.artifacts import slugify, start_artifact_build
+from src.core.data.partition_store import get_partition_store
+from src.core.data.price_index import ROLLING_YEARS, load_price_index
+from src.core.data.spatial_index import get_spatial_index
+from src.core.data.transforms import (
+    compute_commune_statistics,
+    compute_postal_code_statistics,
+    compute_price_histogram,
+    get_value_column,
+    remove_outliers,
+    select_property_type,
+)
+from src.core.tiles.builder import get_tile_metadata
+
+# Display names of the commune statistics columns
+COMMUNE_STATISTICS_LABELS = {
+    "code_postal": "Code postal",
+    "nom_commune": "Commune",
+    "nombre_transactions": "Nombre de transactions",
+    "prix_median": "Prix médian",
+    "prix_moyen": "Prix moyen",
+    "ecart_type_prix": "Écart-type des prix",
+    "surface_mediane": "Surface médiane",
+    "surface_moyenne": "Surface moyenne",
+}
 
 
 class PropertyPlotter:
@@ -27,6 +56,7 @@ class PropertyPlotter:
         show_price_per_sqm: bool = False,
         selected_local_type: str = "Appartement",
         remove_outliers: bool = False,
+        filters: Optional[Dict] = None,
     ):
         """
         Initialize the PropertyPlotter.
@@ -38,22 +68,18 @@ class PropertyPlotter:
             show_price_per_sqm (bool): Whether to show prices per square meter.
             selected_local_type (str): The selected property type.
             remove_outliers (bool): Whether to remove outliers from visualizations.
+            filters (Optional[Dict]): The "ranges" and "communes" the property data was filtered with.
         """
-        self.properties_data = properties_data.copy()
         self.selected_year = selected_year
         self.selected_department = selected_department
         self.config = get_data_config()
         self.show_price_per_sqm = show_price_per_sqm
         self.selected_local_type = selected_local_type
         self.remove_outliers = remove_outliers
+        self.filters = filters or {"ranges": {}, "communes": []}
 
-        # Filter data by property type
-        self.properties_data = self.properties_data[self.properties_data["type_local"] == self.selected_local_type]
-
-        # Calculate price per square meter
-        self.properties_data["prix_m2"] = (
-            self.properties_data["valeur_fonciere"] / self.properties_data["surface_reelle_bati"]
-        )
+        # Filter data by property type and calculate price per square meter
+        self.properties_data = select_property_type(properties_data, self.selected_local_type)
 
         # Remove outliers if needed
         if self.remove_outliers:
@@ -64,17 +90,16 @@ class PropertyPlotter:
         self.colormap = "Rainbow"
         self.marker_size = 10
         self.use_jitter = True
+        self.map_mode = "Groupement"
         self.use_clustering = False
         self.cluster_min_size = 5
+        self.tile_layer = "price"
+        self.deck_layer = "scatterplot"
 
     def _remove_outliers(self) -> None:
         """Remove outliers from the data using IQR method."""
-        value_column = "prix_m2" if self.show_price_per_sqm else "valeur_fonciere"
-        Q1 = self.properties_data[value_column].quantile(0.25)
-        Q3 = self.properties_data[value_column].quantile(0.75)
-        IQR = Q3 - Q1
-        upper_fence = Q3 + 1.5 * IQR
-        self.properties_data = self.properties_data[self.properties_data[value_column] <= upper_fence]
+        value_column = get_value_column(self.show_price_per_sqm)
+        self.properties_data = remove_outliers(self.properties_data, value_column)
 
     def create_visualization_tabs(self) -> None:
         """Create the main visualization tabs with their respective plots."""
@@ -94,6 +119,8 @@ class PropertyPlotter:
             with st.container(border=True):
                 self._create_map_controls()
                 self._plot_map()
+            with st.container(border=True):
+                self._plot_comparables()
 
         with tabs[1]:
             with st.container(border=True):
@@ -104,6 +131,8 @@ class PropertyPlotter:
         with tabs[2]:
             with st.container(border=True):
                 self._plot_commune_statistics()
+            with st.container(border=True):
+                self._plot_price_evolution()
 
     def _get_introduction_text(self) -> str:
         """Get the introduction text for the visualization section."""
@@ -149,13 +178,37 @@ class PropertyPlotter:
 
     def _create_map_data_controls(self) -> None:
         """Create the map data control widgets."""
-        self.use_clustering = st.checkbox(
-            "Utiliser le regroupement des points",
-            value=True,
-            help="Regroupe les points proches les uns des autres pour une meilleure lisibilité",
+        self.map_mode = st.radio(
+            "🗺️ Mode d'affichage",
+            ["Groupement", "Points", "GPU", "Tuiles", "Communes"],
+            horizontal=True,
+            help=(
+                "Groupement : regroupe les points proches. Points : affiche chaque transaction. "
+                "GPU : affiche chaque transaction avec la carte graphique, adapté aux gros volumes. "
+                "Tuiles : images pré-calculées, fluides quel que soit le nombre de transactions. "
+                "Communes : colore chaque commune selon son prix médian."
+            ),
         )
-
-        if not self.use_clustering:
+        self.use_clustering = self.map_mode == "Groupement"
+
+        if self.map_mode == "Tuiles":
+            self.tile_layer = st.radio(
+                "🎨 Couche",
+                ["price", "density"],
+                format_func=lambda layer: "Prix médian" if layer == "price" else "Densité des transactions",
+                horizontal=True,
+            )
+        elif self.map_mode == "GPU":
+            self.deck_layer = st.radio(
+                "🎨 Couche",
+                ["scatterplot", "heatmap"],
+                format_func=lambda layer: "Points" if layer == "scatterplot" else "Carte de chaleur",
+                horizontal=True,
+            )
+            self.marker_size = st.slider("🔘 Taille des points", min_value=1, max_value=10, value=3, step=1)
+        elif self.map_mode == "Communes":
+            st.caption("Les contours des communes se précisent en zoomant sur la carte.")
+        elif not self.use_clustering:
             self.marker_size = st.slider("🔘 Taille des points", min_value=1, max_value=20, value=10, step=1)
             self.use_jitter = st.checkbox("Eviter la superposition des points", False)
         else:
@@ -179,7 +232,7 @@ class PropertyPlotter:
         m = folium.Map(location=[center_lat, center_lon], zoom_start=6)
 
         # Create a color map
-        value_column = "prix_m2" if self.show_price_per_sqm else "valeur_fonciere"
+        value_column = get_value_column(self.show_price_per_sqm)
         min_price = filtered_df[value_column].min()
         max_price = filtered_df[value_column].max()
         colormap = LinearColormap(colors=["blue", "green", "yellow", "orange", "red"], vmin=min_price, vmax=max_price)
@@ -209,8 +262,75 @@ class PropertyPlotter:
 
         return m
 
+    def _create_tile_map(self) -> None:
+        """Create and display the map of the pre-rendered tiles served by the API."""
+        if self.tile_layer == "density":
+            layer = "density"
+        else:
+            layer = "median_prix_m2" if self.show_price_per_sqm else "median_valeur_fonciere"
+
+        metadata = get_tile_metadata(self.selected_department, self.selected_year, self.selected_local_type, layer)
+        if metadata is None or metadata["bounds"] is None:
+            st.info("Aucune tuile disponible pour cette configuration.")
+            return
+
+        m = folium.Map(min_zoom=metadata["min_zoom"], max_zoom=metadata["max_zoom"])
+        m.fit_bounds(metadata["bounds"])
+
+        type_slug = slugify(self.selected_local_type)
+        folium.TileLayer(
+            tiles=(
+                f"{self.config.api_url}/tiles/{self.selected_year}/{self.selected_department}"
+                f"/{type_slug}/{layer}/{{z}}/{{x}}/{{y}}.png"
+            ),
+            attr="DVF - Sotis Immobilier",
+            name="Transactions",
+            overlay=True,
+            min_zoom=metadata["min_zoom"],
+            max_zoom=metadata["max_zoom"],
+        ).add_to(m)
+
+        if layer != "density":
+            colormap = colormaps[metadata["colormap"]]
+            LinearColormap(
+                colors=[colormap(position) for position in np.linspace(0, 1, 8)],
+                vmin=metadata["vmin"],
+                vmax=metadata["vmax"],
+                caption="Prix médian au m² (€)" if self.show_price_per_sqm else "Prix médian (€)",
+            ).add_to(m)
+
+        st.components.v1.html(m._repr_html_(), height=800)
+
+    def _create_choropleth_map(self) -> None:
+        """Create and display the map of the communes colored by median price."""
+        payload = build_choropleth_payload(
+            self.properties_data,
+            get_value_column(self.show_price_per_sqm),
+            geometry_url=f"{self.config.api_url}/geometries/{self.selected_department}/communes/{{level}}.geojson",
+        )
+        st.components.v1.html(render_choropleth_map(payload, height=800), height=800)
+
     def _plot_map(self) -> None:
         """Create and display the interactive map visualization."""
+        if self.map_mode == "Tuiles":
+            self._create_tile_map()
+            return
+
+        if self.map_mode == "Communes":
+            self._create_choropleth_map()
+            return
+
+        if self.map_mode == "GPU":
+            # The binary payload is built from the columns directly, without the map data preparation
+            payload = build_deck_payload(
+                self.properties_data,
+                get_value_column(self.show_price_per_sqm),
+                layer=self.deck_layer,
+                radius=self.marker_size,
+            )
+            st.components.v1.html(render_deck_map(payload, height=800), height=800)
+            return
+
         filtered_df = self._prepare_map_data()
 
         if self.use_clustering:
@@ -219,21 +339,49 @@ class PropertyPlotter:
             st.components.v1.html(m._repr_html_(), height=800)
         else:
             # Create and display the scatter map
-            fig = px.scatter_mapbox(
-                filtered_df,
-                lat="lat",
-                lon="lon",
-                color="valeur",
-                size="marker_size",
-                color_continuous_scale=self.colormap,
-                size_max=self.marker_size,
-                zoom=6,
-                opacity=0.8,
-                hover_data=["ville", "valeur", "lon", "lat"],
+            fig = self._create_scatter_map(filtered_df)
+            event = st.plotly_chart(
+                fig,
+                use_container_width=True,
+                config={"scrollZoom": True},
+                on_select="rerun",
+                selection_mode="points",
+                key="scatter_map",
             )
+            self._store_clicked_point(event)
+
+    def _create_scatter_map(self, filtered_df: pd.DataFrame) -> go.Figure:
+        """
+        Create a scatter map using Plotly.
+
+        Args:
+            filtered_df (pd.DataFrame): The prepared data to display on the map.
+
+        Returns:
+            go.Figure: The created map with one marker per transaction.
+        """
+        fig = px.scatter_mapbox(
+            filtered_df,
+            lat="lat",
+            lon="lon",
+            color="valeur",
+            size="marker_size",
+            color_continuous_scale=self.colormap,
+            size_max=self.marker_size,
+            zoom=6,
+            opacity=0.8,
+            hover_data=["ville", "valeur", "lon", "lat"],
+        )
+
+        self._update_map_layout(fig)
+        return fig
 
-            self._update_map_layout(fig)
-            st.plotly_chart(fig, use_container_width=True, config={"scrollZoom": True})
+    def _store_clicked_point(self, event) -> None:
+        """Store the last point clicked on the scatter map as the origin of the comparables search."""
+        points = event.selection.points if event else []
+        if points and "lat" in points[0] and "lon" in points[0]:
+            st.session_state.comparables_latitude = float(points[0]["lat"])
+            st.session_state.comparables_longitude = float(points[0]["lon"])
 
     def _prepare_map_data(self) -> pd.DataFrame:
         """Prepare the data for map visualization."""
@@ -256,6 +404,57 @@ class PropertyPlotter:
 
         return filtered_df
 
+    def _plot_comparables(self) -> None:
+        """Create and display the nearest comparable sales around a point."""
+        st.markdown("### Biens comparables")
+        st.caption("Cliquez sur un point de la carte ou saisissez des coordonnées pour trouver les ventes les plus proches.")
+
+        spatial_index = get_spatial_index(self.selected_department, self.selected_year, self.selected_local_type)
+        if spatial_index is None or len(spatial_index) == 0:
+            st.info("Aucune transaction à comparer pour cette configuration.")
+            return
+
+        # Center the search on the department when the partition changes
+        partition = (self.selected_department, self.selected_year)
+        if st.session_state.get("comparables_partition") != partition:
+            st.session_state.comparables_partition = partition
+            st.session_state.comparables_latitude = float(self.properties_data["latitude"].mean())
+            st.session_state.comparables_longitude = float(self.properties_data["longitude"].mean())
+
+        col1, col2, col3, col4 = st.columns(4)
+        with col1:
+            latitude = st.number_input("Latitude", format="%.5f", key="comparables_latitude")
+        with col2:
+            longitude = st.number_input("Longitude", format="%.5f", key="comparables_longitude")
+        with col3:
+            k = st.slider("🔢 Nombre de comparables", min_value=1, max_value=50, value=10, step=1)
+        with col4:
+            radius_km = st.slider("📏 Rayon (km)", min_value=0.1, max_value=20.0, value=2.0, step=0.1)
+
+        comparables = spatial_index.query_comparables(latitude, longitude, k=k, radius_km=radius_km)
+        if comparables.empty:
+            st.info(f"Aucune vente trouvée dans un rayon de {radius_km:.1f} km.")
+            return
+
+        st.metric("Prix médian au m² des comparables", f"{comparables['prix_m2'].median():,.0f} €/m²")
+        comparables = comparables.rename(
+            columns={
+                "distance_km": "Distance (km)",
+                "nom_commune": "Commune",
+                "code_postal": "Code postal",
+                "valeur_fonciere": "Prix",
+                "surface_reelle_bati": "Surface",
+                "prix_m2": "Prix au m²",
+            }
+        ).drop(columns=["latitude", "longitude"])
+        st.dataframe(
+            comparables.style.format(
+                {"Distance (km)": "{:.2f}", "Prix": "{:,.0f} €", "Surface": "{:,.0f} m²", "Prix au m²": "{:,.0f} €"}
+            ),
+            use_container_width=True,
+            hide_index=True,
+        )
+
     def _update_map_layout(self, fig: go.Figure) -> None:
         """Update the map layout settings."""
         fig.update_layout(mapbox_style=self.selected_mapbox_style, height=800)
@@ -289,13 +488,8 @@ class PropertyPlotter:
             f"### Distribution des prix médians {price_type} pour les {property_type} dans le :blue[{self.selected_department}] en :blue[{self.selected_year}]"
         )
 
-        value_column = "prix_m2" if self.show_price_per_sqm else "valeur_fonciere"
-        grouped_data = (
-            self.properties_data.groupby(["code_postal"])
-            .agg({value_column: "median"})
-            .reset_index()
-            .sort_values("code_postal")
-        )
+        value_column = get_value_column(self.show_price_per_sqm)
+        grouped_data = compute_postal_code_statistics(self.properties_data, value_column)
 
         fig = px.line(
             grouped_data,
@@ -337,20 +531,31 @@ class PropertyPlotter:
             f"### Distribution des prix {price_type} pour les {property_type} dans le :blue[{self.selected_department}] en :blue[{self.selected_year}]"
         )
 
-        value_column = "prix_m2" if self.show_price_per_sqm else "valeur_fonciere"
-
-        # Calculate statistics
-        mean_value = self.properties_data[value_column].mean()
-        median_value = self.properties_data[value_column].median()
+        value_column = get_value_column(self.show_price_per_sqm)
+        histogram = _get_price_histogram(
+            self.selected_department,
+            self.selected_year,
+            self.selected_local_type,
+            value_column,
+            self.remove_outliers,
+            repr(self.filters),
+            get_partition_store().version(self.selected_department, self.selected_year),
+            self.properties_data[value_column].to_numpy(dtype=np.float64),
+        )
+        if histogram is None:
+            st.info("Aucune transaction à afficher.")
+            return
+        mean_value = histogram["mean"]
+        median_value = histogram["median"]
 
-        # Create histogram with KDE
+        # Histogram binned on the server: the figure only carries the bin counts
         fig = go.Figure()
-
-        # Add histogram
+        edges = histogram["edges"]
         fig.add_trace(
-            go.Histogram(
-                x=self.properties_data[value_column],
-                nbinsx=50,
+            go.Bar(
+                x=(edges[:-1] + edges[1:]) / 2,
+                y=histogram["counts"],
+                width=np.diff(edges),
                 name="Histogramme",
                 opacity=0.7,
                 marker_color="#1f77b4",
@@ -359,14 +564,14 @@ class PropertyPlotter:
         )
 
         # Add KDE
-        kde = stats.gaussian_kde(self.properties_data[value_column])
-        x_range = np.linspace(self.properties_data[value_column].min(), self.properties_data[value_column].max(), 100)
-        y_range = kde(x_range)
-        # Scale KDE to match histogram
-        y_range = y_range * len(self.properties_data) * (x_range[1] - x_range[0])
-
         fig.add_trace(
-            go.Scatter(x=x_range, y=y_range, name="Densité", line=dict(color="#ff7f0e", width=2), showlegend=True)
+            go.Scatter(
+                x=histogram["kde_x"],
+                y=histogram["kde_y"],
+                name="Densité",
+                line=dict(color="#ff7f0e", width=2),
+                showlegend=True,
+            )
         )
 
         # Add mean line
@@ -419,44 +624,19 @@ class PropertyPlotter:
             f"### Statistiques par commune pour les {property_type} dans le :blue[{self.selected_department}] en :blue[{self.selected_year}] (prix {price_type})"
         )
 
-        value_column = "prix_m2" if self.show_price_per_sqm else "valeur_fonciere"
-
-        # Create a combined key for grouping
-        self.properties_data["commune_key"] = self.properties_data["nom_commune"]
+        value_column = get_value_column(self.show_price_per_sqm)
 
-        commune_stats = (
-            self.properties_data.groupby(["commune_key", "code_postal", "nom_commune"])
-            .agg({value_column: ["count", "median", "mean", "std"], "surface_reelle_bati": ["median", "mean"]})
-            .round(2)
-        )
-
-        # Flatten the multi-level columns
-        commune_stats.columns = [
-            "Nombre de transactions",
-            "Prix médian",
-            "Prix moyen",
-            "Écart-type des prix",
-            "Surface médiane",
-            "Surface moyenne",
-        ]
-
-        # Reset index to make commune_key, code_postal and nom_commune regular columns
-        commune_stats = commune_stats.reset_index()
-
-        # Sort by code postal and then by commune name
-        commune_stats = commune_stats.sort_values(["code_postal", "nom_commune"])
+        commune_stats = compute_commune_statistics(self.properties_data, value_column)
 
         # Format the display
-        commune_stats["Prix médian"] = commune_stats["Prix médian"].map("{:,.0f} €".format)
-        commune_stats["Prix moyen"] = commune_stats["Prix moyen"].map("{:,.0f} €".format)
-        commune_stats["Écart-type des prix"] = commune_stats["Écart-type des prix"].map("{:,.0f} €".format)
-        commune_stats["Surface médiane"] = commune_stats["Surface médiane"].map("{:,.0f} m²".format)
-        commune_stats["Surface moyenne"] = commune_stats["Surface moyenne"].map("{:,.0f} m²".format)
+        commune_stats["prix_median"] = commune_stats["prix_median"].map("{:,.0f} €".format)
+        commune_stats["prix_moyen"] = commune_stats["prix_moyen"].map("{:,.0f} €".format)
+        commune_stats["ecart_type_prix"] = commune_stats["ecart_type_prix"].map("{:,.0f} €".format)
+        commune_stats["surface_mediane"] = commune_stats["surface_mediane"].map("{:,.0f} m²".format)
+        commune_stats["surface_moyenne"] = commune_stats["surface_moyenne"].map("{:,.0f} m²".format)
 
         # Rename columns for display
-        commune_stats = commune_stats.rename(
-            columns={"commune_key": "Commune", "code_postal": "Code postal", "nom_commune": "Nom de la commune"}
-        )
+        commune_stats = commune_stats.rename(columns=COMMUNE_STATISTICS_LABELS)
 
         # Reorder columns
         commune_stats = commune_stats[
@@ -514,3 +694,91 @@ class PropertyPlotter:
 
         # Display the styled table
         st.dataframe(styled_df, use_container_width=True, height=500, hide_index=True)
+
+    def _plot_price_evolution(self) -> None:
+        """Create and display the evolution of the price per square meter of a commune across the years."""
+        st.markdown("### Évolution des prix au m²")
+
+        price_index = load_price_index(self.selected_department, self.selected_local_type, level="communes")
+        if price_index is None:
+            # Built in the background from all the years of the department, shown on a next page load
+            build = start_artifact_build("price_index", self.selected_department)
+            if build.done() and build.exception() is not None:
+                st.info("L'historique des prix de ce département n'est pas disponible.")
+            else:
+                st.info("⏳ L'historique des prix de ce département est en cours de calcul, il s'affichera au prochain chargement de la page.")
+            return
+        if price_index.empty:
+            st.info("L'historique des prix de ce département n'est pas disponible pour ce type de bien.")
+            return
+
+        communes = price_index[["code_postal", "nom_commune"]].drop_duplicates()
+        communes = communes.sort_values(["code_postal", "nom_commune"])
+        labels = (communes["code_postal"] + " " + communes["nom_commune"]).tolist()
+        selected_label = st.selectbox("🏘️ Commune", labels, key="price_evolution_commune")
+        postal_code, commune = selected_label.split(" ", 1)
+
+        evolution = price_index[(price_index["code_postal"] == postal_code) & (price_index["nom_commune"] == commune)]
+
+        fig = go.Figure()
+        fig.add_trace(
+            go.Scatter(
+                x=evolution["annee"],
+                y=evolution["prix_m2_median"],
+                name="Prix médian",
+                mode="lines+markers",
+                customdata=np.stack([evolution["nombre_transactions"], evolution["variation_annuelle"]], axis=-1),
+                hovertemplate=(
+                    "<b>%{x}</b><br>Prix médian: %{y:,.0f} €/m²<br>Transactions: %{customdata[0]}"
+                    "<br>Variation: %{customdata[1]:+.1f} %<extra></extra>"
+                ),
+            )
+        )
+        fig.add_trace(
+            go.Scatter(
+                x=evolution["annee"],
+                y=evolution["prix_m2_median_glissant"],
+                name=f"Médiane glissante ({ROLLING_YEARS} ans)",
+                mode="lines",
+                line=dict(dash="dash"),
+                hovertemplate="<b>%{x}</b><br>Médiane glissante: %{y:,.0f} €/m²<extra></extra>",
+            )
+        )
+        fig.update_layout(
+            height=400,
+            xaxis=dict(title="Année", dtick=1),
+            yaxis_title="Prix au m² (€)",
+            legend=dict(yanchor="top", y=0.99, xanchor="left", x=0.01),
+            template="plotly_white",
+        )
+        st.plotly_chart(fig, use_container_width=True)
+
+
+@st.cache_data(max_entries=64)
+def _get_price_histogram(
+    selected_department: str,
+    selected_year: int,
+    selected_local_type: str,
+    value_column: str,
+    remove_extreme_values: bool,
+    filters_key: str,
+    version: Optional[str],
+    _values: np.ndarray,
+) -> Optional[Dict]:
+    """
+    Compute the price histogram of the displayed transactions, shared by all the sessions.
+
+    Args:
+        selected_department (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+        value_column (str): The price column.
+        remove_extreme_values (bool): Whether outliers were removed.
+        filters_key (str): Representation of the active filters.
+        version (Optional[str]): Version of the stored partition.
+        _values (np.ndarray): The prices, not part of the cache key: they are determined by the other arguments.
+
+    Returns:
+        Optional[Dict]: The histogram, as returned by compute_price_histogram.
+    """
+    return compute_price_histogram(_values)
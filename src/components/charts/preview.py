@@ -0,0 +1,81 @@
+"""
+Preview module for the Sotis Immobilier application.
+This module displays approximate statistics and a sampled map computed from a sample of the rows
+of a partition downloaded so far, while the partition is still loading.
+"""
+
+import numpy as np
+import plotly.express as px
+import streamlit as st
+
+from src.core.data.progressive import PartitionPreview, mean_confidence_interval, median_confidence_interval
+from src.core.data.transforms import get_value_column, remove_outliers, select_property_type
+
+# Maximum number of transactions drawn on the preview map
+PREVIEW_MAP_POINTS = 5_000
+
+
+def render_partition_preview(
+    preview: PartitionPreview,
+    selected_local_type: str,
+    show_price_per_sqm: bool,
+    remove_extreme_values: bool,
+) -> None:
+    """
+    Display the approximate results of a partition being loaded.
+
+    Args:
+        preview (PartitionPreview): The sample of the rows downloaded so far.
+        selected_local_type (str): The selected property type.
+        show_price_per_sqm (bool): Whether to show prices per square meter.
+        remove_extreme_values (bool): Whether to remove outliers.
+    """
+    value_column = get_value_column(show_price_per_sqm)
+    properties_data = select_property_type(preview.properties_data, selected_local_type)
+    if remove_extreme_values:
+        properties_data = remove_outliers(properties_data, value_column)
+
+    progress = f"{preview.fraction:.0%} du fichier lu" if preview.fraction is not None else "fichier en cours de lecture"
+    st.info(
+        f"⏳ **Résultats partiels** ({progress}) : estimations calculées sur un échantillon de "
+        f"{len(properties_data):,} transactions parmi les {preview.rows_read:,} déjà reçues, "
+        "affinées au fil du chargement."
+    )
+    if properties_data.empty:
+        return
+
+    values = properties_data[value_column].to_numpy(dtype=np.float64)
+    median_low, median_high = median_confidence_interval(values)
+    mean_low, mean_high = mean_confidence_interval(values)
+    unit = "€/m²" if show_price_per_sqm else "€"
+    estimated_rows = preview.estimate_rows(len(properties_data))
+    rows_so_far = len(properties_data) * preview.rows_read // len(preview.properties_data)
+
+    col1, col2, col3 = st.columns(3)
+    col1.metric("Prix médian (estimation)", f"{np.median(values):,.0f} {unit}")
+    col1.caption(f"IC 95 % : {median_low:,.0f} – {median_high:,.0f} {unit}")
+    col2.metric("Prix moyen (estimation)", f"{values.mean():,.0f} {unit}")
+    if not np.isnan(mean_low):
+        col2.caption(f"IC 95 % : {mean_low:,.0f} – {mean_high:,.0f} {unit}")
+    col3.metric(
+        "Transactions (estimation)",
+        f"~{estimated_rows:,}" if estimated_rows is not None else f"≥ {rows_so_far:,}",
+    )
+
+    sample = properties_data.sample(n=min(PREVIEW_MAP_POINTS, len(properties_data)), random_state=0)
+    fig = px.scatter_mapbox(
+        sample,
+        lat="latitude",
+        lon="longitude",
+        color=value_column,
+        color_continuous_scale="Rainbow",
+        zoom=7,
+        opacity=0.7,
+        hover_data=["nom_commune", value_column],
+    )
+    fig.update_layout(mapbox_style="open-street-map", height=500, margin={"l": 0, "r": 0, "t": 0, "b": 0})
+    fig.update_coloraxes(colorbar_thickness=10, colorbar_title_text=unit)
+    st.plotly_chart(fig, use_container_width=True)
+    st.caption(
+        f"Carte échantillonnée : {len(sample):,} transactions de l'échantillon."
+    )
@@ -3,6 +3,7 @@ Configuration module for the Sotis Immobilier application.
 This module handles all configuration settings including page layout, data sources, and environment variables.
 """
 
+import os
 from dataclasses import dataclass
 from typing import Any, Dict, List
 
@@ -32,6 +33,20 @@ class DataConfig:
     datagouv_source_url: str
     available_years_datagouv: List[int]
     scrapped_year_current: str
+    cache_dir: str
+    partitions_dir: str
+    api_url: str
+    geo_api_url: str
+    cleaning_memory_limit_bytes: int
+    chunked_cleaning_threshold_bytes: int
+
+@dataclass
+class MonitoringConfig:
+    """Configuration settings for the resource monitoring."""
+    memory_ceiling_bytes: int
+    memory_high_watermark: float
+    memory_low_watermark: float
+    session_idle_seconds: int
 
 
 def get_page_config() -> PageConfig:
@@ -79,7 +94,30 @@ def get_data_config() -> DataConfig:
         summarized_data_url=f"{env_config.AWS_S3_URL}/geo_dvf_summarized_full.csv.gz",
         datagouv_source_url=env_config.DATA_GOUV_URL,
         available_years_datagouv=AVAILABLE_YEARS,
-        scrapped_year_current=f"{env_config.AWS_S3_URL}/2024_merged/departements"
+        scrapped_year_current=f"{env_config.AWS_S3_URL}/2024_merged/departements",
+        cache_dir=env_config.CACHE_DIR,
+        partitions_dir=env_config.PARTITIONS_DIR or os.path.join(env_config.CACHE_DIR, "partitions"),
+        api_url=env_config.API_URL.rstrip("/"),
+        geo_api_url=env_config.GEO_API_URL.rstrip("/"),
+        cleaning_memory_limit_bytes=int(env_config.CLEANING_MEMORY_LIMIT_MB) * 1024 * 1024,
+        chunked_cleaning_threshold_bytes=int(env_config.CHUNKED_CLEANING_THRESHOLD_MB) * 1024 * 1024,
+    )
+
+
+def get_monitoring_config() -> MonitoringConfig:
+    """
+    Get the monitoring configuration settings.
+
+    Returns:
+        MonitoringConfig: A dataclass containing all resource monitoring settings.
+    """
+    env_config = load_env_config()
+
+    return MonitoringConfig(
+        memory_ceiling_bytes=int(env_config.MEMORY_CEILING_MB) * 1024 * 1024,
+        memory_high_watermark=0.85,
+        memory_low_watermark=0.7,
+        session_idle_seconds=int(env_config.SESSION_IDLE_SECONDS),
     )
 
 
@@ -92,5 +130,6 @@ def get_config() -> Dict[str, Any]:
     """
     return {
         "page": get_page_config(),
-        "data": get_data_config()
+        "data": get_data_config(),
+        "monitoring": get_monitoring_config(),
     } 
\ No newline at end of file
@@ -5,6 +5,23 @@ from typing import Any
 from dataclasses import dataclass
 from dotenv import find_dotenv, load_dotenv
 
+# Environment variables without a default value
+REQUIRED_ENV_VARS = [
+    "AUTH_PROVIDER_X509_CERT_URL",
+    "AUTH_URI",
+    "AWS_S3_URL",
+    "CLIENT_EMAIL",
+    "CLIENT_ID",
+    "CLIENT_X509_CERT_URL",
+    "PRIVATE_KEY",
+    "PRIVATE_KEY_ID",
+    "PROJECT_ID",
+    "TOKEN_URI",
+    "TYPE",
+    "UNIVERSE_DOMAIN",
+    "DATA_GOUV_URL",
+]
+
 
 @dataclass
 class EnvConfig:
@@ -21,6 +38,14 @@ class EnvConfig:
     TYPE: str
     UNIVERSE_DOMAIN: str
     DATA_GOUV_URL: str
+    CACHE_DIR: str = ".cache/sotisimmo"
+    PARTITIONS_DIR: str = ""
+    API_URL: str = "http://localhost:8502"
+    GEO_API_URL: str = "https://geo.api.gouv.fr"
+    CLEANING_MEMORY_LIMIT_MB: str = "256"
+    CHUNKED_CLEANING_THRESHOLD_MB: str = "16"
+    MEMORY_CEILING_MB: str = "2048"
+    SESSION_IDLE_SECONDS: str = "600"
 
     @staticmethod
     def load_from_env() -> "EnvConfig":
@@ -33,21 +58,7 @@ class EnvConfig:
 
         # Check if all required environment variables are set
         missing_vars = []
-        env_vars = {
-            "AUTH_PROVIDER_X509_CERT_URL": os.getenv("AUTH_PROVIDER_X509_CERT_URL"),
-            "AUTH_URI": os.getenv("AUTH_URI"),
-            "AWS_S3_URL": os.getenv("AWS_S3_URL"),
-            "CLIENT_EMAIL": os.getenv("CLIENT_EMAIL"),
-            "CLIENT_ID": os.getenv("CLIENT_ID"),
-            "CLIENT_X509_CERT_URL": os.getenv("CLIENT_X509_CERT_URL"),
-            "PRIVATE_KEY": os.getenv("PRIVATE_KEY"),
-            "PRIVATE_KEY_ID": os.getenv("PRIVATE_KEY_ID"),
-            "PROJECT_ID": os.getenv("PROJECT_ID"),
-            "TOKEN_URI": os.getenv("TOKEN_URI"),
-            "TYPE": os.getenv("TYPE"),
-            "UNIVERSE_DOMAIN": os.getenv("UNIVERSE_DOMAIN"),
-            "DATA_GOUV_URL": os.getenv("DATA_GOUV_URL"),
-        }
+        env_vars = {name: os.getenv(name) for name in REQUIRED_ENV_VARS}
 
         for key, value in env_vars.items():
             if value is None:
@@ -56,6 +67,19 @@ class EnvConfig:
         if missing_vars:
             raise EnvironmentError(f"Missing required environment variables: {', '.join(missing_vars)}")
 
+        # Optional environment variables, falling back to the dataclass defaults
+        optional_vars = {
+            "CACHE_DIR": os.getenv("CACHE_DIR"),
+            "PARTITIONS_DIR": os.getenv("PARTITIONS_DIR"),
+            "API_URL": os.getenv("API_URL"),
+            "GEO_API_URL": os.getenv("GEO_API_URL"),
+            "CLEANING_MEMORY_LIMIT_MB": os.getenv("CLEANING_MEMORY_LIMIT_MB"),
+            "CHUNKED_CLEANING_THRESHOLD_MB": os.getenv("CHUNKED_CLEANING_THRESHOLD_MB"),
+            "MEMORY_CEILING_MB": os.getenv("MEMORY_CEILING_MB"),
+            "SESSION_IDLE_SECONDS": os.getenv("SESSION_IDLE_SECONDS"),
+        }
+        env_vars.update({key: value for key, value in optional_vars.items() if value is not None})
+
         return EnvConfig(**env_vars)
 
 
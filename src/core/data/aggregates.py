@@ -0,0 +1,97 @@
+"""
+Aggregates module for the Sotis Immobilier application.
+This module precomputes the postal code and commune statistics of a partition for every
+property type and display option, and reads them back.
+"""
+
+import itertools
+from typing import Optional
+
+import pandas as pd
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.artifacts import artifact_path, is_fresh, register_artifact
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import (
+    compute_commune_statistics,
+    compute_postal_code_statistics,
+    get_value_column,
+    remove_outliers,
+    select_property_type,
+)
+
+AGGREGATE_RESOURCES = {
+    "postal-codes": compute_postal_code_statistics,
+    "communes": compute_commune_statistics,
+}
+
+
+@register_artifact("aggregates")
+def build_partition_aggregates(selected_dept: str, selected_year: int) -> None:
+    """
+    Precompute the statistics of a partition for every property type and display option.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+    """
+    properties_data = get_partition_store().read(selected_dept, selected_year)
+
+    for resource, compute_statistics in AGGREGATE_RESOURCES.items():
+        frames = []
+        for local_type, show_price_per_sqm, remove_extreme_values in itertools.product(
+            PROPERTY_TYPES, (True, False), (True, False)
+        ):
+            value_column = get_value_column(show_price_per_sqm)
+            selected_data = select_property_type(properties_data, local_type)
+            if remove_extreme_values:
+                selected_data = remove_outliers(selected_data, value_column)
+
+            statistics = compute_statistics(selected_data, value_column).rename(columns={value_column: "valeur"})
+            statistics.insert(0, "outliers_removed", remove_extreme_values)
+            statistics.insert(0, "value_column", value_column)
+            statistics.insert(0, "type_local", local_type)
+            frames.append(statistics)
+
+        pd.concat(frames, ignore_index=True).to_parquet(
+            artifact_path("aggregates", selected_dept, selected_year, f"{resource}.parquet"), index=False
+        )
+
+
+def load_partition_aggregate(
+    resource: str,
+    selected_dept: str,
+    selected_year: int,
+    selected_local_type: str,
+    show_price_per_sqm: bool,
+    remove_extreme_values: bool,
+) -> Optional[pd.DataFrame]:
+    """
+    Read precomputed statistics of a partition.
+
+    Args:
+        resource (str): "postal-codes" or "communes".
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        selected_local_type (str): The property type.
+        show_price_per_sqm (bool): Whether prices are aggregated per square meter.
+        remove_extreme_values (bool): Whether outliers were removed before aggregating.
+
+    Returns:
+        Optional[pd.DataFrame]: The statistics, or None if they are missing or outdated.
+    """
+    path = artifact_path("aggregates", selected_dept, selected_year, f"{resource}.parquet")
+    if not is_fresh(path, selected_dept, selected_year):
+        return None
+
+    value_column = get_value_column(show_price_per_sqm)
+    statistics = pd.read_parquet(
+        path,
+        filters=[
+            ("type_local", "==", selected_local_type),
+            ("value_column", "==", value_column),
+            ("outliers_removed", "==", remove_extreme_values),
+        ],
+    )
+    statistics = statistics.drop(columns=["type_local", "value_column", "outliers_removed"])
+    return statistics.rename(columns={"valeur": value_column})
@@ -0,0 +1,140 @@
+"""
+Derived artifacts module for the Sotis Immobilier application.
+This module keeps the registry of the artifacts derived from the data partitions
+(aggregates, indexes, ...) and their location in the local cache.
+"""
+
+import os
+import re
+import threading
+import unicodedata
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from pathlib import Path
+from typing import Callable, Dict, Optional, Tuple
+
+from src.config.config import get_data_config
+from src.core.data.partition_store import get_partition_store
+
+
+@dataclass
+class DerivedArtifact:
+    """Artifact rebuilt from the data partitions when they change."""
+    name: str
+    build: Callable[[str, int], None]
+    scope: str = "partition"
+
+
+# Registered artifacts, by name. Scope "partition" artifacts are built from one (department, year)
+# partition; scope "department" artifacts are built from all the years of a department.
+DERIVED_ARTIFACTS: Dict[str, DerivedArtifact] = {}
+
+# Artifacts built on demand in the background, shared by all the sessions of the process
+BUILD_EXECUTOR = ThreadPoolExecutor(max_workers=1, thread_name_prefix="artifacts")
+_builds: Dict[Tuple[str, str, Optional[int]], Future] = {}
+_builds_lock = threading.Lock()
+
+
+def register_artifact(name: str, scope: str = "partition") -> Callable:
+    """
+    Register the decorated function as the builder of a derived artifact.
+
+    Args:
+        name (str): The name of the artifact.
+        scope (str): "partition" or "department".
+
+    Returns:
+        Callable: The decorator.
+    """
+    def decorator(build: Callable[[str, int], None]) -> Callable[[str, int], None]:
+        DERIVED_ARTIFACTS[name] = DerivedArtifact(name=name, build=build, scope=scope)
+        return build
+
+    return decorator
+
+
+def start_artifact_build(name: str, selected_dept: str, selected_year: Optional[int] = None) -> Future:
+    """
+    Build a registered artifact in the background, once for all the sessions.
+
+    Args:
+        name (str): The name of the artifact.
+        selected_dept (str): The department code.
+        selected_year (Optional[int]): The year, None for department-wide artifacts.
+
+    Returns:
+        Future: Resolves once the artifact is built, or holds the error of the build.
+    """
+    key = (name, selected_dept, selected_year)
+    with _builds_lock:
+        build = _builds.get(key)
+        if build is None:
+            build = BUILD_EXECUTOR.submit(DERIVED_ARTIFACTS[name].build, selected_dept, selected_year)
+            _builds[key] = build
+            # Forgotten once built, so that the artifact is rebuilt when its partitions change; failed
+            # builds are kept, and not retried by every session
+            build.add_done_callback(lambda done: _forget_build(key, done))
+    return build
+
+
+def _forget_build(key: Tuple[str, str, Optional[int]], build: Future) -> None:
+    """Remove a successful background build."""
+    if build.exception() is not None:
+        print(f"Failed to build {key[0]} of {key[1]}: {build.exception()}")
+        return
+    with _builds_lock:
+        _builds.pop(key, None)
+
+
+def artifact_path(name: str, selected_dept: str, selected_year: Optional[int], filename: str) -> Path:
+    """
+    Get the path of an artifact file, creating its directory if needed.
+
+    Args:
+        name (str): The name of the artifact.
+        selected_dept (str): The department code.
+        selected_year (Optional[int]): The year, None for department-wide artifacts.
+        filename (str): The name of the file.
+
+    Returns:
+        Path: Path of the artifact file.
+    """
+    directory = Path(get_data_config().cache_dir) / "artifacts" / name
+    if selected_year is not None:
+        directory = directory / str(selected_year)
+    directory = directory / selected_dept
+    directory.mkdir(parents=True, exist_ok=True)
+    return directory / filename
+
+
+def is_fresh(path: Path, selected_dept: str, selected_year: int) -> bool:
+    """
+    Check whether an artifact file exists and was built after its partition (or its segments) was last written.
+
+    Args:
+        path (Path): Path of the artifact file.
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+
+    Returns:
+        bool: True if the artifact can be used.
+    """
+    partition_mtime = get_partition_store().mtime(selected_dept, selected_year)
+    try:
+        return partition_mtime is not None and os.path.getmtime(path) >= partition_mtime
+    except FileNotFoundError:
+        return False
+
+
+def slugify(value: str) -> str:
+    """
+    Turn a label into a file-name friendly identifier.
+
+    Args:
+        value (str): The label, e.g. a property type.
+
+    Returns:
+        str: The lower-case ASCII identifier.
+    """
+    value = unicodedata.normalize("NFKD", value).encode("ascii", "ignore").decode("ascii")
+    return re.sub(r"[^a-z0-9]+", "_", value.lower()).strip("_")
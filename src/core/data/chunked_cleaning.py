@@ -0,0 +1,254 @@
+"""
+Chunked cleaning module for the Sotis Immobilier application.
+This module cleans the files of the largest departments out of core: the file is read by
+chunks, the rows are spilled to disk by hash of their duplicate key so that duplicates are
+removed one hash partition at a time, and the output is spilled by postal code so that no
+global sort is needed.
+"""
+
+import tempfile
+from pathlib import Path
+from typing import Dict, Iterator, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.config.config import get_data_config
+from src.core.data.transforms import DATA_GOUV_COLUMNS, DATA_GOUV_DTYPES, DUPLICATE_SUBSET, format_postal_code
+
+# Schema of the cleaned rows, fixed so that all the chunks can be written to the same files
+PARTITION_SCHEMA = pa.schema(
+    [
+        (column, pa.string() if DATA_GOUV_DTYPES[column] is str else pa.float64())
+        for column in DATA_GOUV_COLUMNS
+    ]
+)
+
+# Schema of the spilled rows: the position of the row in the file and the hash of its duplicate key
+SPILL_SCHEMA = PARTITION_SCHEMA.append(pa.field("_row", pa.int64())).append(pa.field("_hash", pa.uint64()))
+
+# Estimated memory used per row while a chunk is parsed and cleaned (bytes)
+ESTIMATED_ROW_BYTES = 1024
+
+# Lower bound of the number of rows per chunk
+MIN_CHUNK_ROWS = 10_000
+
+# The rows are spilled to 2**HASH_PARTITION_BITS files by hash, each split again by the next bits
+# of the hash if it does not fit in a chunk
+HASH_PARTITION_BITS = 6
+
+
+class ChunkedCleaner:
+    """Class responsible for cleaning a data.gouv file within a bounded amount of memory."""
+
+    def __init__(self, max_memory_bytes: Optional[int] = None):
+        """
+        Initialize the ChunkedCleaner.
+
+        Args:
+            max_memory_bytes (Optional[int]): Memory budget of a chunk. Defaults to the configured limit.
+        """
+        max_memory_bytes = max_memory_bytes or get_data_config().cleaning_memory_limit_bytes
+        self.chunksize = max(MIN_CHUNK_ROWS, max_memory_bytes // ESTIMATED_ROW_BYTES)
+
+    @property
+    def schema(self) -> pa.Schema:
+        """Get the schema of the cleaned rows."""
+        return PARTITION_SCHEMA
+
+    def clean(self, source_path: str) -> Iterator[pa.RecordBatch]:
+        """
+        Clean a gzipped CSV file, yielding the cleaned rows ordered by postal code.
+
+        Rows with missing values are dropped and duplicates are removed keeping the last occurrence,
+        as in DataLoader.clean_data_gouv. The memory used is bounded by the size of a chunk, the rows
+        of one hash partition (itself split until it fits in a chunk) and the rows of one postal code.
+
+        Args:
+            source_path (str): Path of the gzipped CSV file.
+
+        Yields:
+            pa.RecordBatch: The cleaned rows, postal code by postal code.
+        """
+        with tempfile.TemporaryDirectory() as spill_dir:
+            spill_dir = Path(spill_dir)
+            hash_partitions = self._spill_by_hash(self._read_spill_tables(source_path), spill_dir / "hash", level=0)
+            spill_paths = self._spill_by_postal_code(
+                self._deduplicate(hash_partitions, spill_dir / "hash", level=0), spill_dir / "postal_codes"
+            )
+
+            # Concatenating the spill files in postal code order gives a sorted output
+            for postal_code in sorted(spill_paths):
+                with pa.OSFile(str(spill_paths[postal_code]), "rb") as source:
+                    table = pa.ipc.open_stream(source).read_all()
+                # Rows of a postal code come from several hash partitions: restore the order of the file
+                table = table.take(pc.sort_indices(table["_row"])).drop_columns(["_row"])
+                yield from table.to_batches()
+
+    def _read_chunks(self, source_path: str) -> Iterator[pd.DataFrame]:
+        """
+        Read a gzipped CSV file chunk by chunk, dropping the rows with missing values.
+
+        Args:
+            source_path (str): Path of the gzipped CSV file.
+
+        Yields:
+            pd.DataFrame: The next chunk without missing values.
+        """
+        with pd.read_csv(
+            source_path,
+            compression="gzip",
+            header=0,
+            sep=",",
+            quotechar='"',
+            usecols=DATA_GOUV_COLUMNS,
+            dtype=DATA_GOUV_DTYPES,
+            chunksize=self.chunksize,
+        ) as reader:
+            for chunk in reader:
+                yield chunk.dropna()
+
+    def _read_spill_tables(self, source_path: str) -> Iterator[pa.Table]:
+        """
+        Read the file chunk by chunk, with the position and the hashed duplicate key of every row.
+
+        Args:
+            source_path (str): Path of the gzipped CSV file.
+
+        Yields:
+            pa.Table: The next chunk, with the schema of the spilled rows.
+        """
+        offset = 0
+        for chunk in self._read_chunks(source_path):
+            chunk = chunk.assign(
+                code_postal=format_postal_code(chunk["code_postal"]),
+                _row=np.arange(offset, offset + len(chunk), dtype=np.int64),
+                _hash=pd.util.hash_pandas_object(chunk[DUPLICATE_SUBSET], index=False).to_numpy(),
+            )
+            offset += len(chunk)
+            yield pa.Table.from_pandas(chunk, schema=SPILL_SCHEMA, preserve_index=False)
+
+    @staticmethod
+    def _spill_by_hash(tables: Iterator[pa.Table], directory: Path, level: int) -> Dict[int, Tuple[Path, int]]:
+        """
+        Write rows into one Arrow stream file per hash partition.
+
+        Args:
+            tables (Iterator[pa.Table]): The rows, with the schema of the spilled rows.
+            directory (Path): Directory of the spill files.
+            level (int): Depth of the partitioning, selecting the bits of the hash used.
+
+        Returns:
+            Dict[int, Tuple[Path, int]]: The spill file and the number of rows of each hash partition.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        shift = np.uint64(level * HASH_PARTITION_BITS)
+        mask = np.uint64((1 << HASH_PARTITION_BITS) - 1)
+        partitions: Dict[int, Tuple[Path, int]] = {}
+        writers: Dict[int, pa.ipc.RecordBatchStreamWriter] = {}
+        sinks = []
+
+        try:
+            for table in tables:
+                keys = (table["_hash"].to_numpy() >> shift) & mask
+                for key in np.unique(keys):
+                    part = table.filter(pa.array(keys == key))
+                    key = int(key)
+                    if key not in writers:
+                        path = directory / f"{level}_{key}.arrow"
+                        sink = pa.OSFile(str(path), "wb")
+                        sinks.append(sink)
+                        writers[key] = pa.ipc.new_stream(sink, SPILL_SCHEMA)
+                        partitions[key] = (path, 0)
+                    writers[key].write_table(part)
+                    partitions[key] = (partitions[key][0], partitions[key][1] + part.num_rows)
+        finally:
+            for writer in writers.values():
+                writer.close()
+            for sink in sinks:
+                sink.close()
+
+        return partitions
+
+    def _deduplicate(
+        self, partitions: Dict[int, Tuple[Path, int]], directory: Path, level: int
+    ) -> Iterator[pa.Table]:
+        """
+        Remove the duplicates of each hash partition, keeping the last occurrence of each key.
+
+        Duplicates share their hash, hence their partition: each partition is deduplicated on its own,
+        by comparing the duplicate keys of its rows, after being split by the next bits of the hash if
+        it has more rows than a chunk.
+
+        Args:
+            partitions (Dict[int, Tuple[Path, int]]): The spill file and number of rows of each partition.
+            directory (Path): Directory of the spill files.
+            level (int): Depth of the partitioning of the given partitions.
+
+        Yields:
+            pa.Table: The rows to keep, partition by partition.
+        """
+        max_level = 64 // HASH_PARTITION_BITS - 1
+        for key in sorted(partitions):
+            path, num_rows = partitions[key]
+            if num_rows > self.chunksize and level < max_level:
+                sub_directory = directory / f"{level}_{key}"
+                sub_partitions = self._spill_by_hash(self._read_spill_file(path), sub_directory, level + 1)
+                path.unlink()
+                yield from self._deduplicate(sub_partitions, sub_directory, level + 1)
+                continue
+
+            with pa.OSFile(str(path), "rb") as source:
+                table = pa.ipc.open_stream(source).read_all()
+            path.unlink()
+
+            # Rows sharing a hash are only duplicates if their keys are equal, since hashes may collide
+            table = table.take(pc.sort_indices(table["_row"]))
+            duplicated = table.select(DUPLICATE_SUBSET).to_pandas().duplicated(keep="last")
+            yield table.filter(pa.array(~duplicated.to_numpy()))
+
+    @staticmethod
+    def _read_spill_file(path: Path) -> Iterator[pa.Table]:
+        """Read a spill file batch by batch."""
+        with pa.OSFile(str(path), "rb") as source:
+            for batch in pa.ipc.open_stream(source):
+                yield pa.Table.from_batches([batch])
+
+    @staticmethod
+    def _spill_by_postal_code(tables: Iterator[pa.Table], directory: Path) -> Dict[str, Path]:
+        """
+        Write the rows to keep into one Arrow stream file per postal code.
+
+        Args:
+            tables (Iterator[pa.Table]): The deduplicated rows, with the schema of the spilled rows.
+            directory (Path): Directory of the spill files.
+
+        Returns:
+            Dict[str, Path]: The spill file of each postal code.
+        """
+        directory.mkdir(parents=True, exist_ok=True)
+        schema = SPILL_SCHEMA.remove(SPILL_SCHEMA.get_field_index("_hash"))
+        spill_paths: Dict[str, Path] = {}
+        writers: Dict[str, pa.ipc.RecordBatchStreamWriter] = {}
+        sinks = []
+
+        try:
+            for table in tables:
+                table = table.drop_columns(["_hash"])
+                postal_codes = table["code_postal"].to_numpy(zero_copy_only=False)
+                for postal_code in np.unique(postal_codes):
+                    if postal_code not in writers:
+                        spill_paths[postal_code] = directory / f"{postal_code}.arrow"
+                        sink = pa.OSFile(str(spill_paths[postal_code]), "wb")
+                        sinks.append(sink)
+                        writers[postal_code] = pa.ipc.new_stream(sink, schema)
+                    writers[postal_code].write_table(table.filter(pa.array(postal_codes == postal_code)))
+        finally:
+            for writer in writers.values():
+                writer.close()
+            for sink in sinks:
+                sink.close()
+
+        return spill_paths
@@ -0,0 +1,224 @@
+"""
+Export module for the Sotis Immobilier application.
+This module streams the filtered transactions and the commune statistics of a partition as
+CSV or Parquet files, batch by batch, so that the size of an export does not weigh on memory.
+"""
+
+from dataclasses import dataclass, field
+from typing import Callable, Dict, Iterator, List, Optional, Tuple
+from urllib.parse import urlencode
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+
+from src.core.data.aggregates import AGGREGATE_RESOURCES
+from src.core.data.partition_store import get_partition_store
+from src.core.data.streaming import iter_csv_chunks, iter_parquet_chunks
+from src.core.data.transforms import get_value_column
+
+# Content type and serializer of each export format
+EXPORT_FORMATS: Dict[str, Tuple[str, Callable]] = {
+    "csv": ("text/csv; charset=utf-8", iter_csv_chunks),
+    "parquet": ("application/vnd.apache.parquet", iter_parquet_chunks),
+}
+
+# Query string parameters of the range filters
+RANGE_FILTER_PARAMS = {
+    "surface_reelle_bati": ("surface_min", "surface_max"),
+    "prix_m2": ("prix_m2_min", "prix_m2_max"),
+    "valeur_fonciere": ("valeur_min", "valeur_max"),
+}
+
+
+@dataclass
+class TransactionFilters:
+    """Filters of the transactions, as selected in the sidebar."""
+    local_type: str
+    show_price_per_sqm: bool = True
+    remove_outliers: bool = False
+    ranges: Dict[str, Tuple[float, float]] = field(default_factory=dict)
+    communes: List[str] = field(default_factory=list)
+
+    def to_query(self) -> str:
+        """
+        Encode the filters as a query string of the export routes of the API.
+
+        Returns:
+            str: The query string, without the leading "?".
+        """
+        params = [
+            ("type", self.local_type),
+            ("price", "m2" if self.show_price_per_sqm else "total"),
+            ("outliers", "1" if self.remove_outliers else "0"),
+        ]
+        for column, (low, high) in self.ranges.items():
+            low_param, high_param = RANGE_FILTER_PARAMS[column]
+            params.append((low_param, repr(float(low))))
+            if np.isfinite(high):
+                params.append((high_param, repr(float(high))))
+        params += [("commune", commune) for commune in self.communes]
+        return urlencode(params)
+
+    @classmethod
+    def from_query(
+        cls, query: Dict[str, list], default_local_type: str, default_remove_outliers: bool = True
+    ) -> "TransactionFilters":
+        """
+        Decode the filters from a parsed query string.
+
+        Args:
+            query (Dict[str, list]): The parsed query string.
+            default_local_type (str): The property type if none is given.
+            default_remove_outliers (bool): Whether outliers are removed if not specified.
+
+        Returns:
+            TransactionFilters: The filters.
+
+        Raises:
+            ValueError: If a bound is not a number.
+        """
+        ranges = {}
+        for column, (low_param, high_param) in RANGE_FILTER_PARAMS.items():
+            if low_param in query or high_param in query:
+                ranges[column] = (
+                    float(query.get(low_param, ["-inf"])[0]),
+                    float(query.get(high_param, ["inf"])[0]),
+                )
+        return cls(
+            local_type=query.get("type", [default_local_type])[0],
+            show_price_per_sqm=query.get("price", ["m2"])[0] == "m2",
+            remove_outliers=query.get("outliers", ["1" if default_remove_outliers else "0"])[0] == "1",
+            ranges=ranges,
+            communes=query.get("commune", []),
+        )
+
+    @property
+    def is_default(self) -> bool:
+        """Whether only the property type and display options are set, as in the precomputed aggregates."""
+        return not self.ranges and not self.communes
+
+
+def _filter_batch(batch: pa.RecordBatch, filters: TransactionFilters) -> pa.RecordBatch:
+    """
+    Apply the type, range and commune filters to a batch, adding its price per square meter.
+
+    Args:
+        batch (pa.RecordBatch): The batch of a partition.
+        filters (TransactionFilters): The filters.
+
+    Returns:
+        pa.RecordBatch: The matching rows, with a "prix_m2" column.
+    """
+    prix_m2 = pc.divide(batch["valeur_fonciere"], batch["surface_reelle_bati"])
+    batch = pa.RecordBatch.from_arrays([*batch.columns, prix_m2], names=[*batch.schema.names, "prix_m2"])
+
+    mask = pc.equal(batch["type_local"], filters.local_type)
+    for column, (low, high) in filters.ranges.items():
+        mask = pc.and_(mask, pc.and_(pc.greater_equal(batch[column], low), pc.less_equal(batch[column], high)))
+    if filters.communes:
+        mask = pc.and_(mask, pc.is_in(batch["nom_commune"], value_set=pa.array(filters.communes)))
+    return batch.filter(mask)
+
+
+def _compute_upper_fence(selected_dept: str, selected_year: int, filters: TransactionFilters) -> float:
+    """
+    Compute the outlier fence (Q3 + 1.5 * IQR) of the filtered transactions, as remove_outliers does.
+
+    Only the price column of the matching rows is held in memory.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        filters (TransactionFilters): The filters.
+
+    Returns:
+        float: The upper fence of the price column, infinite if no transaction matches.
+    """
+    value_column = get_value_column(filters.show_price_per_sqm)
+    values = [
+        _filter_batch(batch, filters)[value_column].to_numpy(zero_copy_only=False)
+        for batch in get_partition_store().iter_batches(selected_dept, selected_year)
+    ]
+    values = np.concatenate(values) if values else np.empty(0)
+    values = values[~np.isnan(values)]
+    if len(values) == 0:
+        return np.inf
+    q1, q3 = np.percentile(values, [25, 75])
+    return q3 + 1.5 * (q3 - q1)
+
+
+def iter_filtered_transactions(
+    selected_dept: str, selected_year: int, filters: TransactionFilters
+) -> Iterator[pa.RecordBatch]:
+    """
+    Iterate over the filtered transactions of a partition, batch by batch.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        filters (TransactionFilters): The filters.
+
+    Yields:
+        pa.RecordBatch: The next batch of matching transactions, with a "prix_m2" column.
+    """
+    upper_fence = _compute_upper_fence(selected_dept, selected_year, filters) if filters.remove_outliers else None
+    value_column = get_value_column(filters.show_price_per_sqm)
+
+    for batch in get_partition_store().iter_batches(selected_dept, selected_year):
+        batch = _filter_batch(batch, filters)
+        if upper_fence is not None:
+            batch = batch.filter(pc.less_equal(batch[value_column], upper_fence))
+        if batch.num_rows:
+            yield batch
+
+
+def get_transactions_schema(selected_dept: str, selected_year: int) -> pa.Schema:
+    """Get the schema of the exported transactions: the partition schema and the price per square meter."""
+    return get_partition_store().schema(selected_dept, selected_year).append(pa.field("prix_m2", pa.float64()))
+
+
+def compute_filtered_statistics(
+    resource: str, selected_dept: str, selected_year: int, filters: TransactionFilters
+) -> pd.DataFrame:
+    """
+    Compute the postal code or commune statistics of the filtered transactions.
+
+    Only the columns aggregated by the statistics are kept in memory.
+
+    Args:
+        resource (str): "postal-codes" or "communes".
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        filters (TransactionFilters): The filters.
+
+    Returns:
+        pd.DataFrame: The statistics.
+    """
+    value_column = get_value_column(filters.show_price_per_sqm)
+    columns = ["code_postal", "nom_commune", "surface_reelle_bati", value_column]
+    batches = [batch.select(columns) for batch in iter_filtered_transactions(selected_dept, selected_year, filters)]
+    properties_data = pa.Table.from_batches(batches).to_pandas() if batches else pd.DataFrame(columns=columns)
+    return AGGREGATE_RESOURCES[resource](properties_data, value_column)
+
+
+def iter_export_chunks(
+    table_or_batches, output_format: str, schema: Optional[pa.Schema] = None
+) -> Iterator[bytes]:
+    """
+    Serialize a table or record batches in an export format.
+
+    Args:
+        table_or_batches (pa.Table or Iterable[pa.RecordBatch]): The data to export.
+        output_format (str): A key of EXPORT_FORMATS.
+        schema (Optional[pa.Schema]): Schema of the file, required if there may be no batch.
+
+    Yields:
+        bytes: The next chunk of the file.
+    """
+    if isinstance(table_or_batches, pa.Table):
+        schema = table_or_batches.schema
+        table_or_batches = table_or_batches.to_batches()
+    _, serialize = EXPORT_FORMATS[output_format]
+    yield from serialize(table_or_batches, schema)
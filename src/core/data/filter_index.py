@@ -0,0 +1,236 @@
+"""
+Filter index module for the Sotis Immobilier application.
+This module indexes the transactions of a partition by surface, price and commune, so that the
+interactive filters resolve to ranges of sorted arrays instead of scanning the whole partition.
+"""
+
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import streamlit as st
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import select_property_type
+
+# Numeric columns the transactions can be filtered on
+RANGE_FILTER_COLUMNS = ["surface_reelle_bati", "prix_m2", "valeur_fonciere"]
+
+
+class SortedColumn:
+    """Sorted view of a numeric column, answering range queries by binary search."""
+
+    def __init__(self, values: np.ndarray):
+        """
+        Initialize the SortedColumn.
+
+        Args:
+            values (np.ndarray): The values of the column, in row order.
+        """
+        self.order = np.argsort(values, kind="stable").astype(np.int32)
+        self.sorted_values = values[self.order]
+
+        # Rank of each row in the sorted order, to test the membership of a row in O(1)
+        self.ranks = np.empty(len(values), dtype=np.int32)
+        self.ranks[self.order] = np.arange(len(values), dtype=np.int32)
+
+    def bounds(self, low: float, high: float) -> Tuple[int, int]:
+        """
+        Get the range of sorted positions of the values within [low, high].
+
+        Args:
+            low (float): The lower bound, included.
+            high (float): The upper bound, included.
+
+        Returns:
+            Tuple[int, int]: The start (included) and end (excluded) of the range.
+        """
+        return (
+            int(np.searchsorted(self.sorted_values, low, side="left")),
+            int(np.searchsorted(self.sorted_values, high, side="right")),
+        )
+
+
+class FilterIndex:
+    """Class responsible for filtering the transactions of a partition by surface, price and commune."""
+
+    def __init__(self, properties_data: pd.DataFrame):
+        """
+        Initialize the FilterIndex.
+
+        Args:
+            properties_data (pd.DataFrame): The transactions of one property type, with a "prix_m2" column.
+        """
+        self.properties_data = properties_data.reset_index(drop=True)
+        self.columns: Dict[str, SortedColumn] = {
+            column: SortedColumn(self.properties_data[column].to_numpy(dtype=np.float64))
+            for column in RANGE_FILTER_COLUMNS
+        }
+
+        # Rows grouped by commune: the rows of commune i are commune_order[offsets[i]:offsets[i + 1]]
+        codes, self.communes = pd.factorize(self.properties_data["nom_commune"], sort=True)
+        self.commune_codes = codes.astype(np.int32)
+        self.commune_order = np.argsort(self.commune_codes, kind="stable").astype(np.int32)
+        self.commune_offsets = np.searchsorted(
+            self.commune_codes[self.commune_order], np.arange(len(self.communes) + 1)
+        )
+
+    def __len__(self) -> int:
+        """Get the number of indexed transactions."""
+        return len(self.properties_data)
+
+    def value_range(self, column: str) -> Tuple[float, float]:
+        """
+        Get the smallest and largest values of an indexed column.
+
+        Args:
+            column (str): One of RANGE_FILTER_COLUMNS.
+
+        Returns:
+            Tuple[float, float]: The bounds, (0, 0) if there is no transaction.
+        """
+        sorted_values = self.columns[column].sorted_values
+        if len(sorted_values) == 0:
+            return 0.0, 0.0
+        return float(sorted_values[0]), float(sorted_values[-1])
+
+    def quantile(self, column: str, q: float) -> float:
+        """
+        Get a quantile of an indexed column, read from the sorted values.
+
+        Args:
+            column (str): One of RANGE_FILTER_COLUMNS.
+            q (float): The quantile, between 0 and 1.
+
+        Returns:
+            float: The value at that quantile, 0 if there is no transaction.
+        """
+        sorted_values = self.columns[column].sorted_values
+        if len(sorted_values) == 0:
+            return 0.0
+        return float(sorted_values[min(int(q * len(sorted_values)), len(sorted_values) - 1)])
+
+    def query(
+        self,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+        communes: Optional[Sequence[str]] = None,
+    ) -> np.ndarray:
+        """
+        Get the rows matching all the filters.
+
+        Each filter resolves to a contiguous range of one sorted column. The rows of the narrowest
+        filter are enumerated, and the other filters are checked on those rows only, through the
+        ranks of the rows in each sorted column.
+
+        Args:
+            ranges (Optional[Dict[str, Tuple[float, float]]]): Bounds (included) per column of RANGE_FILTER_COLUMNS.
+            communes (Optional[Sequence[str]]): The communes to keep, all of them if empty.
+
+        Returns:
+            np.ndarray: The positions of the matching rows, in row order.
+        """
+        bounds = {column: self.columns[column].bounds(low, high) for column, (low, high) in (ranges or {}).items()}
+
+        candidates = None
+        if communes:
+            codes = self.communes.get_indexer(list(communes))
+            codes = codes[codes >= 0]
+            candidates = np.concatenate(
+                [self.commune_order[self.commune_offsets[code] : self.commune_offsets[code + 1]] for code in codes]
+                or [np.empty(0, dtype=np.int32)]
+            )
+
+        if candidates is None and bounds:
+            narrowest = min(bounds, key=lambda column: bounds[column][1] - bounds[column][0])
+            start, end = bounds.pop(narrowest)
+            candidates = self.columns[narrowest].order[start:end]
+
+        if candidates is None:
+            return np.arange(len(self), dtype=np.int32)
+
+        for column, (start, end) in bounds.items():
+            ranks = self.columns[column].ranks[candidates]
+            candidates = candidates[(ranks >= start) & (ranks < end)]
+
+        return np.sort(candidates)
+
+    def filter(
+        self,
+        ranges: Optional[Dict[str, Tuple[float, float]]] = None,
+        communes: Optional[Sequence[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Get the transactions matching all the filters.
+
+        Args:
+            ranges (Optional[Dict[str, Tuple[float, float]]]): Bounds (included) per column of RANGE_FILTER_COLUMNS.
+            communes (Optional[Sequence[str]]): The communes to keep, all of them if empty.
+
+        Returns:
+            pd.DataFrame: The matching transactions, the indexed frame itself if no filter is active.
+        """
+        positions = self.query(ranges, communes)
+        if len(positions) == len(self):
+            return self.properties_data
+        return self.properties_data.take(positions)
+
+    def commune_names(self) -> List[str]:
+        """Get the sorted names of the indexed communes."""
+        return self.communes.tolist()
+
+
+def get_filter_index(selected_dept: str, selected_year: int, selected_local_type: str) -> Optional[FilterIndex]:
+    """
+    Get the filter index of a (department, year, property type) partition.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+
+    Returns:
+        Optional[FilterIndex]: The filter index or None if the partition could not be loaded.
+    """
+    properties_data = DataLoader.fetch_data_gouv(selected_dept, selected_year)
+    if properties_data is None:
+        return None
+
+    version = get_partition_store().version(selected_dept, selected_year)
+    return _build_filter_index(selected_dept, selected_year, selected_local_type, version)
+
+
+@st.cache_resource(max_entries=16)
+def _build_filter_index(selected_dept: str, selected_year: int, selected_local_type: str, version: str) -> FilterIndex:
+    """
+    Build the filter index of a partition, shared by all the sessions.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+        version (str): Version of the stored partition, part of the cache key only.
+
+    Returns:
+        FilterIndex: The filter index.
+    """
+    print(f"Building filter index... Year: {selected_year}, Department: {selected_dept}, Type: {selected_local_type}")
+    properties_data = DataLoader.read_partition(selected_dept, selected_year, version)
+    return FilterIndex(select_property_type(properties_data, selected_local_type))
+
+
+def clear_filter_indexes(selected_dept: Optional[str] = None, selected_year: Optional[int] = None) -> None:
+    """
+    Clear the filter indexes held in memory, they are rebuilt on the next query.
+
+    Args:
+        selected_dept (Optional[str]): The department of the partition to clear, all the partitions if None.
+        selected_year (Optional[int]): The year of the partition to clear.
+    """
+    if selected_dept is None:
+        _build_filter_index.clear()
+        return
+    version = get_partition_store().version(selected_dept, selected_year)
+    for selected_local_type in PROPERTY_TYPES:
+        _build_filter_index.clear(selected_dept, selected_year, selected_local_type, version)
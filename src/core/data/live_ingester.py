@@ -0,0 +1,283 @@
+"""
+Live ingester module for the Sotis Immobilier application.
+This module keeps the partitions of the current year up to date with the listings scraped by
+the Sotis-IMMO robot: each poll diffs the scraped file against the last snapshot and appends
+only the added, changed and removed listings to the live partition.
+
+Usage:
+    python -m src.core.data.live_ingester --departments 72 75 --interval 900
+"""
+
+import argparse
+import os
+import tempfile
+import time
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import requests
+
+from src.config.config import get_data_config
+from src.core.data.chunked_cleaning import PARTITION_SCHEMA
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import DELETED_COLUMN, LISTING_KEY_COLUMN, get_partition_store
+from src.core.data.transforms import DATA_GOUV_COLUMNS
+
+# Columns identifying a listing. The scraped files carry no listing id, and the coordinates are those
+# of the zone of the listing: the price is needed to tell apart the listings of a zone, so a listing
+# whose price changes is replaced (removed and added) rather than changed
+LISTING_KEY_COLUMNS = ["type_local", "surface_reelle_bati", "valeur_fonciere", "nom_commune", "longitude", "latitude"]
+
+# Schema of the live partitions: the cleaned columns, the listing key and the deletion marker
+LIVE_PARTITION_SCHEMA = PARTITION_SCHEMA.append(pa.field(LISTING_KEY_COLUMN, pa.uint64())).append(
+    pa.field(DELETED_COLUMN, pa.bool_())
+)
+
+# Number of segments above which a live partition is compacted
+MAX_LIVE_SEGMENTS = 24
+
+# Minimum time between two writes of a live partition (seconds). Every write changes the version of
+# the partition, which invalidates all its derived artifacts
+MIN_SEGMENT_INTERVAL = 3600
+
+
+def get_live_year() -> int:
+    """
+    Get the year of the live partitions.
+
+    Returns:
+        int: The year following the last year published on the open data portal.
+    """
+    return get_data_config().available_years_datagouv[-1] + 1
+
+
+class LiveIngester:
+    """Class responsible for appending the changes of the scraped listings to the live partitions."""
+
+    def __init__(self, snapshot_dir: Optional[str] = None):
+        """
+        Initialize the LiveIngester.
+
+        Args:
+            snapshot_dir (Optional[str]): Directory of the snapshots of the last scrapes.
+                Defaults to the cache directory.
+        """
+        self.config = get_data_config()
+        self.store = get_partition_store()
+        self.year = get_live_year()
+        self.snapshot_dir = Path(snapshot_dir or os.path.join(self.config.cache_dir, "live", str(self.year)))
+
+    def poll(self, selected_dept: str, force: bool = False) -> int:
+        """
+        Ingest the changes of the scraped listings of a department since the last poll.
+
+        Args:
+            selected_dept (str): The department code.
+            force (bool): Whether to ingest even if the live partition was written less than
+                MIN_SEGMENT_INTERVAL ago.
+
+        Returns:
+            int: The number of added, changed or removed listings, 0 if the scrape did not change
+            or if the partition was written too recently.
+
+        Raises:
+            requests.RequestException: If the scraped file cannot be downloaded.
+        """
+        with self.store.lock(selected_dept, self.year):
+            return self.ingest(selected_dept, force=force)
+
+    def ingest(self, selected_dept: str, force: bool = False) -> int:
+        """
+        Same as poll, for callers already holding the lock of the live partition.
+
+        Args:
+            selected_dept (str): The department code.
+            force (bool): Whether to ingest even if the live partition was written recently.
+
+        Returns:
+            int: The number of added, changed or removed listings, 0 if the scrape did not change.
+        """
+        snapshot = self._load_snapshot(selected_dept)
+        stored = self.store.exists(selected_dept, self.year)
+
+        # The changes accumulate against the snapshot until the partition can be written again
+        last_write = self.store.mtime(selected_dept, self.year)
+        if stored and not force and last_write is not None and time.time() - last_write < MIN_SEGMENT_INTERVAL:
+            return 0
+
+        url = f"{self.config.scrapped_year_current}/{selected_dept}.csv.gz"
+        headers = {"If-None-Match": snapshot["etag"]} if stored and snapshot.get("etag") else {}
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, f"{selected_dept}.csv.gz")
+            with requests.get(url, stream=True, headers=headers) as response:
+                if response.status_code == 304:
+                    return 0
+                response.raise_for_status()
+                etag = response.headers.get("ETag", "")
+                with open(csv_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+
+            listings = DataLoader.clean_data_gouv(csv_path)
+
+        listings, keys, contents = self._hash_listings(listings)
+
+        if not stored or "keys" not in snapshot:
+            print(f"Creating live partition... Year: {self.year}, Department: {selected_dept}")
+            table = self._to_live_table(listings, keys)
+            self.store.write_table(selected_dept, self.year, table)
+            self._save_snapshot(selected_dept, keys, contents, etag)
+            return len(keys)
+
+        changed_rows, removed_keys = self._diff(snapshot["keys"], snapshot["contents"], keys, contents)
+        if len(changed_rows) or len(removed_keys):
+            print(
+                f"Appending live segment... Year: {self.year}, Department: {selected_dept}, "
+                f"Changed: {len(changed_rows)}, Removed: {len(removed_keys)}"
+            )
+            segment = pa.concat_tables(
+                [
+                    self._to_live_table(listings.iloc[changed_rows], keys[changed_rows]),
+                    self._to_removed_table(removed_keys),
+                ]
+            )
+            self.store.append_segment(selected_dept, self.year, segment)
+            if len(self.store.segment_paths(selected_dept, self.year)) > MAX_LIVE_SEGMENTS:
+                self.store.compact(selected_dept, self.year)
+
+        self._save_snapshot(selected_dept, keys, contents, etag)
+        return len(changed_rows) + len(removed_keys)
+
+    @staticmethod
+    def _hash_listings(listings: pd.DataFrame) -> tuple:
+        """
+        Hash the keys and the contents of scraped listings, keeping the last row of each listing.
+
+        Args:
+            listings (pd.DataFrame): The cleaned scraped listings.
+
+        Returns:
+            tuple: The unique listings, their keys and their content hashes.
+        """
+        keys = pd.util.hash_pandas_object(listings[LISTING_KEY_COLUMNS], index=False).to_numpy()
+        contents = pd.util.hash_pandas_object(listings[DATA_GOUV_COLUMNS], index=False).to_numpy()
+
+        # A listing scraped twice is counted once, with its last values
+        _, first_reversed = np.unique(keys[::-1], return_index=True)
+        unique_rows = np.sort(len(keys) - 1 - first_reversed)
+        return listings.iloc[unique_rows], keys[unique_rows], contents[unique_rows]
+
+    @staticmethod
+    def _diff(
+        previous_keys: np.ndarray, previous_contents: np.ndarray, keys: np.ndarray, contents: np.ndarray
+    ) -> tuple:
+        """
+        Compare a scrape with the previous one.
+
+        Args:
+            previous_keys (np.ndarray): The sorted listing keys of the previous scrape.
+            previous_contents (np.ndarray): The content hashes of the previous scrape, aligned with its keys.
+            keys (np.ndarray): The listing keys of the new scrape.
+            contents (np.ndarray): The content hashes of the new scrape.
+
+        Returns:
+            tuple: The positions of the added or changed listings in the new scrape, and the keys of
+            the removed listings.
+        """
+        positions = np.searchsorted(previous_keys, keys)
+        clipped = np.minimum(positions, max(len(previous_keys) - 1, 0))
+        if len(previous_keys):
+            known = previous_keys[clipped] == keys
+            unchanged = known & (previous_contents[clipped] == contents)
+        else:
+            unchanged = np.zeros(len(keys), dtype=bool)
+
+        changed_rows = np.flatnonzero(~unchanged)
+        removed_keys = previous_keys[~np.isin(previous_keys, keys)]
+        return changed_rows, removed_keys
+
+    @staticmethod
+    def _to_live_table(listings: pd.DataFrame, keys: np.ndarray) -> pa.Table:
+        """Convert listings to the schema of the live partitions."""
+        table = pa.Table.from_pandas(listings[DATA_GOUV_COLUMNS], schema=PARTITION_SCHEMA, preserve_index=False)
+        table = table.append_column(LISTING_KEY_COLUMN, pa.array(keys, type=pa.uint64()))
+        return table.append_column(DELETED_COLUMN, pa.array(np.zeros(len(keys), dtype=bool)))
+
+    @staticmethod
+    def _to_removed_table(removed_keys: np.ndarray) -> pa.Table:
+        """Build the deletion markers of removed listings, in the schema of the live partitions."""
+        columns = [pa.nulls(len(removed_keys), field.type) for field in PARTITION_SCHEMA]
+        columns += [pa.array(removed_keys, type=pa.uint64()), pa.array(np.ones(len(removed_keys), dtype=bool))]
+        return pa.Table.from_arrays(columns, schema=LIVE_PARTITION_SCHEMA)
+
+    def _load_snapshot(self, selected_dept: str) -> Dict:
+        """Load the listing keys, content hashes and ETag of the last scrape of a department."""
+        path = self.snapshot_dir / f"{selected_dept}.npz"
+        if not path.exists():
+            return {}
+        with np.load(path) as snapshot:
+            return {"keys": snapshot["keys"], "contents": snapshot["contents"], "etag": str(snapshot["etag"])}
+
+    def _save_snapshot(self, selected_dept: str, keys: np.ndarray, contents: np.ndarray, etag: str) -> None:
+        """Save the listing keys (sorted), content hashes and ETag of a scrape atomically."""
+        self.snapshot_dir.mkdir(parents=True, exist_ok=True)
+        order = np.argsort(keys)
+        path = self.snapshot_dir / f"{selected_dept}.npz"
+        tmp_path = path.with_suffix(".tmp")
+        with open(tmp_path, "wb") as file:
+            np.savez(file, keys=keys[order], contents=contents[order], etag=np.array(etag))
+        os.replace(tmp_path, path)
+
+
+def ingest_live_partition(selected_dept: str, selected_year: int) -> None:
+    """
+    Create the live partition of a department from the scraped listings.
+
+    Called by PartitionStore.ensure, which already holds the lock of the partition.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year, the live year.
+    """
+    LiveIngester().ingest(selected_dept)
+
+
+def list_live_departments() -> List[str]:
+    """Get the departments whose live partition is stored, i.e. that were opened in the app."""
+    live_year = get_live_year()
+    return [dept for dept, year in get_partition_store().list_partitions() if year == live_year]
+
+
+def poll_forever(departments: Optional[List[str]], interval: float) -> None:
+    """
+    Poll the scraped listings of departments at a regular interval.
+
+    Args:
+        departments (Optional[List[str]]): The department codes, the stored live partitions if None.
+        interval (float): Time between two polls of a department in seconds.
+    """
+    ingester = LiveIngester()
+    while True:
+        for dept in departments or list_live_departments():
+            try:
+                print(f"Department {dept}: {ingester.poll(dept)} listings changed")
+            except requests.RequestException as e:
+                print(f"Department {dept}: poll failed ({e})")
+        time.sleep(interval)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Append the changes of the scraped listings to the live partitions.")
+    parser.add_argument("--departments", nargs="*", help="Department codes, defaults to the stored live partitions")
+    parser.add_argument("--interval", type=float, default=900, help="Time between two polls (seconds)")
+    parser.add_argument("--once", action="store_true", help="Poll once and exit")
+    args = parser.parse_args()
+
+    if args.once:
+        for target in args.departments or list_live_departments():
+            print(f"Department {target}: {LiveIngester().poll(target, force=True)} listings changed")
+    else:
+        poll_forever(args.departments, args.interval)
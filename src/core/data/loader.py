@@ -3,14 +3,19 @@ Data loading module for the Sotis Immobilier application.
 This module handles all data loading operations from various sources.
 """
 
-from io import BytesIO
-from typing import Optional
+import os
+import tempfile
+from typing import Callable, List, Optional
 
 import pandas as pd
 import requests
 import streamlit as st
 
 from src.config.config import get_data_config
+from src.core.data.chunked_cleaning import ChunkedCleaner
+from src.core.data.partition_store import get_partition_store
+from src.core.data.summary_store import get_summary_store
+from src.core.data.transforms import DATA_GOUV_COLUMNS, DATA_GOUV_DTYPES, DUPLICATE_SUBSET, format_postal_code
 
 
 class DataLoader:
@@ -20,42 +25,51 @@ class DataLoader:
         """Initialize the DataLoader with configuration settings."""
         self.config = get_data_config()
 
-    @st.cache_data
-    def fetch_summarized_data(self) -> pd.DataFrame:
+    @staticmethod
+    def query_summarized_data(
+        departments: Optional[List[str]] = None,
+        years: Optional[List[int]] = None,
+        property_types: Optional[List[str]] = None,
+        postal_codes: Optional[List[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
         """
-        Fetch the summarized property data from AWS S3.
-        
+        Query the summarized property data.
+
+        Results are not cached: the filters run on the memory-mapped store, shared by all the
+        processes through the page cache, and only the matching rows are materialized.
+
+        Args:
+            departments (Optional[List[str]]): Department codes to keep.
+            years (Optional[List[int]]): Years to keep.
+            property_types (Optional[List[str]]): Property types to keep.
+            postal_codes (Optional[List[str]]): Postal codes to keep.
+            columns (Optional[List[str]]): Columns to return. All columns if None.
+
         Returns:
-            pd.DataFrame: DataFrame containing the summarized property data.
+            pd.DataFrame: DataFrame containing the matching summarized property data.
         """
-        print("Fetching summarized data...")
+        print("Querying summarized data...")
 
         try:
-            response = requests.get(self.config.summarized_data_url)
-            response.raise_for_status()
-            
-            buffer = BytesIO(response.content)
-            properties_summarized = pd.read_csv(
-                buffer,
-                compression="gzip",
-                header=0,
-                sep=",",
-                quotechar='"',
-                low_memory=False,
-                dtype={"code_postal": str},
+            return get_summary_store().query(
+                departments=departments,
+                years=years,
+                property_types=property_types,
+                postal_codes=postal_codes,
+                columns=columns,
             )
-            
-            return properties_summarized
-            
+
         except requests.RequestException as e:
             st.error(f"Error fetching summarized data: {str(e)}")
             raise
 
     @staticmethod
-    @st.cache_data
     def fetch_data_gouv(selected_dept: str, selected_year: int) -> Optional[pd.DataFrame]:
         """
         Load data from the French open data portal.
+
+        Partitions are read from the local partition store, which is filled on the first request.
         
         Args:
             selected_dept (str): The selected department code.
@@ -84,53 +98,9 @@ class DataLoader:
                 - ...
             ...
         """
-        print(f"Fetching data from the French open data portal... Year: {selected_year}, Department: {selected_dept}")
-
         try:
-            config = get_data_config()
-            url = f"{config.datagouv_source_url}/{selected_year}/departements/{selected_dept}.csv.gz"
-            response = requests.get(url)
-            response.raise_for_status()
-
-            buffer = BytesIO(response.content)
-            properties_input = pd.read_csv(
-                buffer,
-                compression="gzip",
-                header=0,
-                sep=",",
-                quotechar='"',
-                low_memory=False,
-                usecols=[
-                    "type_local",
-                    "valeur_fonciere",
-                    "code_postal",
-                    "nom_commune",
-                    "surface_reelle_bati",
-                    "longitude",
-                    "latitude",
-                ],
-                dtype={"code_postal": str},
-            )
-
-            # Data cleaning
-            properties_input.dropna(inplace=True)
-            properties_input.drop_duplicates(
-                subset=["valeur_fonciere", "longitude", "latitude"],
-                inplace=True,
-                keep="last",
-            )
-            properties_input.sort_values("code_postal", inplace=True)
-            
-            # Format postal code
-            properties_input["code_postal"] = (
-                properties_input["code_postal"]
-                .astype(float)
-                .astype(int)
-                .astype(str)
-                .str.zfill(5)
-            )
-
-            return properties_input
+            version = get_partition_store().ensure(selected_dept, selected_year, DataLoader.ingest_partition)
+            return DataLoader.read_partition(selected_dept, selected_year, version)
 
         except requests.RequestException as e:
             st.sidebar.error(
@@ -140,4 +110,177 @@ class DataLoader:
             st.session_state.data_load_error = True
             st.warning("Les données n'ont pas pu être chargées.")
             print(f"Error fetching data: {str(e)}")
-            return None 
\ No newline at end of file
+            return None
+
+    @staticmethod
+    @st.cache_resource(max_entries=32)
+    def read_partition(selected_dept: str, selected_year: int, version: str) -> pd.DataFrame:
+        """
+        Read a partition from the local partition store.
+
+        The DataFrame is shared by all the sessions of the process and attached zero-copy to the
+        memory-mapped partition file: callers must not modify it in place.
+
+        Args:
+            selected_dept (str): The selected department code.
+            selected_year (int): The selected year.
+            version (str): Version of the stored partition, so that refreshed partitions are reloaded.
+
+        Returns:
+            pd.DataFrame: DataFrame containing the property data.
+        """
+        return get_partition_store().read(selected_dept, selected_year)
+
+    @staticmethod
+    def clear_partitions(selected_dept: Optional[str] = None, selected_year: Optional[int] = None) -> None:
+        """
+        Release the partitions read by the process, they are read again from the store on the next query.
+
+        Args:
+            selected_dept (Optional[str]): The department of the partition to release, all the partitions if None.
+            selected_year (Optional[int]): The year of the partition to release.
+        """
+        if selected_dept is None:
+            DataLoader.read_partition.clear()
+            return
+        version = get_partition_store().version(selected_dept, selected_year)
+        DataLoader.read_partition.clear(selected_dept, selected_year, version)
+
+    @staticmethod
+    def ingest_partition(
+        selected_dept: str, selected_year: int, on_chunk: Optional[Callable[[bytes, Optional[int]], None]] = None
+    ) -> None:
+        """
+        Load a partition from its source and write it to the partition store.
+
+        Partitions of the current year are built from the scraped listings, the others are
+        downloaded from the French open data portal.
+
+        Args:
+            selected_dept (str): The selected department code.
+            selected_year (int): The selected year.
+            on_chunk (Optional[Callable[[bytes, Optional[int]], None]]): Called with each downloaded chunk of
+                the open data portal file and the size of the file, if known.
+
+        Raises:
+            requests.RequestException: If the partition cannot be downloaded.
+        """
+        if selected_year == get_data_config().available_years_datagouv[-1] + 1:
+            # Imported here since the live ingester depends on the loader
+            from src.core.data.live_ingester import ingest_live_partition
+
+            ingest_live_partition(selected_dept, selected_year)
+        else:
+            DataLoader.ingest_data_gouv(selected_dept, selected_year, on_chunk)
+
+    @staticmethod
+    def get_source_url(selected_dept: str, selected_year: int) -> str:
+        """
+        Get the URL of the gzipped CSV file a partition is loaded from.
+
+        Args:
+            selected_dept (str): The selected department code.
+            selected_year (int): The selected year.
+
+        Returns:
+            str: The URL of the scraped listings for the current year, of the open data portal file otherwise.
+        """
+        config = get_data_config()
+        if selected_year == config.available_years_datagouv[-1] + 1:
+            return f"{config.scrapped_year_current}/{selected_dept}.csv.gz"
+        return f"{config.datagouv_source_url}/{selected_year}/departements/{selected_dept}.csv.gz"
+
+    @staticmethod
+    def ingest_data_gouv(
+        selected_dept: str, selected_year: int, on_chunk: Optional[Callable[[bytes, Optional[int]], None]] = None
+    ) -> None:
+        """
+        Download a partition from the French open data portal and write it to the partition store.
+
+        Args:
+            selected_dept (str): The selected department code.
+            selected_year (int): The selected year.
+            on_chunk (Optional[Callable[[bytes, Optional[int]], None]]): Called with each downloaded chunk and
+                the size of the file, if known, e.g. to preview the file while it downloads.
+
+        Raises:
+            requests.RequestException: If the partition cannot be downloaded.
+        """
+        print(f"Fetching data from the French open data portal... Year: {selected_year}, Department: {selected_dept}")
+
+        url = DataLoader.get_source_url(selected_dept, selected_year)
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, f"{selected_dept}.csv.gz")
+            with requests.get(url, stream=True) as response:
+                response.raise_for_status()
+                content_length = response.headers.get("Content-Length")
+                total_bytes = int(content_length) if content_length else None
+                with open(csv_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+                        if on_chunk is not None:
+                            on_chunk(chunk, total_bytes)
+
+            DataLoader.ingest_file(csv_path, selected_dept, selected_year)
+
+    @staticmethod
+    def ingest_file(csv_path: str, selected_dept: str, selected_year: int) -> None:
+        """
+        Clean a downloaded gzipped CSV file and write it to the partition store.
+
+        Files larger than the configured threshold are cleaned by chunks, within the configured
+        memory limit, instead of being loaded whole.
+
+        Args:
+            csv_path (str): Path of the gzipped CSV file.
+            selected_dept (str): The selected department code.
+            selected_year (int): The selected year.
+        """
+        config = get_data_config()
+        store = get_partition_store()
+
+        if os.path.getsize(csv_path) > config.chunked_cleaning_threshold_bytes:
+            print(f"Cleaning by chunks... Year: {selected_year}, Department: {selected_dept}")
+            cleaner = ChunkedCleaner(config.cleaning_memory_limit_bytes)
+            store.write_batches(selected_dept, selected_year, cleaner.clean(csv_path), cleaner.schema)
+        else:
+            store.write(selected_dept, selected_year, DataLoader.clean_data_gouv(csv_path))
+
+    @staticmethod
+    def clean_data_gouv(source, nrows: Optional[int] = None) -> pd.DataFrame:
+        """
+        Parse and clean a gzipped CSV file from the French open data portal.
+
+        Args:
+            source (str or file-like): Path or binary stream of the gzipped CSV file.
+            nrows (Optional[int]): Number of rows to read from the start of the file. All rows if None.
+
+        Returns:
+            pd.DataFrame: DataFrame containing the cleaned property data.
+        """
+        properties_input = pd.read_csv(
+            source,
+            compression="gzip",
+            header=0,
+            sep=",",
+            quotechar='"',
+            low_memory=False,
+            usecols=DATA_GOUV_COLUMNS,
+            dtype=DATA_GOUV_DTYPES,
+            nrows=nrows,
+        )
+
+        # Data cleaning
+        properties_input.dropna(inplace=True)
+        properties_input.drop_duplicates(
+            subset=DUPLICATE_SUBSET,
+            inplace=True,
+            keep="last",
+        )
+        properties_input.sort_values("code_postal", inplace=True)
+        
+        # Format postal code
+        properties_input["code_postal"] = format_postal_code(properties_input["code_postal"])
+
+        return properties_input
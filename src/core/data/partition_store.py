@@ -0,0 +1,435 @@
+"""
+Partition store module for the Sotis Immobilier application.
+This module persists the cleaned (department, year) partitions on the local disk so that
+the Streamlit app and the headless API share the same cache layer.
+
+Partitions are stored as uncompressed Arrow IPC files holding a single record batch, and read
+through memory maps: all the processes of a node attach to the same pages of the page cache
+instead of each holding a copy, and a partition loaded by one process is immediately available
+to the others. With one batch, every column is a single contiguous chunk that pandas can wrap
+without copying it: numeric columns as NumPy arrays, text columns as Arrow-backed columns.
+
+Live partitions (the listings of the current year) also have append-only segments holding the
+listings added, changed or removed since the partition file was written. Their rows carry the
+key of their listing, and only the latest row of each listing is read.
+"""
+
+import os
+import tempfile
+from contextlib import contextmanager
+from functools import lru_cache
+from pathlib import Path
+from typing import Callable, Iterable, Iterator, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.config.config import get_data_config
+
+try:
+    import fcntl
+except ImportError:  # Windows: no inter-process lock, concurrent loads just write the same file
+    fcntl = None
+
+# Number of rows per record batch when streaming a partition
+STREAM_BATCH_SIZE = 64 * 1024
+
+# Columns of the live partitions: the key of the listing of a row, and whether the listing was removed
+LISTING_KEY_COLUMN = "cle_annonce"
+DELETED_COLUMN = "supprime"
+
+
+def resolve_listings(table: pa.Table, drop_columns: bool = True) -> pa.Table:
+    """
+    Keep the latest row of each listing of a live partition, dropping the removed listings.
+
+    Args:
+        table (pa.Table): The rows of the partition file followed by those of its segments.
+        drop_columns (bool): Whether to drop the key and deletion columns.
+
+    Returns:
+        pa.Table: The current listings.
+    """
+    keys = table[LISTING_KEY_COLUMN].to_numpy()
+
+    # The first occurrence in the reversed array is the latest row of the listing
+    _, first_reversed = np.unique(keys[::-1], return_index=True)
+    latest = np.zeros(len(keys), dtype=bool)
+    latest[len(keys) - 1 - first_reversed] = True
+    latest &= ~table[DELETED_COLUMN].to_numpy(zero_copy_only=False)
+
+    table = table.filter(pa.array(latest))
+    return table.drop_columns([LISTING_KEY_COLUMN, DELETED_COLUMN]) if drop_columns else table
+
+
+def _map_text_type(arrow_type: pa.DataType) -> Optional[pd.ArrowDtype]:
+    """Get an Arrow-backed pandas type for the text columns, None for the default conversion."""
+    if pa.types.is_string(arrow_type) or pa.types.is_large_string(arrow_type):
+        return pd.ArrowDtype(arrow_type)
+    return None
+
+
+def table_to_pandas(table: pa.Table) -> pd.DataFrame:
+    """
+    Convert a memory-mapped partition table to a DataFrame without copying its columns.
+
+    Single-chunk numeric columns are wrapped as NumPy arrays, and text columns are kept as
+    Arrow-backed string columns instead of being converted to per-process Python objects.
+
+    Args:
+        table (pa.Table): The partition data.
+
+    Returns:
+        pd.DataFrame: The partition data, sharing the buffers of the table.
+    """
+    return table.to_pandas(split_blocks=True, types_mapper=_map_text_type)
+
+
+class PartitionStore:
+    """Class responsible for storing and reading the cleaned data partitions."""
+
+    def __init__(self, root: Optional[str] = None):
+        """
+        Initialize the PartitionStore.
+
+        Args:
+            root (Optional[str]): Root directory of the partitions. Defaults to the configured partitions
+                directory, which should be node-local (e.g. /dev/shm) to be shared by the workers of a node.
+        """
+        self.root = Path(root or get_data_config().partitions_dir)
+
+    def path(self, selected_dept: str, selected_year: int) -> Path:
+        """
+        Get the path of a partition file.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            Path: Path of the partition file.
+        """
+        return self.root / str(selected_year) / f"{selected_dept}.arrow"
+
+    def segment_paths(self, selected_dept: str, selected_year: int) -> List[Path]:
+        """
+        Get the segment files of a live partition.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            List[Path]: The segment files, oldest first. Empty for the other partitions.
+        """
+        return sorted(self.path(selected_dept, selected_year).with_suffix(".segments").glob("*.arrow"))
+
+    def exists(self, selected_dept: str, selected_year: int) -> bool:
+        """Check whether a partition is stored."""
+        return self.path(selected_dept, selected_year).exists()
+
+    def mtime(self, selected_dept: str, selected_year: int) -> Optional[float]:
+        """
+        Get the time a stored partition, or one of its segments, was last written.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            Optional[float]: The modification time in seconds or None if the partition is not stored.
+        """
+        try:
+            paths = [self.path(selected_dept, selected_year), *self.segment_paths(selected_dept, selected_year)]
+            return max(os.path.getmtime(path) for path in paths)
+        except FileNotFoundError:
+            return None
+
+    def version(self, selected_dept: str, selected_year: int) -> Optional[str]:
+        """
+        Get a version tag of a stored partition, changing whenever the partition is rewritten.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            Optional[str]: The version tag or None if the partition is not stored.
+        """
+        try:
+            paths = [self.path(selected_dept, selected_year), *self.segment_paths(selected_dept, selected_year)]
+            stats = [path.stat() for path in paths]
+        except FileNotFoundError:
+            return None
+        return "-".join(f"{stat.st_mtime_ns:x}-{stat.st_size:x}" for stat in stats)
+
+    def read_table(self, selected_dept: str, selected_year: int) -> pa.Table:
+        """
+        Attach to a stored partition without copying it.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            pa.Table: The partition data, backed by the memory-mapped files.
+        """
+        table = self._read_files(selected_dept, selected_year)
+        if LISTING_KEY_COLUMN in table.schema.names:
+            table = resolve_listings(table)
+        return table
+
+    def _read_files(self, selected_dept: str, selected_year: int) -> pa.Table:
+        """Attach to the partition file and the segments of a partition, concatenated without copy."""
+        paths = [self.path(selected_dept, selected_year), *self.segment_paths(selected_dept, selected_year)]
+        return pa.concat_tables([pa.ipc.open_file(pa.memory_map(str(path), "r")).read_all() for path in paths])
+
+    def read(self, selected_dept: str, selected_year: int, columns: Optional[List[str]] = None) -> pd.DataFrame:
+        """
+        Read a stored partition.
+
+        The columns stay zero-copy views of the memory-mapped file, the text columns being read as
+        Arrow-backed string columns.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            columns (Optional[List[str]]): Columns to read. All columns if None.
+
+        Returns:
+            pd.DataFrame: The partition data.
+        """
+        table = self.read_table(selected_dept, selected_year)
+        if columns is not None:
+            table = table.select(columns)
+        return table_to_pandas(table)
+
+    def write(self, selected_dept: str, selected_year: int, properties_data: pd.DataFrame) -> None:
+        """
+        Store a partition, replacing any previous version atomically.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            properties_data (pd.DataFrame): The cleaned partition data.
+        """
+        self.write_table(selected_dept, selected_year, pa.Table.from_pandas(properties_data, preserve_index=False))
+
+    def write_table(self, selected_dept: str, selected_year: int, table: pa.Table) -> None:
+        """
+        Store a partition as a single record batch, replacing any previous version atomically.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            table (pa.Table): The cleaned partition data.
+        """
+        path = self.path(selected_dept, selected_year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+        self._write_single_batch(path, table)
+
+    def write_batches(
+        self, selected_dept: str, selected_year: int, batches: Iterable[pa.RecordBatch], schema: pa.Schema
+    ) -> None:
+        """
+        Store a partition from record batches, holding at most one column of the partition in memory.
+
+        The batches are streamed to a temporary file. Each column is then combined into a single chunk
+        on its own and written to its own temporary file, and the partition file is written as a single
+        record batch from these memory-mapped columns.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            batches (Iterable[pa.RecordBatch]): The cleaned partition data, batch by batch.
+            schema (pa.Schema): The schema of the batches.
+        """
+        path = self.path(selected_dept, selected_year)
+        path.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir=path.parent, suffix=".tmp") as tmp_dir:
+            stream_path = os.path.join(tmp_dir, "stream.arrow")
+            with pa.OSFile(stream_path, "wb") as sink, pa.ipc.new_stream(sink, schema) as writer:
+                for batch in batches:
+                    writer.write_batch(batch)
+
+            table = pa.ipc.open_stream(pa.memory_map(stream_path, "r")).read_all()
+            columns = [
+                self._combine_column(table.column(i), os.path.join(tmp_dir, f"{i}.arrow"))
+                for i in range(table.num_columns)
+            ]
+            self._write_single_batch(path, pa.Table.from_arrays(columns, schema=table.schema))
+
+    @staticmethod
+    def _combine_column(column: pa.ChunkedArray, path: str) -> pa.Array:
+        """
+        Combine the chunks of a column through a file, so that it is released from memory once written.
+
+        Args:
+            column (pa.ChunkedArray): The column, possibly memory-mapped.
+            path (str): Path of the temporary file of the column.
+
+        Returns:
+            pa.Array: The column as a single array, memory-mapped from its file.
+        """
+        schema = pa.schema([pa.field("column", column.type)])
+        with pa.OSFile(path, "wb") as sink, pa.ipc.new_file(sink, schema) as writer:
+            writer.write_batch(pa.record_batch([column.combine_chunks()], schema=schema))
+        return pa.ipc.open_file(pa.memory_map(path, "r")).get_batch(0).column(0)
+
+    @staticmethod
+    def _write_single_batch(path: Path, table: pa.Table) -> None:
+        """
+        Write a table as an Arrow IPC file of a single record batch, replacing the file atomically.
+
+        Args:
+            path (Path): Path of the file.
+            table (pa.Table): The data to write.
+        """
+        # One chunk per column gives one record batch, read back without copy
+        table = table.combine_chunks()
+
+        fd, tmp_path = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        os.close(fd)
+        try:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            # Readers that already mapped the previous file keep it until they release it
+            os.replace(tmp_path, path)
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def append_segment(self, selected_dept: str, selected_year: int, table: pa.Table) -> None:
+        """
+        Append a segment to a live partition.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            table (pa.Table): The added, changed or removed listings, with the schema of the partition file.
+        """
+        segments_dir = self.path(selected_dept, selected_year).with_suffix(".segments")
+        segments_dir.mkdir(parents=True, exist_ok=True)
+        segment_paths = self.segment_paths(selected_dept, selected_year)
+        sequence = int(segment_paths[-1].stem) + 1 if segment_paths else 1
+
+        fd, tmp_path = tempfile.mkstemp(dir=segments_dir, suffix=".tmp")
+        os.close(fd)
+        try:
+            with pa.OSFile(tmp_path, "wb") as sink, pa.ipc.new_file(sink, table.schema) as writer:
+                writer.write_table(table)
+            os.replace(tmp_path, segments_dir / f"{sequence:06d}.arrow")
+        finally:
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+
+    def compact(self, selected_dept: str, selected_year: int) -> None:
+        """
+        Merge the segments of a live partition into its partition file.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+        """
+        segment_paths = self.segment_paths(selected_dept, selected_year)
+        table = resolve_listings(self._read_files(selected_dept, selected_year), drop_columns=False)
+        self.write_table(selected_dept, selected_year, table)
+
+        # Oldest first, so that the remaining segments always override the merged rows consistently
+        for path in segment_paths:
+            path.unlink()
+
+    def ensure(self, selected_dept: str, selected_year: int, ingest_partition: Callable[[str, int], None]) -> str:
+        """
+        Make sure a partition is stored, ingesting it from its source if needed.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            ingest_partition (Callable[[str, int], None]): Function loading a partition from its source
+                and writing it to the store.
+
+        Returns:
+            str: The version of the stored partition.
+        """
+        if not self.exists(selected_dept, selected_year):
+            # Only one process of the node loads a given partition, the others wait and attach to it
+            with self.lock(selected_dept, selected_year):
+                if not self.exists(selected_dept, selected_year):
+                    ingest_partition(selected_dept, selected_year)
+        return self.version(selected_dept, selected_year)
+
+    @contextmanager
+    def lock(self, selected_dept: str, selected_year: int) -> Iterator[None]:
+        """
+        Hold an exclusive inter-process lock on a partition.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+        """
+        path = self.path(selected_dept, selected_year).with_suffix(".lock")
+        path.parent.mkdir(parents=True, exist_ok=True)
+        with open(path, "w") as lock_file:
+            if fcntl is not None:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+            try:
+                yield
+            finally:
+                if fcntl is not None:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+    def iter_batches(
+        self,
+        selected_dept: str,
+        selected_year: int,
+        columns: Optional[List[str]] = None,
+        batch_size: int = STREAM_BATCH_SIZE,
+    ) -> Iterator[pa.RecordBatch]:
+        """
+        Iterate over a stored partition batch by batch without reading it whole.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            columns (Optional[List[str]]): Columns to read. All columns if None.
+            batch_size (int): Maximum number of rows per batch.
+
+        Yields:
+            pa.RecordBatch: The next batch of the partition.
+        """
+        table = self.read_table(selected_dept, selected_year)
+        if columns is not None:
+            table = table.select(columns)
+        yield from table.to_batches(max_chunksize=batch_size)
+
+    def list_partitions(self) -> List[Tuple[str, int]]:
+        """
+        List the stored partitions.
+
+        Returns:
+            List[Tuple[str, int]]: The (department, year) pairs of the stored partitions.
+        """
+        return sorted((path.stem, int(path.parent.name)) for path in self.root.glob("*/*.arrow"))
+
+    def schema(self, selected_dept: str, selected_year: int) -> pa.Schema:
+        """Get the Arrow schema of a stored partition."""
+        with pa.memory_map(str(self.path(selected_dept, selected_year)), "r") as source:
+            schema = pa.ipc.open_file(source).schema
+        for column in (LISTING_KEY_COLUMN, DELETED_COLUMN):
+            if column in schema.names:
+                schema = schema.remove(schema.get_field_index(column))
+        return schema
+
+
+@lru_cache(maxsize=None)
+def get_partition_store() -> PartitionStore:
+    """
+    Get the process-wide partition store.
+
+    Returns:
+        PartitionStore: The shared partition store instance.
+    """
+    return PartitionStore()
@@ -0,0 +1,281 @@
+"""
+Percentiles module for the Sotis Immobilier application.
+This module precomputes the sorted prices of a partition per department, postal code and commune,
+stored as flat memory-mapped arrays, so that the percentile rank of a price is a binary search.
+"""
+
+from pathlib import Path
+from typing import Dict, List, Optional, Sequence, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import streamlit as st
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.artifacts import artifact_path, is_fresh, register_artifact, slugify
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import select_property_type
+
+# Levels of the distributions, with their key column (None for the whole department)
+PERCENTILE_LEVELS = {
+    "department": None,
+    "postal-codes": "code_postal",
+    "communes": "nom_commune",
+}
+
+# Price columns the distributions are computed for
+PERCENTILE_VALUE_COLUMNS = ["prix_m2", "valeur_fonciere"]
+
+# Key of the distribution of the whole department
+DEPARTMENT_KEY = ""
+
+PERCENTILE_SCHEMA = pa.schema(
+    [
+        pa.field("level", pa.string()),
+        pa.field("value_column", pa.string()),
+        pa.field("key", pa.string()),
+        pa.field("values", pa.list_(pa.float32())),
+    ]
+)
+
+
+class PercentileTable:
+    """Class responsible for the percentile rank of prices among the transactions of a partition."""
+
+    def __init__(self, table: pa.Table):
+        """
+        Initialize the PercentileTable.
+
+        Args:
+            table (pa.Table): One row per distribution, in PERCENTILE_SCHEMA, with sorted values.
+        """
+        values = table.column("values").combine_chunks()
+        # All the distributions share one flat array: distribution i is values[offsets[i]:offsets[i + 1]]
+        self.values = values.values.to_numpy(zero_copy_only=False)
+        offsets = values.offsets.to_numpy()
+
+        self.groups: Dict[Tuple[str, str, str], Tuple[int, int]] = {
+            (level, value_column, key): (int(offsets[i]), int(offsets[i + 1]))
+            for i, (level, value_column, key) in enumerate(
+                zip(
+                    table.column("level").to_pylist(),
+                    table.column("value_column").to_pylist(),
+                    table.column("key").to_pylist(),
+                )
+            )
+        }
+
+    @staticmethod
+    def build(properties_data: pd.DataFrame) -> pa.Table:
+        """
+        Compute the sorted prices of the transactions per level and key.
+
+        Args:
+            properties_data (pd.DataFrame): The transactions of one property type, with a "prix_m2" column.
+
+        Returns:
+            pa.Table: The distributions, in PERCENTILE_SCHEMA.
+        """
+        levels, value_columns, keys, lengths, chunks = [], [], [], [], []
+        for value_column in PERCENTILE_VALUE_COLUMNS:
+            values = properties_data[value_column].to_numpy(dtype=np.float32)
+            valid = np.isfinite(values)
+            values = values[valid]
+
+            for level, key_column in PERCENTILE_LEVELS.items():
+                if key_column is None:
+                    codes, names = np.zeros(len(values), dtype=np.int64), pd.Index([DEPARTMENT_KEY])
+                else:
+                    codes, names = pd.factorize(properties_data[key_column].to_numpy()[valid], sort=True)
+
+                # Sorted by key, then by value: the distribution of each key is a contiguous sorted run
+                order = np.lexsort((values, codes))
+                counts = np.bincount(codes, minlength=len(names))
+                chunks.append(values[order])
+                levels += [level] * len(names)
+                value_columns += [value_column] * len(names)
+                keys += [str(name) for name in names]
+                lengths.append(counts)
+
+        offsets = np.concatenate([[0], np.cumsum(np.concatenate(lengths))]).astype(np.int32)
+        flat_values = pa.array(np.concatenate(chunks), type=pa.float32())
+        return pa.Table.from_arrays(
+            [
+                pa.array(levels, type=pa.string()),
+                pa.array(value_columns, type=pa.string()),
+                pa.array(keys, type=pa.string()),
+                pa.ListArray.from_arrays(pa.array(offsets, type=pa.int32()), flat_values),
+            ],
+            schema=PERCENTILE_SCHEMA,
+        )
+
+    def keys(self, level: str, value_column: str) -> List[str]:
+        """Get the sorted keys of the distributions of a level."""
+        return sorted(
+            key
+            for group_level, group_column, key in self.groups
+            if (group_level, group_column) == (level, value_column)
+        )
+
+    def distribution(self, level: str, value_column: str, key: str = DEPARTMENT_KEY) -> np.ndarray:
+        """
+        Get the sorted prices of a distribution.
+
+        Args:
+            level (str): A key of PERCENTILE_LEVELS.
+            value_column (str): One of PERCENTILE_VALUE_COLUMNS.
+            key (str): The postal code or commune name, ignored at the department level.
+
+        Returns:
+            np.ndarray: The sorted prices, empty if the key is unknown.
+        """
+        if level == "department":
+            key = DEPARTMENT_KEY
+        start, end = self.groups.get((level, value_column, key), (0, 0))
+        return self.values[start:end]
+
+    def rank(self, level: str, value_column: str, key: str, prices) -> np.ndarray:
+        """
+        Get the percentile ranks of prices within one distribution.
+
+        The rank counts ties for half, so that a price equal to every transaction ranks 50.
+
+        Args:
+            level (str): A key of PERCENTILE_LEVELS.
+            value_column (str): One of PERCENTILE_VALUE_COLUMNS.
+            key (str): The postal code or commune name, ignored at the department level.
+            prices (float or array-like): The prices to rank.
+
+        Returns:
+            np.ndarray: The ranks between 0 and 100, NaN if the distribution is empty.
+        """
+        distribution = self.distribution(level, value_column, key)
+        prices = np.asarray(prices, dtype=np.float32)
+        if len(distribution) == 0:
+            return np.full(prices.shape, np.nan)
+        below = np.searchsorted(distribution, prices, side="left")
+        at_or_below = np.searchsorted(distribution, prices, side="right")
+        return 100.0 * (below + at_or_below) / (2 * len(distribution))
+
+    def rank_batch(self, level: str, value_column: str, keys: Optional[Sequence[str]], prices) -> np.ndarray:
+        """
+        Get the percentile ranks of many prices, each within the distribution of its own key.
+
+        Prices are grouped by key, so there is one binary search per distinct key.
+
+        Args:
+            level (str): A key of PERCENTILE_LEVELS.
+            value_column (str): One of PERCENTILE_VALUE_COLUMNS.
+            keys (Optional[Sequence[str]]): The key of each price, ignored at the department level.
+            prices (array-like): The prices to rank.
+
+        Returns:
+            np.ndarray: The ranks between 0 and 100 in the input order, NaN for unknown keys.
+        """
+        prices = np.asarray(prices, dtype=np.float32)
+        if level == "department" or keys is None:
+            return self.rank(level, value_column, DEPARTMENT_KEY, prices)
+
+        codes, names = pd.factorize(np.asarray(keys, dtype=object))
+        ranks = np.full(len(prices), np.nan)
+        for code, key in enumerate(names):
+            positions = np.flatnonzero(codes == code)
+            ranks[positions] = self.rank(level, value_column, key, prices[positions])
+        return ranks
+
+
+@register_artifact("percentiles")
+def build_percentile_tables(selected_dept: str, selected_year: int) -> None:
+    """
+    Build and save the percentile table of every property type of a partition.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+    """
+    properties_data = get_partition_store().read(selected_dept, selected_year)
+    for local_type in PROPERTY_TYPES:
+        table = PercentileTable.build(select_property_type(properties_data, local_type))
+        _write_percentile_table(table, _percentile_table_path(selected_dept, selected_year, local_type))
+
+
+def get_percentile_table(selected_dept: str, selected_year: int, selected_local_type: str) -> Optional[PercentileTable]:
+    """
+    Get the percentile table of a (department, year, property type) partition.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+
+    Returns:
+        Optional[PercentileTable]: The percentile table or None if the partition could not be loaded.
+    """
+    properties_data = DataLoader.fetch_data_gouv(selected_dept, selected_year)
+    if properties_data is None:
+        return None
+
+    version = get_partition_store().version(selected_dept, selected_year)
+    return load_percentile_table(selected_dept, selected_year, selected_local_type, version)
+
+
+@st.cache_resource(max_entries=16)
+def load_percentile_table(
+    selected_dept: str, selected_year: int, selected_local_type: str, version: str
+) -> PercentileTable:
+    """
+    Load the saved percentile table of a stored partition, building it if it is missing or outdated.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+        version (str): Version of the stored partition, part of the cache key only.
+
+    Returns:
+        PercentileTable: The percentile table, memory-mapped from its file.
+    """
+    path = _percentile_table_path(selected_dept, selected_year, selected_local_type)
+    if not is_fresh(path, selected_dept, selected_year):
+        print(
+            f"Building percentile table... Year: {selected_year}, Department: {selected_dept}, "
+            f"Type: {selected_local_type}"
+        )
+        properties_data = get_partition_store().read(selected_dept, selected_year)
+        table = PercentileTable.build(select_property_type(properties_data, selected_local_type))
+        _write_percentile_table(table, path)
+
+    # The memory map stays open as long as the table references it
+    return PercentileTable(ipc.open_file(pa.memory_map(str(path), "r")).read_all())
+
+
+def clear_percentile_tables(selected_dept: Optional[str] = None, selected_year: Optional[int] = None) -> None:
+    """
+    Clear the percentile tables held in memory, they are reloaded from disk on the next query.
+
+    Args:
+        selected_dept (Optional[str]): The department of the partition to clear, all the partitions if None.
+        selected_year (Optional[int]): The year of the partition to clear.
+    """
+    if selected_dept is None:
+        load_percentile_table.clear()
+        return
+    version = get_partition_store().version(selected_dept, selected_year)
+    for selected_local_type in PROPERTY_TYPES:
+        load_percentile_table.clear(selected_dept, selected_year, selected_local_type, version)
+
+
+def _write_percentile_table(table: pa.Table, path: Path) -> None:
+    """Write a percentile table atomically as an Arrow IPC file."""
+    tmp_path = path.with_suffix(".tmp")
+    with ipc.new_file(tmp_path, table.schema) as writer:
+        writer.write_table(table)
+    tmp_path.replace(path)
+
+
+def _percentile_table_path(selected_dept: str, selected_year: int, selected_local_type: str) -> Path:
+    """Get the path of the saved percentile table of a partition."""
+    return artifact_path("percentiles", selected_dept, selected_year, f"{slugify(selected_local_type)}.arrow")
@@ -0,0 +1,190 @@
+"""
+Price index module for the Sotis Immobilier application.
+This module computes, once per department, the yearly price index of every postal code and
+commune across all the available years, so that price evolutions are read without scanning
+the partitions of every year.
+
+Usage:
+    python -m src.core.data.price_index --departments 72 75
+"""
+
+import argparse
+from typing import List, Optional
+
+import numpy as np
+import pandas as pd
+import requests
+
+from src.config.departments import DEPARTMENTS
+from src.config.years import AVAILABLE_YEARS
+from src.core.data.artifacts import artifact_path, is_fresh, register_artifact
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+
+# Number of years pooled by the rolling medians
+ROLLING_YEARS = 3
+
+# Grouping keys of each level of the index
+PRICE_INDEX_LEVELS = {
+    "postal-codes": ["code_postal"],
+    "communes": ["code_postal", "nom_commune"],
+}
+
+# Columns needed to compute the index
+PRICE_INDEX_SOURCE_COLUMNS = ["type_local", "code_postal", "nom_commune", "valeur_fonciere", "surface_reelle_bati"]
+
+
+def _read_transactions(selected_dept: str, selected_year: int) -> pd.DataFrame:
+    """
+    Read the transactions of a partition with their price per square meter.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+
+    Returns:
+        pd.DataFrame: The grouping keys, the year and the price per square meter of each transaction.
+    """
+    transactions = get_partition_store().read(selected_dept, selected_year, columns=PRICE_INDEX_SOURCE_COLUMNS)
+    transactions = transactions[transactions["surface_reelle_bati"] > 0]
+    return pd.DataFrame(
+        {
+            "type_local": transactions["type_local"],
+            "code_postal": transactions["code_postal"],
+            "nom_commune": transactions["nom_commune"],
+            "annee": np.int16(selected_year),
+            "prix_m2": (transactions["valeur_fonciere"] / transactions["surface_reelle_bati"]).astype(np.float32),
+        }
+    )
+
+
+def compute_price_index(transactions: pd.DataFrame, keys: List[str]) -> pd.DataFrame:
+    """
+    Compute the yearly price index of groups of transactions.
+
+    Args:
+        transactions (pd.DataFrame): The transactions of all the years, with "annee" and "prix_m2" columns.
+        keys (List[str]): The columns identifying a group besides the property type, e.g. ["code_postal"].
+
+    Returns:
+        pd.DataFrame: One row per (property type, group, year) with the median price per square meter,
+        the number of transactions, the change from the previous year (%) and the median price per
+        square meter of the transactions of the last ROLLING_YEARS years.
+    """
+    group_keys = ["type_local", *keys]
+
+    index = (
+        transactions.groupby(group_keys + ["annee"], observed=True)
+        .agg(prix_m2_median=("prix_m2", "median"), nombre_transactions=("prix_m2", "size"))
+        .reset_index()
+    )
+
+    # Rolling medians pool the transactions of the previous years, by counting each transaction
+    # in the ROLLING_YEARS windows it belongs to
+    last_year = transactions["annee"].max()
+    windows = pd.concat(
+        [
+            transactions[group_keys + ["prix_m2"]].assign(annee=transactions["annee"] + offset)
+            for offset in range(ROLLING_YEARS)
+        ],
+        ignore_index=True,
+    )
+    rolling = (
+        windows[windows["annee"] <= last_year]
+        .groupby(group_keys + ["annee"], observed=True)["prix_m2"]
+        .median()
+        .rename("prix_m2_median_glissant")
+        .reset_index()
+    )
+    index = index.merge(rolling, on=group_keys + ["annee"], how="left").sort_values(group_keys + ["annee"])
+
+    # Changes are only computed between consecutive years
+    previous = index.groupby(group_keys, observed=True)[["annee", "prix_m2_median"]].shift()
+    index["variation_annuelle"] = ((index["prix_m2_median"] / previous["prix_m2_median"] - 1) * 100).where(
+        previous["annee"] == index["annee"] - 1
+    )
+
+    return index.astype(
+        {
+            "annee": np.int16,
+            "nombre_transactions": np.int32,
+            "prix_m2_median": np.float32,
+            "prix_m2_median_glissant": np.float32,
+            "variation_annuelle": np.float32,
+        }
+    ).reset_index(drop=True)
+
+
+@register_artifact("price_index", scope="department")
+def build_price_index(selected_dept: str, selected_year: Optional[int] = None) -> None:
+    """
+    Build the price index of a department across all the available years.
+
+    Missing partitions are ingested first; years that cannot be downloaded are left out.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (Optional[int]): Unused, the index always covers all the available years.
+    """
+    store = get_partition_store()
+    frames = []
+    for year in AVAILABLE_YEARS:
+        try:
+            store.ensure(selected_dept, year, DataLoader.ingest_data_gouv)
+        except requests.RequestException as e:
+            print(f"Skipping year {year} of department {selected_dept} in the price index: {e}")
+            continue
+        frames.append(_read_transactions(selected_dept, year))
+
+    if not frames:
+        return
+
+    # Categorical keys keep the grouping cheap and the stored file small
+    transactions = pd.concat(frames, ignore_index=True)
+    transactions = transactions.astype({"type_local": "category", "code_postal": "category", "nom_commune": "category"})
+
+    print(f"Building price index... Department: {selected_dept}, Years: {sorted(transactions['annee'].unique())}")
+    for level, keys in PRICE_INDEX_LEVELS.items():
+        compute_price_index(transactions, keys).to_parquet(
+            artifact_path("price_index", selected_dept, None, f"{level}.parquet"), index=False, compression="zstd"
+        )
+
+
+def load_price_index(
+    selected_dept: str,
+    selected_local_type: str,
+    level: str = "communes",
+    postal_code: Optional[str] = None,
+) -> Optional[pd.DataFrame]:
+    """
+    Read the price index of a department.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_local_type (str): The property type.
+        level (str): "postal-codes" or "communes".
+        postal_code (Optional[str]): Only read the groups of this postal code.
+
+    Returns:
+        Optional[pd.DataFrame]: The index, or None if it was not built since the partitions last changed.
+    """
+    path = artifact_path("price_index", selected_dept, None, f"{level}.parquet")
+    store = get_partition_store()
+    stored_years = [year for year in AVAILABLE_YEARS if store.exists(selected_dept, year)]
+    if not path.exists() or not all(is_fresh(path, selected_dept, year) for year in stored_years):
+        return None
+
+    filters = [("type_local", "==", selected_local_type)]
+    if postal_code is not None:
+        filters.append(("code_postal", "==", postal_code))
+    price_index = pd.read_parquet(path, filters=filters)
+    return price_index.drop(columns=["type_local"]).astype({key: str for key in PRICE_INDEX_LEVELS[level]})
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the multi-year price index of departments.")
+    parser.add_argument("--departments", nargs="*", help="Department codes, defaults to all the departments")
+    args = parser.parse_args()
+
+    for dept in args.departments or DEPARTMENTS:
+        build_price_index(dept)
@@ -0,0 +1,313 @@
+"""
+Progressive loading module for the Sotis Immobilier application.
+This module loads a partition in the background and previews its source file while it downloads:
+a uniform sample of the rows received so far is refreshed batch by batch, so that approximate
+statistics, with their confidence bounds, can be shown and refined before the partition is complete.
+"""
+
+import io
+import threading
+import zlib
+from concurrent.futures import Future, ThreadPoolExecutor
+from dataclasses import dataclass
+from functools import partial
+from statistics import NormalDist
+from typing import Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import DATA_GOUV_COLUMNS, DATA_GOUV_DTYPES, format_postal_code
+from src.core.monitoring.metrics import get_metrics_registry
+
+# Number of transactions of the preview, drawn uniformly from the rows downloaded so far
+PREVIEW_ROWS = 20_000
+
+# Decompressed bytes of the source file parsed at once to refresh the preview
+PREVIEW_BATCH_BYTES = 8 * 1024 * 1024
+
+# Time a run waits for the background load before rerunning with the latest preview (seconds)
+PREVIEW_POLL_SECONDS = 2.0
+
+# Window bits of zlib for the gzip format
+GZIP_WBITS = zlib.MAX_WBITS | 16
+
+# Partitions loaded in the background, shared by all the sessions of the process
+INGESTION_EXECUTOR = ThreadPoolExecutor(max_workers=4, thread_name_prefix="ingestion")
+_ingestions: Dict[Tuple[str, int], Future] = {}
+_ingestions_lock = threading.Lock()
+
+# Latest previews of the partitions being loaded, kept until their load finishes
+_previews: Dict[Tuple[str, int], "PartitionPreview"] = {}
+
+
+@dataclass(frozen=True)
+class PartitionPreview:
+    """Uniform sample of the rows of a partition downloaded so far, and the share of the file they cover."""
+    properties_data: pd.DataFrame
+    rows_read: int
+    bytes_read: int
+    total_bytes: Optional[int]
+
+    @property
+    def fraction(self) -> Optional[float]:
+        """Share of the compressed source file downloaded, None if its size is unknown."""
+        if not self.total_bytes:
+            return None
+        return min(self.bytes_read / self.total_bytes, 1.0)
+
+    def estimate_rows(self, rows: int) -> Optional[int]:
+        """
+        Extrapolate a number of rows of the sample to the whole file.
+
+        Args:
+            rows (int): The number of rows of the sample, e.g. of one property type.
+
+        Returns:
+            Optional[int]: The estimated number of rows in the whole file, None if its size is unknown.
+        """
+        if not self.fraction or self.properties_data.empty:
+            return None
+        return int(round(rows * self.rows_read / len(self.properties_data) / self.fraction))
+
+
+class PreviewBuilder:
+    """Class responsible for previewing a gzipped source file from its chunks, as they are downloaded."""
+
+    def __init__(self, sample_rows: int = PREVIEW_ROWS, batch_bytes: int = PREVIEW_BATCH_BYTES, seed: int = 0):
+        """
+        Initialize the PreviewBuilder.
+
+        Args:
+            sample_rows (int): The number of rows of the preview.
+            batch_bytes (int): The decompressed bytes parsed at once.
+            seed (int): The seed of the sampling.
+        """
+        self.sample_rows = sample_rows
+        self.batch_bytes = batch_bytes
+        self.preview: Optional[PartitionPreview] = None
+        self._rng = np.random.default_rng(seed)
+        self._decompressor = zlib.decompressobj(GZIP_WBITS)
+        self._pending: List[bytes] = []
+        self._pending_bytes = 0
+        self._header: Optional[bytes] = None
+        self._bytes_read = 0
+        self._total_bytes: Optional[int] = None
+        self._rows_read = 0
+        self._sample: Optional[pd.DataFrame] = None
+        self._sample_keys = np.empty(0)
+
+    def feed(self, chunk: bytes, total_bytes: Optional[int] = None) -> None:
+        """
+        Add a downloaded chunk of the file, refreshing the preview once a batch of rows is complete.
+
+        Args:
+            chunk (bytes): The next bytes of the gzipped file.
+            total_bytes (Optional[int]): The size of the gzipped file, if known.
+        """
+        self._bytes_read += len(chunk)
+        self._total_bytes = total_bytes
+        while chunk:
+            data = self._decompressor.decompress(chunk)
+            self._pending.append(data)
+            self._pending_bytes += len(data)
+            chunk = b""
+            if self._decompressor.eof:
+                # The next gzip member, if any, starts in the unused data
+                chunk = self._decompressor.unused_data
+                self._decompressor = zlib.decompressobj(GZIP_WBITS)
+
+        complete = total_bytes is not None and self._bytes_read >= total_bytes
+        if self._pending_bytes >= self.batch_bytes or complete:
+            self._parse(final=complete)
+
+    def _parse(self, final: bool) -> None:
+        """
+        Parse the complete lines received since the last batch and add them to the sample.
+
+        Args:
+            final (bool): Whether the file is complete, so that its last line is parsed as well.
+        """
+        text = b"".join(self._pending)
+        if self._header is None:
+            header_end = text.find(b"\n") + 1
+            if header_end == 0:
+                return
+            self._header, text = text[:header_end], text[header_end:]
+
+        # Rows are cut at the last line break, the rest waits for the next chunks
+        end = len(text) if final else text.rfind(b"\n") + 1
+        self._pending = [text[end:]]
+        self._pending_bytes = len(text) - end
+        if not text[:end].strip():
+            return
+
+        batch = pd.read_csv(
+            io.BytesIO(self._header + text[:end]),
+            header=0,
+            sep=",",
+            quotechar='"',
+            usecols=DATA_GOUV_COLUMNS,
+            dtype=DATA_GOUV_DTYPES,
+        ).dropna()
+        batch["code_postal"] = format_postal_code(batch["code_postal"])
+        self._rows_read += len(batch)
+        self._add_to_sample(batch)
+        self.preview = PartitionPreview(self._sample, self._rows_read, self._bytes_read, self._total_bytes)
+
+    def _add_to_sample(self, batch: pd.DataFrame) -> None:
+        """
+        Keep a uniform sample of all the rows parsed so far.
+
+        Every row gets a random key and the rows of smallest keys are kept, which draws the sample
+        uniformly without replacement whatever the batches.
+
+        Args:
+            batch (pd.DataFrame): The rows of the new batch.
+        """
+        keys = np.concatenate([self._sample_keys, self._rng.random(len(batch))])
+        frames = [batch] if self._sample is None else [self._sample, batch]
+        sample = pd.concat(frames, ignore_index=True)
+        if len(sample) > self.sample_rows:
+            # Sorted positions keep the rows in the order of the file
+            kept = np.sort(np.argpartition(keys, self.sample_rows)[: self.sample_rows])
+            sample, keys = sample.iloc[kept].reset_index(drop=True), keys[kept]
+        # A new frame every time: the published previews are never modified
+        self._sample, self._sample_keys = sample, keys
+
+
+def start_partition_ingestion(selected_dept: str, selected_year: int) -> Future:
+    """
+    Load a partition into the store in the background, once for all the sessions.
+
+    The source file is previewed while it downloads, see get_partition_preview.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+
+    Returns:
+        Future: Resolves to the version of the stored partition.
+    """
+    key = (selected_dept, selected_year)
+    with _ingestions_lock:
+        ingestion = _ingestions.get(key)
+        if ingestion is None:
+            ingestion = INGESTION_EXECUTOR.submit(
+                get_partition_store().ensure, selected_dept, selected_year, partial(_ingest_with_preview, key)
+            )
+            _ingestions[key] = ingestion
+            # Forgotten once done, so that a failed load is retried by the next session
+            ingestion.add_done_callback(lambda _: _forget_ingestion(key))
+    return ingestion
+
+
+def _ingest_with_preview(key: Tuple[str, int], selected_dept: str, selected_year: int) -> None:
+    """
+    Ingest a partition, publishing the preview of its source file as it downloads.
+
+    Args:
+        key (Tuple[str, int]): The key of the partition in the previews.
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+    """
+    builder = PreviewBuilder()
+
+    def on_chunk(chunk: bytes, total_bytes: Optional[int]) -> None:
+        nonlocal builder
+        if builder is None:
+            return
+        try:
+            builder.feed(chunk, total_bytes)
+        except Exception as e:
+            # The preview is optional, the partition keeps loading without it
+            print(f"Error previewing the partition: {str(e)}")
+            builder = None
+            return
+        if builder.preview is not None:
+            with _ingestions_lock:
+                _previews[key] = builder.preview
+
+    DataLoader.ingest_partition(selected_dept, selected_year, on_chunk)
+
+
+def _forget_ingestion(key: Tuple[str, int]) -> None:
+    """Remove a finished background load and its preview."""
+    with _ingestions_lock:
+        _ingestions.pop(key, None)
+        _previews.pop(key, None)
+
+
+def get_partition_preview(selected_dept: str, selected_year: int) -> Optional[PartitionPreview]:
+    """
+    Get the latest preview of a partition being loaded in the background.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+
+    Returns:
+        Optional[PartitionPreview]: The preview of the rows downloaded so far, None before the first batch.
+    """
+    with _ingestions_lock:
+        return _previews.get((selected_dept, selected_year))
+
+
+def median_confidence_interval(values: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Compute a distribution-free confidence interval of the median of a sample.
+
+    The bounds are the order statistics whose ranks bracket n/2 by the normal approximation of
+    the binomial distribution.
+
+    Args:
+        values (np.ndarray): The sample.
+        confidence (float): The confidence level.
+
+    Returns:
+        Tuple[float, float]: The lower and upper bounds, NaN if the sample is empty.
+    """
+    values = np.sort(values[~np.isnan(values)])
+    if len(values) == 0:
+        return np.nan, np.nan
+
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * np.sqrt(len(values)) / 2
+    low = max(int(np.floor(len(values) / 2 - half_width)), 0)
+    high = min(int(np.ceil(len(values) / 2 + half_width)), len(values) - 1)
+    return float(values[low]), float(values[high])
+
+
+def mean_confidence_interval(values: np.ndarray, confidence: float = 0.95) -> Tuple[float, float]:
+    """
+    Compute the normal confidence interval of the mean of a sample.
+
+    Args:
+        values (np.ndarray): The sample.
+        confidence (float): The confidence level.
+
+    Returns:
+        Tuple[float, float]: The lower and upper bounds, NaN if the sample has fewer than 2 values.
+    """
+    values = values[~np.isnan(values)]
+    if len(values) < 2:
+        return np.nan, np.nan
+
+    half_width = NormalDist().inv_cdf(0.5 + confidence / 2) * values.std(ddof=1) / np.sqrt(len(values))
+    return float(values.mean() - half_width), float(values.mean() + half_width)
+
+
+def record_first_paint(seconds: float, mode: str) -> None:
+    """
+    Record the time from the start of a run to the first useful content of the page.
+
+    Args:
+        seconds (float): The elapsed time.
+        mode (str): "partial" if approximate results were shown first, "complete" otherwise.
+    """
+    registry = get_metrics_registry()
+    registry.set_gauge("sotis_first_paint_seconds", seconds, {"mode": mode})
+    registry.increment("sotis_first_paint_seconds_sum", seconds, {"mode": mode})
+    registry.increment("sotis_first_paint_seconds_count", 1, {"mode": mode})
+    registry.flush()
@@ -0,0 +1,269 @@
+"""
+Incremental refresh module for the Sotis Immobilier application.
+This module re-ingests only the data partitions republished on the open data portal since
+the last run, and rebuilds only the derived artifacts affected by them.
+
+Usage:
+    python -m src.core.data.refresh --departments 72 75 --years 2023 2024
+"""
+
+import argparse
+import hashlib
+import json
+import os
+import tempfile
+from dataclasses import dataclass, field
+from datetime import datetime, timezone
+from pathlib import Path
+from typing import Dict, Iterable, List, Optional, Tuple
+
+import requests
+
+from src.config.config import get_data_config
+from src.config.departments import DEPARTMENTS
+from src.config.years import AVAILABLE_YEARS
+from src.core.data import aggregates, percentiles, price_index, spatial_index  # noqa: F401 - register the derived artifacts
+from src.core.data.artifacts import DERIVED_ARTIFACTS
+from src.core.data.live_ingester import get_live_year
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.tiles import builder  # noqa: F401 - register the derived artifacts
+
+
+class PartitionManifest:
+    """Class responsible for the manifest of the ingested partitions."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the PartitionManifest.
+
+        Args:
+            path (Optional[str]): Path of the JSON manifest. Defaults to the cache directory.
+        """
+        self.path = Path(path or os.path.join(get_data_config().cache_dir, "manifest.json"))
+        self.entries: Dict[str, Dict[str, str]] = {}
+        if self.path.exists():
+            self.entries = json.loads(self.path.read_text()).get("partitions", {})
+
+    @staticmethod
+    def key(selected_dept: str, selected_year: int) -> str:
+        """Get the manifest key of a partition."""
+        return f"{selected_year}/{selected_dept}"
+
+    def get(self, selected_dept: str, selected_year: int) -> Dict[str, str]:
+        """Get the manifest entry of a partition, empty if it was never ingested."""
+        return self.entries.get(self.key(selected_dept, selected_year), {})
+
+    def update(self, selected_dept: str, selected_year: int, **values: Optional[str]) -> None:
+        """Update the manifest entry of a partition."""
+        entry = self.entries.setdefault(self.key(selected_dept, selected_year), {})
+        entry.update({name: value for name, value in values.items() if value is not None})
+        entry["checked_at"] = datetime.now(timezone.utc).isoformat(timespec="seconds")
+
+    def save(self) -> None:
+        """Write the manifest atomically."""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp_path = self.path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps({"partitions": self.entries}, indent=2, sort_keys=True))
+        os.replace(tmp_path, self.path)
+
+
+@dataclass
+class RefreshReport:
+    """Outcome of a refresh run."""
+    skipped: List[Tuple[str, str]] = field(default_factory=list)
+    rebuilt: List[Tuple[str, List[str]]] = field(default_factory=list)
+    failed: List[Tuple[str, str]] = field(default_factory=list)
+
+    def summary(self) -> str:
+        """
+        Get a human-readable summary of the run.
+
+        Returns:
+            str: One line per partition, grouped by outcome.
+        """
+        lines = [f"Rebuilt: {len(self.rebuilt)}, skipped: {len(self.skipped)}, failed: {len(self.failed)}"]
+        lines += [f"  rebuilt {key} ({', '.join(artifacts) or 'no artifact'})" for key, artifacts in self.rebuilt]
+        lines += [f"  skipped {key} ({reason})" for key, reason in self.skipped]
+        lines += [f"  failed  {key} ({error})" for key, error in self.failed]
+        return "\n".join(lines)
+
+
+class IncrementalRefresher:
+    """Class responsible for re-ingesting the changed data partitions."""
+
+    def __init__(self, manifest: Optional[PartitionManifest] = None):
+        """
+        Initialize the IncrementalRefresher.
+
+        Args:
+            manifest (Optional[PartitionManifest]): The manifest of the ingested partitions.
+        """
+        self.config = get_data_config()
+        self.store = get_partition_store()
+        self.manifest = manifest or PartitionManifest()
+
+    def run(self, partitions: Iterable[Tuple[str, int]]) -> RefreshReport:
+        """
+        Refresh partitions, rebuilding the derived artifacts of those that changed.
+
+        Args:
+            partitions (Iterable[Tuple[str, int]]): The (department, year) pairs to check.
+
+        Returns:
+            RefreshReport: What was skipped, rebuilt or failed.
+        """
+        report = RefreshReport()
+        changed_departments = set()
+
+        # The manifest is saved even if the run is interrupted, so that finished partitions are not re-ingested
+        try:
+            for selected_dept, selected_year in partitions:
+                key = PartitionManifest.key(selected_dept, selected_year)
+                try:
+                    reason = self._refresh_partition(selected_dept, selected_year)
+                except Exception as e:
+                    print(f"Failed to refresh {key}: {e}")
+                    report.failed.append((key, str(e)))
+                    continue
+
+                if reason is not None:
+                    report.skipped.append((key, reason))
+                    continue
+
+                rebuilt_artifacts = self._rebuild_artifacts(selected_dept, selected_year, "partition", key, report)
+                report.rebuilt.append((key, rebuilt_artifacts))
+                changed_departments.add((selected_dept, selected_year))
+
+            # Department-wide artifacts are rebuilt once per department, whatever the number of changed years
+            for selected_dept in sorted({dept for dept, _ in changed_departments}):
+                latest_year = max(year for dept, year in changed_departments if dept == selected_dept)
+                rebuilt_artifacts = self._rebuild_artifacts(
+                    selected_dept, latest_year, "department", selected_dept, report
+                )
+                if rebuilt_artifacts:
+                    report.rebuilt.append((selected_dept, rebuilt_artifacts))
+        finally:
+            self.manifest.save()
+
+        return report
+
+    def _refresh_partition(self, selected_dept: str, selected_year: int) -> Optional[str]:
+        """
+        Re-ingest a partition if its source changed.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+
+        Returns:
+            Optional[str]: The reason why the partition was skipped, None if it was re-ingested.
+        """
+        if selected_year == get_live_year():
+            return "live partition, refreshed by the live ingester"
+
+        url = DataLoader.get_source_url(selected_dept, selected_year)
+        entry = self.manifest.get(selected_dept, selected_year)
+        stored = self.store.exists(selected_dept, selected_year)
+
+        # Cheap check first: the validators of the published file
+        head = requests.head(url, allow_redirects=True)
+        head.raise_for_status()
+        etag = head.headers.get("ETag")
+        last_modified = head.headers.get("Last-Modified")
+        if stored and etag and entry.get("etag") == etag:
+            self.manifest.update(selected_dept, selected_year)
+            return "unchanged ETag"
+
+        # Then the content itself, since republished files often get a new ETag without changing
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            csv_path = os.path.join(tmp_dir, f"{selected_dept}.csv.gz")
+            content_hash = self._download(url, csv_path)
+            if stored and entry.get("content_hash") == content_hash:
+                self.manifest.update(selected_dept, selected_year, etag=etag, last_modified=last_modified)
+                return "unchanged content"
+
+            print(f"Re-ingesting partition... Year: {selected_year}, Department: {selected_dept}")
+            DataLoader.ingest_file(csv_path, selected_dept, selected_year)
+
+        self.manifest.update(
+            selected_dept,
+            selected_year,
+            etag=etag,
+            last_modified=last_modified,
+            content_hash=content_hash,
+            ingested_at=datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        )
+        return None
+
+    @staticmethod
+    def _download(url: str, path: str) -> str:
+        """
+        Download a file while hashing its content.
+
+        Args:
+            url (str): The URL of the file.
+            path (str): The local destination.
+
+        Returns:
+            str: The SHA-256 digest of the content.
+        """
+        digest = hashlib.sha256()
+        with requests.get(url, stream=True) as response:
+            response.raise_for_status()
+            with open(path, "wb") as file:
+                for chunk in response.iter_content(chunk_size=1024 * 1024):
+                    digest.update(chunk)
+                    file.write(chunk)
+        return digest.hexdigest()
+
+    @staticmethod
+    def _rebuild_artifacts(
+        selected_dept: str, selected_year: int, scope: str, key: str, report: RefreshReport
+    ) -> List[str]:
+        """
+        Rebuild the registered artifacts of a scope.
+
+        A failing artifact is recorded in the report and does not prevent the others from being rebuilt,
+        it is rebuilt on demand when it is next loaded.
+
+        Args:
+            selected_dept (str): The department code.
+            selected_year (int): The year.
+            scope (str): "partition" or "department".
+            key (str): The key of the partition or department in the report.
+            report (RefreshReport): The report of the run, receiving the failures.
+
+        Returns:
+            List[str]: The names of the rebuilt artifacts.
+        """
+        rebuilt = []
+        for artifact in DERIVED_ARTIFACTS.values():
+            if artifact.scope != scope:
+                continue
+            try:
+                artifact.build(selected_dept, selected_year)
+            except Exception as e:
+                print(f"Failed to rebuild {artifact.name} of {key}: {e}")
+                report.failed.append((f"{key} {artifact.name}", str(e)))
+                continue
+            rebuilt.append(artifact.name)
+        return rebuilt
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Re-ingest the data partitions changed since the last run.")
+    parser.add_argument("--departments", nargs="*", help="Department codes, defaults to the stored partitions")
+    parser.add_argument("--years", nargs="*", type=int, help="Years, defaults to the stored partitions")
+    args = parser.parse_args()
+
+    if args.departments or args.years:
+        targets = [
+            (dept, year)
+            for dept in (args.departments or DEPARTMENTS)
+            for year in (args.years or AVAILABLE_YEARS)
+        ]
+    else:
+        targets = get_partition_store().list_partitions()
+
+    print(IncrementalRefresher().run(targets).summary())
@@ -0,0 +1,203 @@
+"""
+Spatial index module for the Sotis Immobilier application.
+This module indexes the transactions of a partition by location to answer radius and
+nearest-comparables queries.
+"""
+
+from pathlib import Path
+from typing import Optional, Tuple
+
+import joblib
+import numpy as np
+import pandas as pd
+import streamlit as st
+from sklearn.neighbors import BallTree
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.artifacts import artifact_path, is_fresh, register_artifact, slugify
+from src.core.data.loader import DataLoader
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import select_property_type
+
+# Mean Earth radius used to convert haversine distances (km)
+EARTH_RADIUS_KM = 6371.0088
+
+# Columns returned for each comparable sale
+COMPARABLE_COLUMNS = [
+    "nom_commune",
+    "code_postal",
+    "valeur_fonciere",
+    "surface_reelle_bati",
+    "prix_m2",
+    "latitude",
+    "longitude",
+]
+
+
+class SpatialIndex:
+    """Class responsible for nearest-neighbour queries on the transactions of a partition."""
+
+    def __init__(self, properties_data: pd.DataFrame):
+        """
+        Initialize the SpatialIndex.
+
+        Args:
+            properties_data (pd.DataFrame): The transactions to index, with a "prix_m2" column.
+        """
+        self.properties_data = properties_data.reset_index(drop=True)
+        coordinates = np.radians(self.properties_data[["latitude", "longitude"]].to_numpy(dtype=np.float64))
+
+        # BallTree rejects empty data: a partition without transactions of a type has no tree
+        self.tree: Optional[BallTree] = BallTree(coordinates, metric="haversine") if len(coordinates) else None
+
+    def __len__(self) -> int:
+        """Get the number of indexed transactions."""
+        return len(self.properties_data)
+
+    def query_batch(self, points: np.ndarray, k: int = 10, radius_km: float = 1.0) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Find the k nearest sales within radius_km of each point.
+
+        Args:
+            points (np.ndarray): Array of shape (n, 2) with latitude and longitude in degrees.
+            k (int): Maximum number of comparables per point.
+            radius_km (float): Maximum distance to a comparable in kilometers.
+
+        Returns:
+            Tuple[np.ndarray, np.ndarray]: Distances in kilometers and row positions, both of shape
+            (n, k), sorted by distance. Slots without a comparable have a NaN distance and a -1 position.
+        """
+        points = np.atleast_2d(np.asarray(points, dtype=np.float64))
+        k = min(k, len(self))
+        if k == 0 or self.tree is None:
+            empty = np.empty((len(points), 0))
+            return empty, empty.astype(np.intp)
+
+        distances, positions = self.tree.query(np.radians(points), k=k)
+        distances = distances * EARTH_RADIUS_KM
+
+        out_of_range = distances > radius_km
+        distances[out_of_range] = np.nan
+        positions[out_of_range] = -1
+        return distances, positions
+
+    def query_comparables(
+        self, latitude: float, longitude: float, k: int = 10, radius_km: float = 1.0
+    ) -> pd.DataFrame:
+        """
+        Get the comparable sales around a single point.
+
+        Args:
+            latitude (float): Latitude of the point in degrees.
+            longitude (float): Longitude of the point in degrees.
+            k (int): Maximum number of comparables.
+            radius_km (float): Maximum distance to a comparable in kilometers.
+
+        Returns:
+            pd.DataFrame: The comparables sorted by distance, with a "distance_km" column.
+        """
+        comparables = self.query_comparables_batch(np.array([[latitude, longitude]]), k=k, radius_km=radius_km)
+        return comparables.drop(columns="query_id")
+
+    def query_comparables_batch(self, points: np.ndarray, k: int = 10, radius_km: float = 1.0) -> pd.DataFrame:
+        """
+        Get the comparable sales around many points at once.
+
+        Args:
+            points (np.ndarray): Array of shape (n, 2) with latitude and longitude in degrees.
+            k (int): Maximum number of comparables per point.
+            radius_km (float): Maximum distance to a comparable in kilometers.
+
+        Returns:
+            pd.DataFrame: One row per (point, comparable) pair, with "query_id" giving the position
+            of the point in the input and "distance_km" the distance to the comparable.
+        """
+        distances, positions = self.query_batch(points, k=k, radius_km=radius_km)
+        query_ids, ranks = np.nonzero(positions >= 0)
+
+        comparables = self.properties_data.iloc[positions[query_ids, ranks]][COMPARABLE_COLUMNS]
+        comparables = comparables.reset_index(drop=True)
+        comparables.insert(0, "distance_km", distances[query_ids, ranks])
+        comparables.insert(0, "query_id", query_ids)
+        return comparables
+
+
+@register_artifact("spatial_index")
+def build_spatial_indexes(selected_dept: str, selected_year: int) -> None:
+    """
+    Build and save the spatial index of every property type of a partition.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+    """
+    properties_data = get_partition_store().read(selected_dept, selected_year)
+    for local_type in PROPERTY_TYPES:
+        spatial_index = SpatialIndex(select_property_type(properties_data, local_type))
+        joblib.dump(spatial_index, _spatial_index_path(selected_dept, selected_year, local_type))
+
+
+def get_spatial_index(selected_dept: str, selected_year: int, selected_local_type: str) -> Optional[SpatialIndex]:
+    """
+    Get the spatial index of a (department, year, property type) partition.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+
+    Returns:
+        Optional[SpatialIndex]: The spatial index or None if the partition could not be loaded.
+    """
+    properties_data = DataLoader.fetch_data_gouv(selected_dept, selected_year)
+    if properties_data is None:
+        return None
+
+    version = get_partition_store().version(selected_dept, selected_year)
+    return _load_spatial_index(selected_dept, selected_year, selected_local_type, version)
+
+
+@st.cache_resource(max_entries=16)
+def _load_spatial_index(selected_dept: str, selected_year: int, selected_local_type: str, version: str) -> SpatialIndex:
+    """
+    Load the saved spatial index of a partition, building it if it is missing or outdated.
+
+    Args:
+        selected_dept (str): The selected department code.
+        selected_year (int): The selected year.
+        selected_local_type (str): The selected property type.
+        version (str): Version of the stored partition, part of the cache key only.
+
+    Returns:
+        SpatialIndex: The spatial index.
+    """
+    path = _spatial_index_path(selected_dept, selected_year, selected_local_type)
+    if is_fresh(path, selected_dept, selected_year):
+        return joblib.load(path)
+
+    print(f"Building spatial index... Year: {selected_year}, Department: {selected_dept}, Type: {selected_local_type}")
+    properties_data = get_partition_store().read(selected_dept, selected_year)
+    spatial_index = SpatialIndex(select_property_type(properties_data, selected_local_type))
+    joblib.dump(spatial_index, path)
+    return spatial_index
+
+
+def clear_spatial_indexes(selected_dept: Optional[str] = None, selected_year: Optional[int] = None) -> None:
+    """
+    Clear the spatial indexes held in memory, they are reloaded from disk on the next query.
+
+    Args:
+        selected_dept (Optional[str]): The department of the partition to clear, all the partitions if None.
+        selected_year (Optional[int]): The year of the partition to clear.
+    """
+    if selected_dept is None:
+        _load_spatial_index.clear()
+        return
+    version = get_partition_store().version(selected_dept, selected_year)
+    for selected_local_type in PROPERTY_TYPES:
+        _load_spatial_index.clear(selected_dept, selected_year, selected_local_type, version)
+
+
+def _spatial_index_path(selected_dept: str, selected_year: int, selected_local_type: str) -> Path:
+    """Get the path of the saved spatial index of a partition."""
+    return artifact_path("spatial_index", selected_dept, selected_year, f"{slugify(selected_local_type)}.joblib")
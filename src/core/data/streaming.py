@@ -0,0 +1,108 @@
+"""
+Streaming module for the Sotis Immobilier application.
+This module serializes record batches into file formats chunk by chunk, so that large
+results can be sent without being materialized in memory.
+"""
+
+from typing import Iterable, Iterator, List, Optional
+
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+
+
+class _ChunkSink:
+    """Write-only file object collecting the bytes written by an Arrow writer."""
+
+    def __init__(self):
+        """Initialize the sink with an empty buffer."""
+        self.chunks: List[bytes] = []
+        self.position = 0
+        self.closed = False
+
+    def write(self, data) -> int:
+        """Append bytes to the buffer."""
+        data = bytes(data)
+        self.chunks.append(data)
+        self.position += len(data)
+        return len(data)
+
+    def tell(self) -> int:
+        """Get the number of bytes written so far."""
+        return self.position
+
+    def flush(self) -> None:
+        """Nothing to flush, bytes are drained by the caller."""
+
+    def close(self) -> None:
+        """Mark the sink as closed."""
+        self.closed = True
+
+    def drain(self) -> bytes:
+        """
+        Get and clear the bytes written since the last drain.
+
+        Returns:
+            bytes: The pending bytes.
+        """
+        data = b"".join(self.chunks)
+        self.chunks = []
+        return data
+
+
+def iter_parquet_chunks(
+    batches: Iterable[pa.RecordBatch], schema: Optional[pa.Schema] = None
+) -> Iterator[bytes]:
+    """
+    Serialize record batches to a Parquet file, one row group per batch.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): The batches to serialize.
+        schema (Optional[pa.Schema]): Schema of the file. Defaults to the schema of the first batch.
+
+    Yields:
+        bytes: The next chunk of the Parquet file.
+    """
+    sink = _ChunkSink()
+    writer = pq.ParquetWriter(sink, schema) if schema is not None else None
+
+    for batch in batches:
+        if writer is None:
+            writer = pq.ParquetWriter(sink, batch.schema)
+        writer.write_batch(batch)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    if writer is None:
+        raise ValueError("Cannot write an empty Parquet file without a schema")
+    writer.close()
+    yield sink.drain()
+
+
+def iter_csv_chunks(batches: Iterable[pa.RecordBatch], schema: Optional[pa.Schema] = None) -> Iterator[bytes]:
+    """
+    Serialize record batches to a CSV file, with a header line, one chunk per batch.
+
+    Args:
+        batches (Iterable[pa.RecordBatch]): The batches to serialize.
+        schema (Optional[pa.Schema]): Schema of the file. Defaults to the schema of the first batch.
+
+    Yields:
+        bytes: The next chunk of the CSV file.
+    """
+    sink = _ChunkSink()
+    writer = pa_csv.CSVWriter(sink, schema) if schema is not None else None
+
+    for batch in batches:
+        if writer is None:
+            writer = pa_csv.CSVWriter(sink, batch.schema)
+        writer.write_batch(batch)
+        chunk = sink.drain()
+        if chunk:
+            yield chunk
+
+    if writer is None:
+        raise ValueError("Cannot write an empty CSV file without a schema")
+    writer.close()
+    yield sink.drain()
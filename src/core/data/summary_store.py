@@ -0,0 +1,188 @@
+"""
+Summary store module for the Sotis Immobilier application.
+This module converts the national summarized dataset into a local Arrow IPC file once,
+and exposes a memory-mapped query API on top of it.
+"""
+
+import os
+import tempfile
+from pathlib import Path
+from typing import List, Optional, Sequence
+
+import pandas as pd
+import pyarrow as pa
+import pyarrow.compute as pc
+import pyarrow.csv as pa_csv
+import requests
+import streamlit as st
+
+from src.config.config import get_data_config
+
+# Mapping between the query API arguments and the columns of the summarized dataset
+SUMMARY_FILTER_COLUMNS = {
+    "department": "code_departement",
+    "year": "annee",
+    "property_type": "type_local",
+    "postal_code": "code_postal",
+}
+
+# Size of the blocks read from the CSV file during the conversion (bytes)
+CSV_BLOCK_SIZE = 64 * 1024 * 1024
+
+
+class SummaryStore:
+    """Class responsible for storing and querying the national summarized data."""
+
+    def __init__(self, path: Optional[str] = None):
+        """
+        Initialize the SummaryStore.
+
+        Args:
+            path (Optional[str]): Path of the Arrow IPC file. Defaults to the cache directory.
+        """
+        self.config = get_data_config()
+        self.path = Path(path or os.path.join(self.config.cache_dir, "summary", "geo_dvf_summarized_full.arrow"))
+        self._table: Optional[pa.Table] = None
+
+    def ensure(self) -> Path:
+        """
+        Build the Arrow IPC file if it does not exist yet.
+
+        Returns:
+            Path: Path of the Arrow IPC file.
+        """
+        if not self.path.exists():
+            self.build()
+        return self.path
+
+    def build(self) -> None:
+        """Download the summarized CSV file and convert it to an Arrow IPC file."""
+        print(f"Building summarized data store at {self.path}...")
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        with tempfile.TemporaryDirectory(dir=self.path.parent) as tmp_dir:
+            csv_path = os.path.join(tmp_dir, "summary.csv.gz")
+            with requests.get(self.config.summarized_data_url, stream=True) as response:
+                response.raise_for_status()
+                with open(csv_path, "wb") as file:
+                    for chunk in response.iter_content(chunk_size=1024 * 1024):
+                        file.write(chunk)
+
+            self.convert(csv_path)
+
+    def convert(self, csv_path: str) -> None:
+        """
+        Convert a gzipped summarized CSV file to the Arrow IPC file of the store.
+
+        Args:
+            csv_path (str): Path of the gzipped CSV file.
+        """
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+
+        # Key columns are codes, e.g. "2A" for Corsica: they must not be inferred from the first block
+        column_types = {column: pa.string() for column in SUMMARY_FILTER_COLUMNS.values() if column != "annee"}
+
+        with tempfile.TemporaryDirectory(dir=self.path.parent) as tmp_dir:
+            # Convert block by block so that the whole CSV is never parsed in memory at once
+            arrow_path = os.path.join(tmp_dir, "summary.arrow")
+            reader = pa_csv.open_csv(
+                pa.input_stream(csv_path, compression="gzip"),
+                read_options=pa_csv.ReadOptions(block_size=CSV_BLOCK_SIZE),
+                convert_options=pa_csv.ConvertOptions(column_types=column_types),
+            )
+            with pa.OSFile(arrow_path, "wb") as sink:
+                with pa.ipc.new_file(sink, reader.schema) as writer:
+                    for batch in reader:
+                        writer.write_batch(batch)
+
+            # Atomic replace so that concurrent readers never see a partial file
+            os.replace(arrow_path, self.path)
+
+        self._table = None
+
+    @property
+    def table(self) -> pa.Table:
+        """
+        Get the memory-mapped summarized table.
+
+        Returns:
+            pa.Table: Arrow table backed by the page cache (zero-copy).
+        """
+        if self._table is None:
+            source = pa.memory_map(str(self.ensure()), "r")
+            self._table = pa.ipc.open_file(source).read_all()
+        return self._table
+
+    def query(
+        self,
+        departments: Optional[Sequence[str]] = None,
+        years: Optional[Sequence[int]] = None,
+        property_types: Optional[Sequence[str]] = None,
+        postal_codes: Optional[Sequence[str]] = None,
+        columns: Optional[List[str]] = None,
+    ) -> pd.DataFrame:
+        """
+        Query the summarized data with filters and column projection.
+
+        Args:
+            departments (Optional[Sequence[str]]): Department codes to keep.
+            years (Optional[Sequence[int]]): Years to keep.
+            property_types (Optional[Sequence[str]]): Property types to keep.
+            postal_codes (Optional[Sequence[str]]): Postal codes to keep.
+            columns (Optional[List[str]]): Columns to return. All columns if None.
+
+        Returns:
+            pd.DataFrame: DataFrame containing only the matching rows and requested columns.
+        """
+        filters = {
+            "department": departments,
+            "year": years,
+            "property_type": property_types,
+            "postal_code": postal_codes,
+        }
+        table = self.table
+
+        mask = None
+        for name, values in filters.items():
+            if values is None:
+                continue
+            condition = self._build_condition(table, SUMMARY_FILTER_COLUMNS[name], values)
+            mask = condition if mask is None else pc.and_(mask, condition)
+
+        if columns is not None:
+            table = table.select(columns)
+        if mask is not None:
+            table = table.filter(mask)
+
+        return table.to_pandas(split_blocks=True)
+
+    @staticmethod
+    def _build_condition(table: pa.Table, column: str, values: Sequence) -> pa.ChunkedArray:
+        """
+        Build the boolean mask selecting the rows whose column value is in values.
+
+        Args:
+            table (pa.Table): The table to filter.
+            column (str): The column to filter on.
+            values (Sequence): The accepted values.
+
+        Returns:
+            pa.ChunkedArray: Boolean mask of the matching rows.
+        """
+        if column not in table.column_names:
+            raise KeyError(f"Column '{column}' not found in summarized data")
+
+        value_set = pa.array(list(values)).cast(table.schema.field(column).type)
+        return pc.is_in(table[column], value_set=value_set)
+
+
+@st.cache_resource
+def get_summary_store() -> SummaryStore:
+    """
+    Get the process-wide summary store.
+
+    Returns:
+        SummaryStore: The shared summary store instance.
+    """
+    return SummaryStore()
+
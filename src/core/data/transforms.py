@@ -0,0 +1,189 @@
+"""
+Data transformation module for the Sotis Immobilier application.
+This module holds the transformations shared by the visualizations and the data services.
+"""
+
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from scipy import stats
+
+# Columns loaded from the French open data portal files
+DATA_GOUV_COLUMNS = [
+    "type_local",
+    "valeur_fonciere",
+    "code_postal",
+    "nom_commune",
+    "surface_reelle_bati",
+    "longitude",
+    "latitude",
+]
+
+# Types of the columns loaded from the French open data portal files
+DATA_GOUV_DTYPES = {
+    "type_local": str,
+    "valeur_fonciere": float,
+    "code_postal": str,
+    "nom_commune": str,
+    "surface_reelle_bati": float,
+    "longitude": float,
+    "latitude": float,
+}
+
+# Columns identifying duplicated transactions
+DUPLICATE_SUBSET = ["valeur_fonciere", "longitude", "latitude"]
+
+# Resolution of the price distribution: number of histogram bins and of points of the density curve
+HISTOGRAM_BINS = 50
+KDE_POINTS = 100
+
+# The density curve is estimated on a sample of at most this many prices
+KDE_MAX_SAMPLES = 50_000
+
+
+def format_postal_code(postal_codes: pd.Series) -> pd.Series:
+    """
+    Format postal codes as 5-digit strings.
+
+    Args:
+        postal_codes (pd.Series): The raw postal codes, e.g. "1000" or "72000.0".
+
+    Returns:
+        pd.Series: The zero-padded postal codes, e.g. "01000" or "72000".
+    """
+    return postal_codes.astype(float).astype(int).astype(str).str.zfill(5)
+
+
+def select_property_type(properties_data: pd.DataFrame, selected_local_type: str) -> pd.DataFrame:
+    """
+    Keep the transactions of one property type and compute their price per square meter.
+
+    Args:
+        properties_data (pd.DataFrame): The cleaned property data of a partition.
+        selected_local_type (str): The selected property type.
+
+    Returns:
+        pd.DataFrame: New DataFrame with the selected transactions and a "prix_m2" column.
+    """
+    selected_data = properties_data[properties_data["type_local"] == selected_local_type].copy()
+    selected_data["prix_m2"] = selected_data["valeur_fonciere"] / selected_data["surface_reelle_bati"]
+    return selected_data
+
+
+def get_value_column(show_price_per_sqm: bool) -> str:
+    """
+    Get the name of the price column to analyze.
+
+    Args:
+        show_price_per_sqm (bool): Whether prices are expressed per square meter.
+
+    Returns:
+        str: "prix_m2" for prices per square meter, "valeur_fonciere" for total prices.
+    """
+    return "prix_m2" if show_price_per_sqm else "valeur_fonciere"
+
+
+def remove_outliers(properties_data: pd.DataFrame, value_column: str) -> pd.DataFrame:
+    """
+    Remove the transactions above the upper fence (Q3 + 1.5 * IQR) of a price column.
+
+    Args:
+        properties_data (pd.DataFrame): The property data.
+        value_column (str): The price column used to detect outliers.
+
+    Returns:
+        pd.DataFrame: The property data without the outliers.
+    """
+    Q1 = properties_data[value_column].quantile(0.25)
+    Q3 = properties_data[value_column].quantile(0.75)
+    IQR = Q3 - Q1
+    upper_fence = Q3 + 1.5 * IQR
+    return properties_data[properties_data[value_column] <= upper_fence]
+
+
+def compute_postal_code_statistics(properties_data: pd.DataFrame, value_column: str) -> pd.DataFrame:
+    """
+    Compute the median price per postal code.
+
+    Args:
+        properties_data (pd.DataFrame): The property data.
+        value_column (str): The price column to aggregate.
+
+    Returns:
+        pd.DataFrame: One row per postal code, sorted by postal code.
+    """
+    return (
+        properties_data.groupby(["code_postal"])
+        .agg({value_column: "median"})
+        .reset_index()
+        .sort_values("code_postal")
+    )
+
+
+def compute_commune_statistics(properties_data: pd.DataFrame, value_column: str) -> pd.DataFrame:
+    """
+    Compute the price and surface statistics per commune.
+
+    Args:
+        properties_data (pd.DataFrame): The property data.
+        value_column (str): The price column to aggregate.
+
+    Returns:
+        pd.DataFrame: One row per (postal code, commune), sorted by postal code and commune name.
+    """
+    commune_stats = (
+        properties_data.groupby(["code_postal", "nom_commune"])
+        .agg({value_column: ["count", "median", "mean", "std"], "surface_reelle_bati": ["median", "mean"]})
+        .round(2)
+    )
+
+    # Flatten the multi-level columns
+    commune_stats.columns = [
+        "nombre_transactions",
+        "prix_median",
+        "prix_moyen",
+        "ecart_type_prix",
+        "surface_mediane",
+        "surface_moyenne",
+    ]
+
+    return commune_stats.reset_index().sort_values(["code_postal", "nom_commune"])
+
+
+def compute_price_histogram(values: np.ndarray, bins: int = HISTOGRAM_BINS) -> Optional[Dict]:
+    """
+    Bin a price column and estimate its density, so that the chart size does not depend on the number of rows.
+
+    Args:
+        values (np.ndarray): The prices.
+        bins (int): The number of histogram bins.
+
+    Returns:
+        Optional[Dict]: The bin "counts" and "edges", the density curve "kde_x" and "kde_y" scaled to the
+        counts, and the "mean", "median" and "count" of the prices, or None if there is no price.
+    """
+    values = values[np.isfinite(values)]
+    if len(values) == 0:
+        return None
+
+    counts, edges = np.histogram(values, bins=bins)
+    kde_x = np.linspace(values.min(), values.max(), KDE_POINTS)
+    sample = values
+    if len(values) > KDE_MAX_SAMPLES:
+        sample = np.random.default_rng(0).choice(values, KDE_MAX_SAMPLES, replace=False)
+    if np.ptp(sample) > 0:
+        # Density scaled to a number of transactions per bin, as the histogram
+        kde_y = stats.gaussian_kde(sample)(kde_x) * len(values) * (edges[1] - edges[0])
+    else:
+        kde_y = np.zeros(KDE_POINTS)
+
+    return {
+        "counts": counts,
+        "edges": edges,
+        "kde_x": kde_x,
+        "kde_y": kde_y,
+        "mean": float(values.mean()),
+        "median": float(np.median(values)),
+        "count": int(len(values)),
+    }
@@ -0,0 +1,219 @@
+"""
+Commune geometries module for the Sotis Immobilier application.
+This module downloads the commune boundaries of a department once, simplifies them offline at
+several tolerances and stores each level as a compact Arrow file of quantized, delta-encoded
+coordinates. Maps only ever receive a simplified level, chosen from their zoom.
+
+Usage:
+    python -m src.core.geo.communes --departments 72 75
+"""
+
+import argparse
+import threading
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional
+
+import numpy as np
+import pyarrow as pa
+import pyarrow.ipc as ipc
+import requests
+
+from src.config.config import get_data_config
+from src.config.departments import DEPARTMENTS
+from src.core.data.artifacts import artifact_path, slugify
+from src.core.geo.simplify import Polygon, simplify_polygons
+
+# Simplification levels: tolerance (degrees) and minimum zoom of the maps they are drawn at.
+# The tolerance is about one screen pixel at the minimum zoom of the level.
+GEOMETRY_LEVELS = {
+    "low": (0.005, 0),
+    "medium": (0.0013, 10),
+    "high": (0.0003, 12),
+}
+
+# Coordinates are stored as integers, in units of 1e-5 degree (about one meter)
+COORDINATE_SCALE = 100_000
+
+# Communes split into arrondissements, whose arrondissements are drawn instead
+ARRONDISSEMENT_PARENTS = {"75056", "69123", "13055"}
+
+GEOMETRY_SCHEMA = pa.schema(
+    [
+        pa.field("code", pa.string()),
+        pa.field("nom", pa.string()),
+        pa.field("cle", pa.string()),
+        pa.field("codes_postaux", pa.list_(pa.string())),
+        # Polygons, made of rings, made of delta-encoded interleaved x, y coordinates
+        pa.field("polygons", pa.list_(pa.list_(pa.list_(pa.int32())))),
+    ]
+)
+
+# Geometries are built at most once at a time
+GEOMETRY_BUILD_LOCK = threading.Lock()
+
+
+def get_commune_key(commune_name: str) -> str:
+    """
+    Get the key joining a commune of the transactions to its boundary.
+
+    The transactions carry the commune name but not its INSEE code.
+
+    Args:
+        commune_name (str): The commune name.
+
+    Returns:
+        str: The slug of the name.
+    """
+    return slugify(commune_name)
+
+
+def get_geometry_path(selected_dept: str, level: str) -> Path:
+    """Get the path of a simplification level of the commune geometries of a department."""
+    return artifact_path("commune_geometries", selected_dept, None, f"{level}.arrow")
+
+
+def download_commune_boundaries(selected_dept: str) -> List[Dict]:
+    """
+    Download the full-resolution commune boundaries of a department from the geographic API.
+
+    Args:
+        selected_dept (str): The department code.
+
+    Returns:
+        List[Dict]: The GeoJSON features, with the "code", "nom" and "codesPostaux" properties.
+
+    Raises:
+        requests.RequestException: If the boundaries cannot be downloaded.
+    """
+    response = requests.get(
+        f"{get_data_config().geo_api_url}/departements/{selected_dept}/communes",
+        params={
+            "type": "commune-actuelle,arrondissement-municipal",
+            "fields": "code,nom,codesPostaux",
+            "geometry": "contour",
+            "format": "geojson",
+        },
+        timeout=120,
+    )
+    response.raise_for_status()
+    return [
+        feature
+        for feature in response.json()["features"]
+        if feature.get("geometry") and feature["properties"]["code"] not in ARRONDISSEMENT_PARENTS
+    ]
+
+
+def _to_polygons(geometry: Dict) -> List[Polygon]:
+    """Convert a GeoJSON Polygon or MultiPolygon to a list of polygons of coordinate arrays."""
+    polygons = [geometry["coordinates"]] if geometry["type"] == "Polygon" else geometry["coordinates"]
+    return [[np.asarray(ring, dtype=np.float64) for ring in polygon] for polygon in polygons]
+
+
+def _encode_ring(ring: np.ndarray) -> np.ndarray:
+    """Quantize a ring and delta-encode its interleaved coordinates."""
+    quantized = np.round(ring * COORDINATE_SCALE).astype(np.int64)
+    deltas = np.diff(quantized, axis=0, prepend=np.zeros((1, 2), dtype=np.int64))
+    return deltas.astype(np.int32).ravel()
+
+
+def _decode_ring(values: np.ndarray) -> List[List[float]]:
+    """Decode the coordinates of a ring encoded by _encode_ring."""
+    coordinates = np.cumsum(values.reshape(-1, 2), axis=0, dtype=np.int64) / COORDINATE_SCALE
+    return coordinates.tolist()
+
+
+def build_commune_geometries(selected_dept: str) -> None:
+    """
+    Download the commune boundaries of a department and store every simplification level.
+
+    The full-resolution boundaries are only held in memory during the build.
+
+    Args:
+        selected_dept (str): The department code.
+
+    Raises:
+        requests.RequestException: If the boundaries cannot be downloaded.
+    """
+    print(f"Building commune geometries... Department: {selected_dept}")
+    features = download_commune_boundaries(selected_dept)
+    polygons = [_to_polygons(feature["geometry"]) for feature in features]
+    properties = [feature["properties"] for feature in features]
+
+    for level, (tolerance, _) in GEOMETRY_LEVELS.items():
+        simplified = simplify_polygons(polygons, tolerance)
+        kept = [position for position, feature_polygons in enumerate(simplified) if feature_polygons]
+        table = pa.Table.from_pydict(
+            {
+                "code": [properties[position]["code"] for position in kept],
+                "nom": [properties[position]["nom"] for position in kept],
+                "cle": [get_commune_key(properties[position]["nom"]) for position in kept],
+                "codes_postaux": [properties[position].get("codesPostaux", []) for position in kept],
+                "polygons": [
+                    [[_encode_ring(ring) for ring in polygon] for polygon in simplified[position]]
+                    for position in kept
+                ],
+            },
+            schema=GEOMETRY_SCHEMA,
+        )
+
+        path = get_geometry_path(selected_dept, level)
+        tmp_path = path.with_suffix(".tmp")
+        with ipc.new_file(tmp_path, GEOMETRY_SCHEMA, options=ipc.IpcWriteOptions(compression="zstd")) as writer:
+            writer.write_table(table)
+        tmp_path.replace(path)
+        print(f"  {level}: {len(kept)} communes, {path.stat().st_size / 1e3:,.0f} kB")
+
+
+def load_commune_geometries(selected_dept: str, level: str) -> Optional[Dict]:
+    """
+    Get a simplification level of the commune geometries of a department as GeoJSON.
+
+    The geometries are built on first use if they were not built offline.
+
+    Args:
+        selected_dept (str): The department code.
+        level (str): A key of GEOMETRY_LEVELS.
+
+    Returns:
+        Optional[Dict]: The GeoJSON FeatureCollection, with the "code", "nom", "cle" (join key)
+        and "codes_postaux" properties, or None if the boundaries cannot be downloaded.
+    """
+    with GEOMETRY_BUILD_LOCK:
+        if not get_geometry_path(selected_dept, level).exists():
+            try:
+                build_commune_geometries(selected_dept)
+            except requests.RequestException as e:
+                print(f"Error downloading the commune boundaries of department {selected_dept}: {e}")
+                return None
+    return _read_commune_geometries(selected_dept, level)
+
+
+@lru_cache(maxsize=32)
+def _read_commune_geometries(selected_dept: str, level: str) -> Dict:
+    """Decode a stored simplification level of the commune geometries of a department to GeoJSON."""
+    with pa.memory_map(str(get_geometry_path(selected_dept, level))) as source:
+        table = ipc.open_file(source).read_all()
+
+    features = []
+    for row in table.to_pylist():
+        coordinates = [
+            [_decode_ring(np.asarray(ring, dtype=np.int32)) for ring in polygon] for polygon in row.pop("polygons")
+        ]
+        features.append(
+            {
+                "type": "Feature",
+                "properties": row,
+                "geometry": {"type": "MultiPolygon", "coordinates": coordinates},
+            }
+        )
+    return {"type": "FeatureCollection", "features": features}
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build the simplified commune geometries of departments.")
+    parser.add_argument("--departments", nargs="*", help="Department codes, defaults to all the departments")
+    args = parser.parse_args()
+
+    for dept in args.departments or DEPARTMENTS:
+        build_commune_geometries(dept)
@@ -0,0 +1,116 @@
+"""
+Geometry simplification module for the Sotis Immobilier application.
+This module simplifies polygon boundaries with the Douglas-Peucker algorithm, arc by arc, so that
+the border shared by two neighbouring polygons is simplified identically in both of them and no
+gap or overlap appears between them.
+"""
+
+from typing import Dict, FrozenSet, List, Tuple
+
+import numpy as np
+
+Ring = np.ndarray  # Array of shape (n, 2), closed: the last point equals the first one
+Polygon = List[Ring]  # Exterior ring followed by the holes
+
+
+def douglas_peucker(points: np.ndarray, tolerance: float) -> np.ndarray:
+    """
+    Simplify a line with the Douglas-Peucker algorithm.
+
+    Args:
+        points (np.ndarray): The points of the line, of shape (n, 2).
+        tolerance (float): The maximum distance between the line and its simplification.
+
+    Returns:
+        np.ndarray: The kept points, including the first and the last ones.
+    """
+    if len(points) < 3:
+        return points
+
+    keep = np.zeros(len(points), dtype=bool)
+    keep[0] = keep[-1] = True
+    stack = [(0, len(points) - 1)]
+    while stack:
+        start, end = stack.pop()
+        if end - start < 2:
+            continue
+        segment = points[end] - points[start]
+        inner = points[start + 1 : end] - points[start]
+        length = np.hypot(segment[0], segment[1])
+        if length == 0:
+            distances = np.hypot(inner[:, 0], inner[:, 1])
+        else:
+            distances = np.abs(segment[0] * inner[:, 1] - segment[1] * inner[:, 0]) / length
+        index = int(np.argmax(distances))
+        if distances[index] > tolerance:
+            split = start + 1 + index
+            keep[split] = True
+            stack.extend([(start, split), (split, end)])
+    return points[keep]
+
+
+def _simplify_arc(arc: np.ndarray, tolerance: float) -> np.ndarray:
+    """Simplify an arc in a canonical direction, so that both rings sharing it get the same points."""
+    if tuple(arc[0]) > tuple(arc[-1]) or (tuple(arc[0]) == tuple(arc[-1]) and tuple(arc[1]) > tuple(arc[-2])):
+        return douglas_peucker(arc[::-1], tolerance)[::-1]
+    return douglas_peucker(arc, tolerance)
+
+
+def simplify_polygons(polygons: List[List[Polygon]], tolerance: float) -> List[List[Polygon]]:
+    """
+    Simplify the polygons of neighbouring features while preserving their shared borders.
+
+    Rings are cut into arcs at the vertices where the set of rings they belong to changes, and
+    every arc is simplified on its own. A border shared by two rings is made of the same vertices
+    in both of them, so it gives the same arc and the same simplification.
+
+    Args:
+        polygons (List[List[Polygon]]): The polygons of each feature.
+        tolerance (float): The maximum distance between a border and its simplification.
+
+    Returns:
+        List[List[Polygon]]: The simplified polygons of each feature. Rings that collapse are dropped,
+        along with polygons whose exterior ring collapses.
+    """
+    rings = [ring[:-1] for feature in polygons for polygon in feature for ring in polygon]
+
+    # Rings containing each vertex
+    owners: Dict[Tuple[float, float], set] = {}
+    for ring_id, ring in enumerate(rings):
+        for point in map(tuple, ring):
+            owners.setdefault(point, set()).add(ring_id)
+
+    simplified_rings = []
+    for ring in rings:
+        keys: List[FrozenSet[int]] = [frozenset(owners[tuple(point)]) for point in ring]
+        n = len(ring)
+        fixed = [
+            len(keys[i]) >= 3 or keys[i] != keys[i - 1] or keys[i] != keys[(i + 1) % n]
+            for i in range(n)
+        ]
+        fixed_positions = [i for i in range(n) if fixed[i]]
+
+        if not fixed_positions:
+            # Island or enclave ring: cut it at its lowest vertex and at the vertex farthest from it,
+            # which do not depend on where the ring starts
+            lowest = int(np.lexsort((ring[:, 1], ring[:, 0]))[0])
+            farthest = int(np.argmax(np.hypot(*(ring - ring[lowest]).T)))
+            fixed_positions = sorted({lowest, farthest})
+
+        points = []
+        for start, end in zip(fixed_positions, fixed_positions[1:] + [fixed_positions[0] + n]):
+            arc = np.take(ring, range(start, end + 1), axis=0, mode="wrap")
+            points.extend(_simplify_arc(arc, tolerance)[:-1])
+        simplified_rings.append(np.array(points + points[:1]) if len(points) >= 3 else None)
+
+    # Rebuild the features from the simplified rings, in the same order
+    result, ring_id = [], 0
+    for feature in polygons:
+        simplified_feature = []
+        for polygon in feature:
+            polygon_rings = simplified_rings[ring_id : ring_id + len(polygon)]
+            ring_id += len(polygon)
+            if polygon_rings[0] is not None:
+                simplified_feature.append([ring for ring in polygon_rings if ring is not None])
+        result.append(simplified_feature)
+    return result
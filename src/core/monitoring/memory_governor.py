@@ -0,0 +1,347 @@
+"""
+Memory governor module for the Sotis Immobilier application.
+This module measures the memory owned by each Streamlit session and by the process, and frees
+the data of idle sessions and the cached partitions least recently used when the configured
+ceiling is approached.
+"""
+
+import gc
+import os
+import threading
+import time
+from dataclasses import dataclass, field
+from functools import lru_cache
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+
+from src.config.config import get_monitoring_config
+from src.core.monitoring.metrics import get_metrics_registry
+
+# Session state keys referencing data shared by all the sessions through the process caches: the
+# caches own this memory, it is neither counted in the sessions nor freed by evicting them
+SHARED_SESSION_KEYS = ("original_data",)
+
+Partition = Tuple[str, int]
+
+
+@dataclass
+class SessionRecord:
+    """Memory accounting of one Streamlit session."""
+    session_id: str
+    session_state: Any
+    last_seen: float
+    sizes: Dict[str, Tuple[int, int]] = field(default_factory=dict)
+
+
+def get_object_bytes(value: Any) -> int:
+    """
+    Estimate the memory held by a session state value.
+
+    Args:
+        value (Any): The value.
+
+    Returns:
+        int: The estimated size in bytes, 0 for values that are not data containers.
+    """
+    if isinstance(value, pd.DataFrame):
+        return int(value.memory_usage(index=True, deep=True).sum())
+    if isinstance(value, pd.Series):
+        return int(value.memory_usage(index=True, deep=True))
+    if isinstance(value, np.ndarray):
+        return value.nbytes
+    if isinstance(value, (pa.Table, pa.RecordBatch)):
+        return value.nbytes
+    return 0
+
+
+def get_process_rss() -> int:
+    """
+    Get the resident memory of the current process.
+
+    Returns:
+        int: The resident set size in bytes.
+    """
+    try:
+        import psutil
+
+        return psutil.Process().memory_info().rss
+    except ImportError:
+        with open("/proc/self/statm") as file:
+            return int(file.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+
+
+def get_process_anonymous_memory() -> int:
+    """
+    Get the resident memory of the current process that is not backed by a file.
+
+    The memory-mapped partitions are file-backed: the kernel can drop their pages at any time and
+    they are shared with the other processes, so they are left out of the figure the governor
+    keeps under the ceiling.
+
+    Returns:
+        int: The resident anonymous memory in bytes, the resident set size where it is not available.
+    """
+    try:
+        with open("/proc/self/status") as file:
+            for line in file:
+                if line.startswith("RssAnon:"):
+                    return int(line.split()[1]) * 1024
+    except OSError:
+        pass
+    return get_process_rss()
+
+
+def is_session_active(session_id: str) -> bool:
+    """
+    Check whether a session still exists in the Streamlit runtime.
+
+    Args:
+        session_id (str): The id of the session.
+
+    Returns:
+        bool: False if the session disconnected, True if it is active or if there is no runtime.
+    """
+    from streamlit.runtime import Runtime
+
+    if not Runtime.exists():
+        return True
+    return Runtime.instance().is_active_session(session_id)
+
+
+def _get_partition(session_state: Any) -> Optional[Partition]:
+    """
+    Get the partition selected by a session.
+
+    Args:
+        session_state (Any): A Streamlit session state, or any mapping.
+
+    Returns:
+        Optional[Partition]: The selected (department, year), or None before the first selection.
+    """
+    items = dict(_get_state_items(session_state))
+    if items.get("selected_department") is None or items.get("selected_year") is None:
+        return None
+    return items["selected_department"], items["selected_year"]
+
+
+def _get_state_items(session_state: Any) -> List[Tuple[str, Any]]:
+    """
+    Get the user-defined items of a session state.
+
+    Args:
+        session_state (Any): A Streamlit session state, or any mapping.
+
+    Returns:
+        List[Tuple[str, Any]]: The (key, value) pairs of the state.
+    """
+    # The session state of other threads is reached through its thread-safe wrapper
+    if hasattr(session_state, "filtered_state"):
+        return list(session_state.filtered_state.items())
+    return list(session_state.items())
+
+
+class MemoryGovernor:
+    """Class responsible for keeping the memory of the process under a ceiling."""
+
+    def __init__(
+        self,
+        memory_ceiling_bytes: Optional[int] = None,
+        high_watermark: Optional[float] = None,
+        low_watermark: Optional[float] = None,
+        session_idle_seconds: Optional[int] = None,
+        session_exists: Callable[[str], bool] = is_session_active,
+    ):
+        """
+        Initialize the MemoryGovernor.
+
+        Args:
+            memory_ceiling_bytes (Optional[int]): Memory ceiling of the process. Defaults to the configuration.
+            high_watermark (Optional[float]): Fraction of the ceiling above which memory is freed.
+            low_watermark (Optional[float]): Fraction of the ceiling down to which the caches are cleared.
+            session_idle_seconds (Optional[int]): Inactivity after which a session is considered idle.
+            session_exists (Callable[[str], bool]): Function checking whether a session still exists.
+        """
+        config = get_monitoring_config()
+        self.memory_ceiling_bytes = memory_ceiling_bytes or config.memory_ceiling_bytes
+        self.high_watermark = high_watermark or config.memory_high_watermark
+        self.low_watermark = low_watermark or config.memory_low_watermark
+        self.session_idle_seconds = session_idle_seconds or config.session_idle_seconds
+        self.session_exists = session_exists
+        self.sessions: Dict[str, SessionRecord] = {}
+        self.partitions: Dict[Partition, float] = {}
+        self.caches: List[Callable[[str, int], None]] = []
+        self._lock = threading.Lock()
+
+    def register_cache(self, clear: Callable[[str, int], None]) -> None:
+        """
+        Register a cache that can be cleared partition by partition to free memory.
+
+        Args:
+            clear (Callable[[str, int], None]): Function clearing the entries of a (department, year) partition.
+        """
+        if clear not in self.caches:
+            self.caches.append(clear)
+
+    def touch(self, session_id: str, session_state: Any) -> None:
+        """
+        Record the activity of a session and of its partition, and forget the disconnected sessions.
+
+        Args:
+            session_id (str): The id of the session.
+            session_state (Any): The state of the session.
+        """
+        with self._lock:
+            now = time.time()
+            record = self.sessions.get(session_id)
+            if record is None:
+                self.sessions[session_id] = SessionRecord(session_id, session_state, now)
+            else:
+                record.session_state = session_state
+                record.last_seen = now
+
+            partition = _get_partition(session_state)
+            if partition is not None:
+                self.partitions[partition] = now
+
+            # The runtime already dropped the state of these sessions, only the reference held here kept it alive
+            for closed_session_id in [
+                other_id for other_id in self.sessions
+                if other_id != session_id and not self.session_exists(other_id)
+            ]:
+                del self.sessions[closed_session_id]
+
+    def session_bytes(self, record: SessionRecord) -> int:
+        """
+        Measure the memory owned by a session.
+
+        Sizes are memoized per object, so unchanged DataFrames are measured only once. The data shared
+        with the other sessions is not counted.
+
+        Args:
+            record (SessionRecord): The session to measure.
+
+        Returns:
+            int: The memory owned by the data of the session, in bytes.
+        """
+        total = 0
+        sizes = {}
+        for key, value in _get_state_items(record.session_state):
+            if key in SHARED_SESSION_KEYS:
+                continue
+            object_id, size = record.sizes.get(key, (None, 0))
+            if object_id != id(value):
+                size = get_object_bytes(value)
+            sizes[key] = (id(value), size)
+            total += size
+        record.sizes = sizes
+        return total
+
+    def enforce(self) -> Dict[str, int]:
+        """
+        Free memory if the process is close to the ceiling, then publish the memory metrics.
+
+        Above the high watermark, the data of the idle sessions is freed first, then the cached
+        partitions are cleared from the least recently used one until the memory falls below the low
+        watermark, so that a process staying around the high watermark does not clear its caches on
+        every run.
+
+        Returns:
+            Dict[str, int]: The memory figures after enforcement.
+        """
+        with self._lock:
+            memory = get_process_anonymous_memory()
+            evicted_sessions = 0
+            cleared_partitions = 0
+
+            if memory > self.memory_ceiling_bytes * self.high_watermark:
+                now = time.time()
+                for record in list(self.sessions.values()):
+                    if now - record.last_seen > self.session_idle_seconds:
+                        self._evict_session(record)
+                        evicted_sessions += 1
+                gc.collect()
+                memory = get_process_anonymous_memory()
+
+                for partition in sorted(self.partitions, key=self.partitions.get):
+                    if memory <= self.memory_ceiling_bytes * self.low_watermark:
+                        break
+                    for clear in self.caches:
+                        clear(*partition)
+                    del self.partitions[partition]
+                    cleared_partitions += 1
+                    gc.collect()
+                    memory = get_process_anonymous_memory()
+
+            figures = self._publish_metrics(memory, evicted_sessions, cleared_partitions)
+
+        return figures
+
+    def _evict_session(self, record: SessionRecord) -> int:
+        """
+        Free the data owned by a session and stop tracking it.
+
+        The session state keeps its other values; the freed keys are initialized again when the
+        session reruns its script.
+
+        Args:
+            record (SessionRecord): The session to evict.
+
+        Returns:
+            int: The estimated number of bytes freed.
+        """
+        self.session_bytes(record)
+        freed = 0
+        for key, (_, size) in record.sizes.items():
+            if size > 0:
+                freed += size
+                del record.session_state[key]
+        print(f"Evicted idle session {record.session_id}, freed ~{freed / 1e6:.1f} MB")
+        del self.sessions[record.session_id]
+        return freed
+
+    def _publish_metrics(self, memory: int, evicted_sessions: int, cleared_partitions: int) -> Dict[str, int]:
+        """
+        Publish the memory figures to the metrics registry.
+
+        Args:
+            memory (int): The resident anonymous memory of the process.
+            evicted_sessions (int): The number of sessions evicted by this enforcement.
+            cleared_partitions (int): The number of partitions cleared from the caches by this enforcement.
+
+        Returns:
+            Dict[str, int]: The published figures.
+        """
+        registry = get_metrics_registry()
+        session_sizes = [self.session_bytes(record) for record in self.sessions.values()]
+        sessions_bytes = sum(session_sizes)
+
+        # Aggregates only: a gauge per session would create a new series for every visitor
+        figures = {
+            "process_rss_bytes": get_process_rss(),
+            "process_anonymous_bytes": memory,
+            "sessions": len(self.sessions),
+            "sessions_bytes": sessions_bytes,
+            "session_max_bytes": max(session_sizes, default=0),
+            "caches_and_runtime_bytes": max(memory - sessions_bytes, 0),
+            "memory_ceiling_bytes": self.memory_ceiling_bytes,
+        }
+        for name, value in figures.items():
+            registry.set_gauge(f"sotis_{name}", value)
+        registry.increment("sotis_evicted_sessions_total", evicted_sessions)
+        registry.increment("sotis_partition_clears_total", cleared_partitions)
+        registry.flush()
+        return figures
+
+
+@lru_cache(maxsize=None)
+def get_memory_governor() -> MemoryGovernor:
+    """
+    Get the memory governor of the current process.
+
+    Returns:
+        MemoryGovernor: The shared memory governor instance.
+    """
+    return MemoryGovernor()
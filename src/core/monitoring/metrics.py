@@ -0,0 +1,159 @@
+"""
+Metrics module for the Sotis Immobilier application.
+This module collects gauges and counters in each process and publishes them as snapshot files,
+which the headless API renders in the Prometheus text format.
+"""
+
+import json
+import os
+import socket
+import threading
+import time
+from functools import lru_cache
+from pathlib import Path
+from typing import Dict, List, Optional, Tuple
+
+from src.config.config import get_data_config
+
+# Snapshots not updated for this long are considered as coming from a dead process (seconds)
+SNAPSHOT_MAX_AGE = 300
+
+LabelSet = Tuple[Tuple[str, str], ...]
+
+
+class MetricsRegistry:
+    """Class responsible for the metrics of the current process."""
+
+    def __init__(self, directory: Optional[str] = None):
+        """
+        Initialize the MetricsRegistry.
+
+        Args:
+            directory (Optional[str]): Directory of the snapshot files. Defaults to the cache directory.
+        """
+        self.directory = Path(directory or os.path.join(get_data_config().cache_dir, "metrics"))
+        self.process = f"{socket.gethostname()}-{os.getpid()}"
+        self._gauges: Dict[str, Dict[LabelSet, float]] = {}
+        self._counters: Dict[str, Dict[LabelSet, float]] = {}
+        self._lock = threading.Lock()
+
+    def set_gauge(self, name: str, value: float, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Set the value of a gauge.
+
+        Args:
+            name (str): The metric name.
+            value (float): The current value.
+            labels (Optional[Dict[str, str]]): The labels of the series.
+        """
+        with self._lock:
+            self._gauges.setdefault(name, {})[self._label_set(labels)] = float(value)
+
+    def increment(self, name: str, amount: float = 1.0, labels: Optional[Dict[str, str]] = None) -> None:
+        """
+        Increment a counter.
+
+        Args:
+            name (str): The metric name.
+            amount (float): The increment.
+            labels (Optional[Dict[str, str]]): The labels of the series.
+        """
+        with self._lock:
+            series = self._counters.setdefault(name, {})
+            label_set = self._label_set(labels)
+            series[label_set] = series.get(label_set, 0.0) + amount
+
+    def snapshot(self) -> Dict:
+        """
+        Get the current values of all the metrics.
+
+        Returns:
+            Dict: The snapshot, serializable to JSON.
+        """
+        with self._lock:
+            return {
+                "process": self.process,
+                "timestamp": time.time(),
+                "gauges": self._serialize(self._gauges),
+                "counters": self._serialize(self._counters),
+            }
+
+    def flush(self) -> None:
+        """Write the snapshot of the process atomically to the snapshot directory."""
+        self.directory.mkdir(parents=True, exist_ok=True)
+        path = self.directory / f"{self.process}.json"
+        tmp_path = path.with_suffix(".tmp")
+        tmp_path.write_text(json.dumps(self.snapshot()))
+        os.replace(tmp_path, path)
+
+    @staticmethod
+    def _label_set(labels: Optional[Dict[str, str]]) -> LabelSet:
+        """Get a hashable representation of labels."""
+        return tuple(sorted((labels or {}).items()))
+
+    @staticmethod
+    def _serialize(metrics: Dict[str, Dict[LabelSet, float]]) -> Dict[str, List]:
+        """Turn the series of metrics into JSON-friendly lists of [labels, value]."""
+        return {name: [[dict(labels), value] for labels, value in series.items()] for name, series in metrics.items()}
+
+
+@lru_cache(maxsize=None)
+def get_metrics_registry() -> MetricsRegistry:
+    """
+    Get the metrics registry of the current process.
+
+    Returns:
+        MetricsRegistry: The shared metrics registry instance.
+    """
+    return MetricsRegistry()
+
+
+def read_snapshots(directory: Optional[str] = None) -> List[Dict]:
+    """
+    Read the recent snapshots of all the processes.
+
+    Args:
+        directory (Optional[str]): Directory of the snapshot files. Defaults to the cache directory.
+
+    Returns:
+        List[Dict]: The snapshots updated within SNAPSHOT_MAX_AGE seconds.
+    """
+    directory = Path(directory or os.path.join(get_data_config().cache_dir, "metrics"))
+    snapshots = []
+    for path in sorted(directory.glob("*.json")):
+        try:
+            snapshot = json.loads(path.read_text())
+        except (OSError, ValueError):
+            continue
+        if time.time() - snapshot.get("timestamp", 0) <= SNAPSHOT_MAX_AGE:
+            snapshots.append(snapshot)
+    return snapshots
+
+
+def render_prometheus(snapshots: List[Dict]) -> str:
+    """
+    Render snapshots in the Prometheus text exposition format.
+
+    Args:
+        snapshots (List[Dict]): The snapshots to render, each series labelled with its process.
+
+    Returns:
+        str: The metrics as text.
+    """
+    lines = []
+    for kind in ("gauges", "counters"):
+        metric_type = "gauge" if kind == "gauges" else "counter"
+        names = sorted({name for snapshot in snapshots for name in snapshot.get(kind, {})})
+        for name in names:
+            lines.append(f"# TYPE {name} {metric_type}")
+            for snapshot in snapshots:
+                for labels, value in snapshot.get(kind, {}).get(name, []):
+                    labels = {"process": snapshot["process"], **labels}
+                    label_text = ",".join(f'{key}="{_escape(val)}"' for key, val in sorted(labels.items()))
+                    lines.append(f"{name}{{{label_text}}} {value}")
+    return "\n".join(lines) + "\n"
+
+
+def _escape(value) -> str:
+    """Escape a label value for the Prometheus text format."""
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
@@ -0,0 +1,286 @@
+"""
+Tile builder module for the Sotis Immobilier application.
+This module rasterizes the transactions of a partition into z/x/y pyramids of PNG tiles
+(median price and density), so that the map costs the same whatever the number of transactions.
+"""
+
+import json
+import os
+import shutil
+import tempfile
+from pathlib import Path
+from typing import Dict, Optional
+
+import numpy as np
+import pandas as pd
+from matplotlib import colormaps
+from PIL import Image
+
+from src.config.property_types import PROPERTY_TYPES
+from src.core.data.artifacts import artifact_path, is_fresh, register_artifact, slugify
+from src.core.data.partition_store import get_partition_store
+from src.core.data.transforms import select_property_type
+
+TILE_SIZE = 256
+
+# Size of the cells transactions are aggregated in (pixels)
+CELL_SIZE = 4
+
+# Zoom levels of the pyramid, from the department overview to the street
+MIN_ZOOM = 6
+MAX_ZOOM = 14
+
+# Layers of the pyramid: the aggregated column ("count" for the density) and the colormap
+TILE_LAYERS = {
+    "density": ("count", "viridis"),
+    "median_prix_m2": ("prix_m2", "turbo"),
+    "median_valeur_fonciere": ("valeur_fonciere", "turbo"),
+}
+
+
+def get_tiles_dir(selected_dept: str, selected_year: int, selected_local_type: str, layer: str) -> Path:
+    """
+    Get the directory of a tile pyramid.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        selected_local_type (str): The property type.
+        layer (str): The layer name, a key of TILE_LAYERS.
+
+    Returns:
+        Path: The directory containing the metadata and the z/x/y.png tiles.
+    """
+    tiles_dir = artifact_path("tiles", selected_dept, selected_year, "meta.json").parent
+    return tiles_dir / slugify(selected_local_type) / layer
+
+
+def project(latitude: np.ndarray, longitude: np.ndarray, zoom: int) -> tuple:
+    """
+    Project coordinates to global Web Mercator pixel coordinates.
+
+    Args:
+        latitude (np.ndarray): Latitudes in degrees.
+        longitude (np.ndarray): Longitudes in degrees.
+        zoom (int): The zoom level.
+
+    Returns:
+        tuple: The x and y pixel coordinates.
+    """
+    scale = TILE_SIZE * 2**zoom
+    latitude_rad = np.radians(np.clip(latitude, -85.05112878, 85.05112878))
+    x = (longitude + 180.0) / 360.0 * scale
+    y = (1.0 - np.log(np.tan(latitude_rad) + 1.0 / np.cos(latitude_rad)) / np.pi) / 2.0 * scale
+    return x, y
+
+
+class TileBuilder:
+    """Class responsible for rasterizing a partition into tile pyramids."""
+
+    def __init__(self, properties_data: pd.DataFrame):
+        """
+        Initialize the TileBuilder.
+
+        Args:
+            properties_data (pd.DataFrame): The transactions of one property type, with a "prix_m2" column.
+        """
+        self.properties_data = properties_data
+
+    def build(self, output_dir: Path, layer: str) -> Dict:
+        """
+        Build the tile pyramid of a layer.
+
+        The pyramid is built in a new versioned directory, then the pyramid directory, a symbolic link,
+        is switched to it at once: the tiles being served always come from one complete build.
+
+        Args:
+            output_dir (Path): The directory of the pyramid, replaced if it exists.
+            layer (str): The layer name, a key of TILE_LAYERS.
+
+        Returns:
+            Dict: The metadata of the pyramid (zoom levels, color scale, bounds).
+        """
+        output_dir.parent.mkdir(parents=True, exist_ok=True)
+        build_dir = Path(tempfile.mkdtemp(dir=output_dir.parent, prefix=f".{output_dir.name}."))
+        try:
+            metadata = self._build_pyramid(build_dir, layer)
+            self._switch_link(build_dir, output_dir)
+        except BaseException:
+            shutil.rmtree(build_dir)
+            raise
+        return metadata
+
+    @staticmethod
+    def _switch_link(build_dir: Path, output_dir: Path) -> None:
+        """
+        Point the directory of a pyramid to a new build, removing the builds before the previous one.
+
+        The previous build is kept until the next one, for the requests which already resolved the link.
+
+        Args:
+            build_dir (Path): The versioned directory the pyramid was built in.
+            output_dir (Path): The link to the current build.
+        """
+        kept = {build_dir.name}
+        if output_dir.is_symlink():
+            kept.add(os.readlink(output_dir))
+        elif output_dir.exists():
+            # Pyramid built before the builds were versioned: it is moved aside, once
+            legacy_dir = Path(tempfile.mkdtemp(dir=output_dir.parent, prefix=f".{output_dir.name}."))
+            os.replace(output_dir, legacy_dir / output_dir.name)
+            kept.add(legacy_dir.name)
+
+        # A link is renamed over the previous one atomically, so that the path never goes missing
+        link_path = output_dir.parent / f"{build_dir.name}.link"
+        os.symlink(build_dir.name, link_path)
+        os.replace(link_path, output_dir)
+
+        for path in output_dir.parent.glob(f".{output_dir.name}.*"):
+            if path.name in kept:
+                continue
+            if path.is_symlink():
+                path.unlink()
+            else:
+                shutil.rmtree(path)
+
+    def _build_pyramid(self, output_dir: Path, layer: str) -> Dict:
+        """
+        Rasterize every zoom level of a layer and write its metadata.
+
+        Args:
+            output_dir (Path): The empty directory of the pyramid.
+            layer (str): The layer name, a key of TILE_LAYERS.
+
+        Returns:
+            Dict: The metadata of the pyramid (zoom levels, color scale, bounds).
+        """
+        value_column, colormap_name = TILE_LAYERS[layer]
+
+        latitude = self.properties_data["latitude"].to_numpy(dtype=np.float64)
+        longitude = self.properties_data["longitude"].to_numpy(dtype=np.float64)
+        values = None if value_column == "count" else self.properties_data[value_column].to_numpy(dtype=np.float64)
+
+        # Color scale shared by all the tiles and zoom levels, robust to extreme values
+        if values is not None and len(values):
+            vmin, vmax = np.percentile(values, [2, 98])
+        else:
+            vmin, vmax = 0.0, 1.0
+
+        for zoom in range(MIN_ZOOM, MAX_ZOOM + 1):
+            x, y = project(latitude, longitude, zoom)
+            cells = pd.DataFrame(
+                {"cell_x": (x // CELL_SIZE).astype(np.int64), "cell_y": (y // CELL_SIZE).astype(np.int64)}
+            )
+            if values is None:
+                grid = cells.groupby(["cell_x", "cell_y"]).size().rename("value").reset_index()
+                grid["value"] = np.log1p(grid["value"])
+                zoom_vmin, zoom_vmax = 0.0, max(grid["value"].max(), 1e-9) if len(grid) else 1.0
+            else:
+                cells["value"] = values
+                grid = cells.groupby(["cell_x", "cell_y"])["value"].median().reset_index()
+                zoom_vmin, zoom_vmax = vmin, vmax
+            self._write_tiles(output_dir / str(zoom), grid, zoom_vmin, zoom_vmax, colormap_name)
+
+        metadata = {
+            "layer": layer,
+            "min_zoom": MIN_ZOOM,
+            "max_zoom": MAX_ZOOM,
+            "vmin": float(vmin),
+            "vmax": float(vmax),
+            "colormap": colormap_name,
+            "bounds": [
+                [float(latitude.min()), float(longitude.min())],
+                [float(latitude.max()), float(longitude.max())],
+            ]
+            if len(latitude)
+            else None,
+        }
+        (output_dir / "meta.json").write_text(json.dumps(metadata))
+        return metadata
+
+    @staticmethod
+    def _write_tiles(zoom_dir: Path, grid: pd.DataFrame, vmin: float, vmax: float, colormap_name: str) -> None:
+        """
+        Rasterize the aggregated cells of one zoom level into PNG tiles.
+
+        Args:
+            zoom_dir (Path): The directory of the zoom level.
+            grid (pd.DataFrame): The cells with their "cell_x", "cell_y" and "value" columns.
+            vmin (float): The value mapped to the start of the colormap.
+            vmax (float): The value mapped to the end of the colormap.
+            colormap_name (str): The name of the matplotlib colormap.
+        """
+        cells_per_tile = TILE_SIZE // CELL_SIZE
+        colormap = colormaps[colormap_name]
+
+        grid = grid.assign(
+            tile_x=grid["cell_x"] // cells_per_tile,
+            tile_y=grid["cell_y"] // cells_per_tile,
+            normalized=np.clip((grid["value"] - vmin) / max(vmax - vmin, 1e-9), 0.0, 1.0),
+        )
+        for (tile_x, tile_y), tile_cells in grid.groupby(["tile_x", "tile_y"]):
+            pixels = np.zeros((cells_per_tile, cells_per_tile, 4), dtype=np.uint8)
+            colors = colormap(tile_cells["normalized"].to_numpy(), bytes=True)
+            colors[:, 3] = 210
+            pixels[
+                (tile_cells["cell_y"] % cells_per_tile).to_numpy(),
+                (tile_cells["cell_x"] % cells_per_tile).to_numpy(),
+            ] = colors
+
+            # Each cell becomes a CELL_SIZE x CELL_SIZE block of pixels
+            pixels = pixels.repeat(CELL_SIZE, axis=0).repeat(CELL_SIZE, axis=1)
+            tile_path = zoom_dir / str(tile_x) / f"{tile_y}.png"
+            tile_path.parent.mkdir(parents=True, exist_ok=True)
+            Image.fromarray(pixels).save(tile_path, optimize=True)
+
+
+@register_artifact("tiles")
+def build_partition_tiles(selected_dept: str, selected_year: int) -> None:
+    """
+    Build the tile pyramids of every property type and layer of a partition.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+    """
+    store = get_partition_store()
+    with store.lock(selected_dept, selected_year):
+        properties_data = store.read(selected_dept, selected_year)
+        for local_type in PROPERTY_TYPES:
+            builder = TileBuilder(select_property_type(properties_data, local_type))
+            for layer in TILE_LAYERS:
+                builder.build(get_tiles_dir(selected_dept, selected_year, local_type, layer), layer)
+
+
+def get_tile_metadata(
+    selected_dept: str, selected_year: int, selected_local_type: str, layer: str
+) -> Optional[Dict]:
+    """
+    Get the metadata of a tile pyramid, building the pyramid if it is missing or outdated.
+
+    Args:
+        selected_dept (str): The department code.
+        selected_year (int): The year.
+        selected_local_type (str): The property type.
+        layer (str): The layer name, a key of TILE_LAYERS.
+
+    Returns:
+        Optional[Dict]: The metadata of the pyramid, None if the partition is not stored.
+    """
+    store = get_partition_store()
+    if not store.exists(selected_dept, selected_year):
+        return None
+
+    output_dir = get_tiles_dir(selected_dept, selected_year, selected_local_type, layer)
+    metadata_path = output_dir / "meta.json"
+    if is_fresh(metadata_path, selected_dept, selected_year):
+        return json.loads(metadata_path.read_text())
+
+    # Only one thread or process builds the pyramids of a partition, the others wait and read them
+    with store.lock(selected_dept, selected_year):
+        if is_fresh(metadata_path, selected_dept, selected_year):
+            return json.loads(metadata_path.read_text())
+
+        print(f"Building tiles... Year: {selected_year}, Department: {selected_dept}, Layer: {layer}")
+        properties_data = select_property_type(store.read(selected_dept, selected_year), selected_local_type)
+        return TileBuilder(properties_data).build(output_dir, layer)
@@ -0,0 +1,206 @@
+"""Tests for the headless API module."""
+
+import io
+import threading
+from http.server import ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+import requests
+
+from src.api import server
+from src.core.data import aggregates, artifacts, export
+from src.core.data.partition_store import STREAM_BATCH_SIZE, PartitionStore
+from src.core.data.transforms import (
+    compute_commune_statistics,
+    compute_postal_code_statistics,
+    remove_outliers,
+    select_property_type,
+)
+
+GEOMETRIES = {
+    "type": "FeatureCollection",
+    "features": [
+        {"type": "Feature", "properties": {"code": f"01{i:03d}"}, "geometry": None} for i in range(100)
+    ],
+}
+
+NUM_ROWS = 2 * STREAM_BATCH_SIZE + 123
+
+
+def make_partition(num_rows: int = NUM_ROWS) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    postal_codes = np.array([f"72{i:03d}" for i in range(100)])
+    return pd.DataFrame(
+        {
+            "type_local": rng.choice(["Maison", "Appartement"], num_rows),
+            "valeur_fonciere": np.round(rng.lognormal(12, 0.5, num_rows), -2),
+            "code_postal": rng.choice(postal_codes, num_rows),
+            "nom_commune": rng.choice(["Le Mans", "Allonnes", "Coulaines"], num_rows),
+            "surface_reelle_bati": rng.integers(10, 200, num_rows).astype(float),
+            "longitude": rng.uniform(0, 1, num_rows),
+            "latitude": rng.uniform(47, 48, num_rows),
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def partition() -> pd.DataFrame:
+    return make_partition()
+
+
+@pytest.fixture
+def partition_store(tmp_path, monkeypatch, partition):
+    store = PartitionStore(root=str(tmp_path / "partitions"))
+    store.write("72", 2023, partition)
+    for module in (server, export, aggregates, artifacts):
+        monkeypatch.setattr(module, "get_partition_store", lambda: store)
+    server.compute_aggregate.cache_clear()
+    yield store
+    server.compute_aggregate.cache_clear()
+
+
+@pytest.fixture
+def api_url(tmp_path, monkeypatch):
+    geometry_path = tmp_path / "medium.arrow"
+    geometry_path.write_bytes(b"")
+    monkeypatch.setattr(server, "load_commune_geometries", lambda dept, level: GEOMETRIES)
+    monkeypatch.setattr(server, "get_geometry_path", lambda dept, level: geometry_path)
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), server.ApiRequestHandler)
+    thread = threading.Thread(target=httpd.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{httpd.server_port}"
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_unexpected_error_returns_json_500(api_url, monkeypatch):
+    def fail():
+        raise RuntimeError("boom")
+
+    monkeypatch.setattr(server, "read_snapshots", fail)
+    response = requests.get(f"{api_url}/metrics")
+
+    assert response.status_code == 500
+    assert response.json() == {"error": "Internal server error"}
+
+    # The connection keeps serving requests
+    assert requests.get(f"{api_url}/health").json() == {"status": "ok"}
+
+
+def test_gzip_and_identity_etags_differ(api_url):
+    url = f"{api_url}/geometries/01/communes/medium.geojson"
+    identity = requests.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = requests.get(url, headers={"Accept-Encoding": "gzip"})
+
+    assert identity.headers.get("Content-Encoding") is None
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert identity.headers["ETag"] != gzipped.headers["ETag"]
+    assert gzipped.headers["ETag"].endswith('-gzip"')
+    assert gzipped.headers["Vary"] == "Accept-Encoding"
+
+
+def test_if_none_match_list(api_url):
+    url = f"{api_url}/geometries/01/communes/medium.geojson"
+    etag = requests.get(url, headers={"Accept-Encoding": "gzip"}).headers["ETag"]
+
+    response = requests.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": f'"other", {etag}'})
+    assert response.status_code == 304
+    assert response.headers["ETag"] == etag
+
+    # A tag which only contains the current one is not a match
+    response = requests.get(url, headers={"Accept-Encoding": "gzip", "If-None-Match": f'"x{etag[1:]}'})
+    assert response.status_code == 200
+
+    # The gzip entity-tag does not validate the identity representation
+    response = requests.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": etag})
+    assert response.status_code == 200
+
+
+def test_postal_code_aggregate(api_url, partition_store, partition):
+    url = f"{api_url}/departments/72/2023/postal-codes?type=Maison"
+    identity = requests.get(url, headers={"Accept-Encoding": "identity"})
+    gzipped = requests.get(url, headers={"Accept-Encoding": "gzip"})
+
+    expected = compute_postal_code_statistics(
+        remove_outliers(select_property_type(partition, "Maison"), "prix_m2"), "prix_m2"
+    )
+    body = identity.json()
+    assert (body["department"], body["year"], body["type"], body["value_column"]) == ("72", 2023, "Maison", "prix_m2")
+    pd.testing.assert_frame_equal(pd.DataFrame(body["rows"]), expected.reset_index(drop=True))
+
+    assert identity.headers.get("Content-Encoding") is None
+    assert gzipped.headers["Content-Encoding"] == "gzip"
+    assert gzipped.json() == body
+    assert gzipped.headers["ETag"] == identity.headers["ETag"][:-1] + '-gzip"'
+
+    # Each representation is validated by its own entity-tag
+    for encoding, response in (("identity", identity), ("gzip", gzipped)):
+        headers = {"Accept-Encoding": encoding, "If-None-Match": response.headers["ETag"]}
+        revalidated = requests.get(url, headers=headers)
+        assert revalidated.status_code == 304
+        assert revalidated.headers["ETag"] == response.headers["ETag"]
+    response = requests.get(url, headers={"Accept-Encoding": "identity", "If-None-Match": gzipped.headers["ETag"]})
+    assert response.status_code == 200
+
+    # Other filters are other resources
+    other = requests.get(f"{api_url}/departments/72/2023/postal-codes?type=Appartement")
+    assert other.headers["ETag"] not in (identity.headers["ETag"], gzipped.headers["ETag"])
+
+
+def test_filtered_commune_aggregate(api_url, partition_store, partition):
+    url = f"{api_url}/departments/72/2023/communes?type=Appartement&price=total&outliers=0&surface_min=50&commune=Allonnes"
+    response = requests.get(url)
+
+    selected = select_property_type(partition, "Appartement")
+    selected = selected[(selected["surface_reelle_bati"] >= 50) & (selected["nom_commune"] == "Allonnes")]
+    expected = compute_commune_statistics(selected, "valeur_fonciere").reset_index(drop=True)
+    assert response.json()["value_column"] == "valeur_fonciere"
+    pd.testing.assert_frame_equal(pd.DataFrame(response.json()["rows"]), expected, check_dtype=False)
+
+    response = requests.get(f"{url}&format=csv")
+    assert response.headers["Content-Type"] == "text/csv; charset=utf-8"
+    assert 'filename="communes_72_2023_' in response.headers["Content-Disposition"]
+    pd.testing.assert_frame_equal(
+        pd.read_csv(io.BytesIO(response.content), dtype={"code_postal": str}), expected, check_dtype=False
+    )
+
+
+def read_transactions(content: bytes, output_format: str) -> pd.DataFrame:
+    if output_format == "csv":
+        return pd.read_csv(
+            io.BytesIO(content), dtype={"code_postal": str, "valeur_fonciere": float, "surface_reelle_bati": float}
+        )
+    return pd.read_parquet(io.BytesIO(content)).astype({"type_local": object, "code_postal": object, "nom_commune": object})
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_streamed_transactions(api_url, partition_store, partition, output_format):
+    url = f"{api_url}/departments/72/2023/transactions.{output_format}?type=Maison&prix_m2_max=3000"
+    response = requests.get(url, stream=True, headers={"Accept-Encoding": "identity"})
+    chunks = list(response.raw.read_chunked(decode_content=False))
+
+    assert response.headers["Transfer-Encoding"] == "chunked"
+    assert response.headers["Content-Type"] == export.EXPORT_FORMATS[output_format][0]
+    assert len(chunks) > 1
+
+    # Raw transactions keep their outliers by default
+    expected = select_property_type(partition, "Maison")
+    expected = expected[expected["prix_m2"] <= 3000].reset_index(drop=True)
+    pd.testing.assert_frame_equal(read_transactions(b"".join(chunks), output_format), expected)
+
+    revalidated = requests.get(url, headers={"If-None-Match": response.headers["ETag"]})
+    assert revalidated.status_code == 304
+
+
+@pytest.mark.parametrize("output_format", ["csv", "parquet"])
+def test_streamed_transactions_without_match(api_url, partition_store, partition, output_format):
+    response = requests.get(f"{api_url}/departments/72/2023/transactions.{output_format}?type=Maison&commune=Paris")
+
+    assert response.status_code == 200
+    transactions = read_transactions(response.content, output_format)
+    assert transactions.empty
+    assert list(transactions.columns) == [*partition.columns, "prix_m2"]
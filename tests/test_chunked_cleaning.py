@@ -0,0 +1,65 @@
+"""Tests for the chunked cleaning module."""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.core.data.chunked_cleaning import PARTITION_SCHEMA, ChunkedCleaner
+from src.core.data.loader import DataLoader
+
+
+@pytest.fixture
+def source_path(tmp_path):
+    rng = np.random.default_rng(0)
+    num_rows = 5_000
+    data = pd.DataFrame(
+        {
+            "type_local": rng.choice(["Maison", "Appartement"], num_rows),
+            "valeur_fonciere": rng.integers(1, 400, num_rows) * 1000.0,
+            "code_postal": rng.choice(["1000", "72000.0", "72100", "75001"], num_rows),
+            "nom_commune": rng.choice(["Bourg", "Le Mans", "Paris"], num_rows),
+            "surface_reelle_bati": rng.integers(10, 200, num_rows).astype(float),
+            "longitude": rng.integers(0, 5, num_rows) / 10,
+            "latitude": rng.integers(0, 5, num_rows) / 10,
+        }
+    )
+    # Missing values are dropped before the duplicates are removed
+    data.loc[rng.choice(num_rows, 100, replace=False), "surface_reelle_bati"] = np.nan
+
+    path = tmp_path / "72.csv.gz"
+    data.to_csv(path, index=False, compression="gzip")
+    return str(path)
+
+
+def sort_rows(data: pd.DataFrame) -> pd.DataFrame:
+    return data.sort_values(list(data.columns)).reset_index(drop=True)
+
+
+@pytest.mark.parametrize("chunksize", [100_000, 700, 20])
+def test_matches_in_memory_cleaning(source_path, chunksize):
+    cleaner = ChunkedCleaner()
+    # Small chunks split the hash partitions again, down to several levels
+    cleaner.chunksize = chunksize
+
+    batches = list(cleaner.clean(source_path))
+    cleaned = pa.Table.from_batches(batches, schema=PARTITION_SCHEMA).to_pandas()
+    expected = DataLoader.clean_data_gouv(source_path)
+
+    assert cleaned["code_postal"].is_monotonic_increasing
+    pd.testing.assert_frame_equal(sort_rows(cleaned), sort_rows(expected[cleaned.columns]))
+
+
+def test_hash_collisions_keep_distinct_rows(source_path, monkeypatch):
+    # Every row gets the same hash, so that only the keys tell the duplicates apart
+    monkeypatch.setattr(
+        pd.util, "hash_pandas_object", lambda data, index: pd.Series(np.zeros(len(data), dtype=np.uint64))
+    )
+    cleaner = ChunkedCleaner()
+    cleaner.chunksize = 700
+
+    batches = list(cleaner.clean(source_path))
+    cleaned = pa.Table.from_batches(batches, schema=PARTITION_SCHEMA).to_pandas()
+    expected = DataLoader.clean_data_gouv(source_path)
+
+    pd.testing.assert_frame_equal(sort_rows(cleaned), sort_rows(expected[cleaned.columns]))
@@ -0,0 +1,52 @@
+"""Tests for the export module."""
+
+from urllib.parse import parse_qs
+
+import numpy as np
+import pytest
+
+from src.core.data.export import TransactionFilters
+
+
+def round_trip(filters: TransactionFilters) -> TransactionFilters:
+    return TransactionFilters.from_query(parse_qs(filters.to_query()), "Maison", default_remove_outliers=False)
+
+
+@pytest.mark.parametrize(
+    "filters",
+    [
+        TransactionFilters("Maison"),
+        TransactionFilters("Appartement", show_price_per_sqm=False, remove_outliers=True),
+        TransactionFilters(
+            "Local industriel. commercial ou assimilé",
+            ranges={"surface_reelle_bati": (25.5, 120.0), "prix_m2": (1000.0, np.inf)},
+            communes=["Le Mans", "Saint-Saturnin & Co"],
+        ),
+        TransactionFilters("Maison", ranges={"valeur_fonciere": (-np.inf, 250_000.0)}),
+    ],
+)
+def test_query_round_trip(filters):
+    assert round_trip(filters) == filters
+
+
+def test_infinite_upper_bound_is_left_out():
+    filters = TransactionFilters("Maison", ranges={"prix_m2": (1000.0, np.inf)})
+
+    query = parse_qs(filters.to_query())
+
+    assert query["prix_m2_min"] == ["1000.0"]
+    assert "prix_m2_max" not in query
+    assert round_trip(filters).ranges["prix_m2"] == (1000.0, np.inf)
+
+
+def test_query_defaults():
+    filters = TransactionFilters.from_query({}, "Maison")
+
+    assert filters == TransactionFilters("Maison", remove_outliers=True)
+    assert filters.is_default
+    assert not TransactionFilters.from_query({"commune": ["Le Mans"]}, "Maison").is_default
+    assert TransactionFilters.from_query({"surface_max": ["80"]}, "Maison").ranges == {
+        "surface_reelle_bati": (-np.inf, 80.0)
+    }
+    with pytest.raises(ValueError):
+        TransactionFilters.from_query({"valeur_min": ["cheap"]}, "Maison")
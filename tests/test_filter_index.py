@@ -0,0 +1,80 @@
+"""Tests for the filter index module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.core.data.filter_index import RANGE_FILTER_COLUMNS, FilterIndex
+
+COMMUNES = ["Allonnes", "Coulaines", "Le Mans", "Sargé-lès-le-Mans"]
+
+
+@pytest.fixture(scope="module")
+def properties_data() -> pd.DataFrame:
+    rng = np.random.default_rng(42)
+    num_rows = 5_000
+    surface = rng.integers(15, 250, num_rows).astype(np.float64)
+    price = np.round(rng.uniform(30_000, 900_000, num_rows), -3)
+    properties_data = pd.DataFrame(
+        {
+            "nom_commune": rng.choice(COMMUNES, num_rows),
+            "surface_reelle_bati": surface,
+            "valeur_fonciere": price,
+            "prix_m2": price / surface,
+        },
+        # The index of a selected property type is not a range
+        index=np.arange(num_rows) * 3,
+    )
+    properties_data.loc[properties_data.index[:10], "prix_m2"] = np.nan
+    return properties_data
+
+
+def reference(properties_data: pd.DataFrame, ranges: dict, communes: list) -> pd.DataFrame:
+    mask = pd.Series(True, index=properties_data.index)
+    for column, (low, high) in ranges.items():
+        mask &= properties_data[column].between(low, high)
+    if communes:
+        mask &= properties_data["nom_commune"].isin(communes)
+    return properties_data[mask].reset_index(drop=True)
+
+
+@pytest.mark.parametrize(
+    "ranges, communes",
+    [
+        ({}, []),
+        ({"surface_reelle_bati": (50, 100)}, []),
+        ({"surface_reelle_bati": (50, 100), "valeur_fonciere": (100_000, 300_000)}, []),
+        ({"prix_m2": (1_000, 3_000), "valeur_fonciere": (200_000, 200_000)}, []),
+        ({}, ["Le Mans"]),
+        ({"surface_reelle_bati": (80, 120)}, ["Coulaines", "Allonnes"]),
+        ({"surface_reelle_bati": (80, 120)}, ["Unknown"]),
+        ({"surface_reelle_bati": (300, 400)}, []),
+        ({"surface_reelle_bati": (15, 250), "prix_m2": (0, 1e9)}, []),
+    ],
+)
+def test_filter_matches_pandas(properties_data, ranges, communes):
+    filter_index = FilterIndex(properties_data)
+
+    result = filter_index.filter(ranges=ranges, communes=communes).reset_index(drop=True)
+
+    pd.testing.assert_frame_equal(result, reference(properties_data, ranges, communes))
+
+
+def test_value_range_and_quantile(properties_data):
+    filter_index = FilterIndex(properties_data)
+
+    assert filter_index.value_range("surface_reelle_bati") == (
+        properties_data["surface_reelle_bati"].min(),
+        properties_data["surface_reelle_bati"].max(),
+    )
+    assert filter_index.quantile("valeur_fonciere", 0.0) == properties_data["valeur_fonciere"].min()
+    assert filter_index.commune_names() == COMMUNES
+
+
+def test_empty_index():
+    columns = {column: pd.Series(dtype=np.float64) for column in RANGE_FILTER_COLUMNS}
+    filter_index = FilterIndex(pd.DataFrame({"nom_commune": pd.Series(dtype=object), **columns}))
+
+    assert len(filter_index) == 0
+    assert filter_index.value_range("prix_m2") == (0.0, 0.0)
+    assert filter_index.filter(ranges={"prix_m2": (0, 1)}, communes=["Le Mans"]).empty
@@ -0,0 +1,77 @@
+"""Tests for the live ingester module."""
+
+import numpy as np
+import pandas as pd
+import requests
+
+from src.core.data.live_ingester import LiveIngester
+from src.core.data.partition_store import PartitionStore
+
+
+def diff(previous: dict, current: dict) -> tuple:
+    """Diff two scrapes given as {key: content} mappings, the previous one sorted as in the snapshots."""
+    previous_keys = np.array(sorted(previous), dtype=np.uint64)
+    previous_contents = np.array([previous[key] for key in sorted(previous)], dtype=np.uint64)
+    keys = np.array(list(current), dtype=np.uint64)
+    contents = np.array(list(current.values()), dtype=np.uint64)
+    changed_rows, removed_keys = LiveIngester._diff(previous_keys, previous_contents, keys, contents)
+    return keys[changed_rows].tolist(), removed_keys.tolist()
+
+
+def test_diff_added_changed_removed():
+    previous = {10: 1, 20: 2, 30: 3, 40: 4}
+    current = {40: 4, 25: 5, 20: 9, 10: 1}
+
+    changed, removed = diff(previous, current)
+
+    assert changed == [25, 20]
+    assert removed == [30]
+
+
+def test_diff_unchanged_scrape():
+    previous = {10: 1, 20: 2}
+    assert diff(previous, {20: 2, 10: 1}) == ([], [])
+
+
+def test_diff_empty_scrapes():
+    assert diff({}, {5: 1, 7: 2}) == ([5, 7], [])
+    assert diff({5: 1, 7: 2}, {}) == ([], [5, 7])
+
+
+def test_diff_keys_beyond_previous_range():
+    # New keys sorting after every previous key must not be matched with the last previous key
+    assert diff({10: 1}, {10: 1, 99: 1}) == ([99], [])
+
+
+def test_listings_of_a_zone_are_told_apart():
+    listings = pd.DataFrame(
+        {
+            "type_local": ["Appartement", "Appartement", "Appartement"],
+            "valeur_fonciere": [250_000.0, 310_000.0, 250_000.0],
+            "code_postal": ["75011", "75011", "75011"],
+            "nom_commune": ["Paris 11e", "Paris 11e", "Paris 11e"],
+            "surface_reelle_bati": [40.0, 40.0, 40.0],
+            "longitude": [2.38, 2.38, 2.38],
+            "latitude": [48.86, 48.86, 48.86],
+        }
+    )
+
+    unique_listings, keys, contents = LiveIngester._hash_listings(listings)
+
+    # Same zone and surface, different prices: two listings; the third row is a repeat of the first
+    assert len(unique_listings) == len(np.unique(keys)) == 2
+    assert sorted(unique_listings["valeur_fonciere"]) == [250_000.0, 310_000.0]
+    assert len(contents) == 2
+
+
+def test_recently_written_partition_is_not_polled(tmp_path, monkeypatch):
+    ingester = LiveIngester(snapshot_dir=str(tmp_path / "snapshots"))
+    ingester.store = PartitionStore(root=str(tmp_path / "partitions"))
+    ingester.store.write("72", ingester.year, pd.DataFrame({"valeur_fonciere": [1.0]}))
+    ingester._save_snapshot("72", np.array([1], dtype=np.uint64), np.array([2], dtype=np.uint64), "etag")
+
+    def fail(*args, **kwargs):
+        raise AssertionError("The scraped file must not be downloaded")
+
+    monkeypatch.setattr(requests, "get", fail)
+    assert ingester.poll("72") == 0
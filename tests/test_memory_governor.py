@@ -0,0 +1,110 @@
+"""Tests for the memory governor module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.core.monitoring import memory_governor
+from src.core.monitoring.memory_governor import MemoryGovernor
+
+CEILING = 1000
+
+
+@pytest.fixture
+def governor(monkeypatch):
+    now = [1000.0]
+    monkeypatch.setattr(memory_governor.time, "time", lambda: now[0])
+    memory = [0]
+    monkeypatch.setattr(memory_governor, "get_process_anonymous_memory", lambda: memory[0])
+    active = set()
+    governor = MemoryGovernor(
+        memory_ceiling_bytes=CEILING,
+        high_watermark=0.9,
+        low_watermark=0.5,
+        session_idle_seconds=60,
+        session_exists=active.__contains__,
+    )
+    governor.now = now
+    governor.memory = memory
+    governor.active = active
+    return governor
+
+
+def test_shared_data_is_not_counted(governor):
+    shared = pd.DataFrame({"prix_m2": np.arange(1000, dtype=np.float64)})
+    owned = pd.DataFrame({"prix_m2": np.zeros(500, dtype=np.float64)})
+    governor.active.update({"a", "b"})
+    governor.touch("a", {"original_data": shared, "filtered_data": owned})
+    governor.touch("b", {"original_data": shared, "filtered_data": None})
+
+    figures = governor.enforce()
+
+    assert figures["sessions"] == 2
+    assert figures["sessions_bytes"] == owned.memory_usage(index=True, deep=True).sum()
+    assert figures["session_max_bytes"] == figures["sessions_bytes"]
+
+
+def test_touch_forgets_disconnected_sessions(governor):
+    governor.active.update({"gone", "current"})
+    governor.touch("gone", {})
+
+    governor.active.discard("gone")
+    governor.touch("current", {})
+
+    assert set(governor.sessions) == {"current"}
+
+
+def test_idle_sessions_are_kept_below_the_watermark(governor):
+    idle_state = {"filtered_data": np.zeros(10)}
+    governor.active.update({"idle", "current"})
+    governor.touch("idle", idle_state)
+    governor.now[0] += 61
+    governor.touch("current", {})
+    governor.memory[0] = 800
+
+    figures = governor.enforce()
+
+    assert figures["sessions"] == 2
+    assert "filtered_data" in idle_state
+
+
+def test_idle_sessions_are_evicted_above_the_watermark(governor):
+    shared = pd.DataFrame({"prix_m2": [1.0, 2.0]})
+    idle_state = {"original_data": shared, "filtered_data": np.zeros(10), "selected_year": 2023}
+    governor.active.update({"idle", "current"})
+    governor.touch("idle", idle_state)
+    governor.now[0] += 61
+    governor.touch("current", {})
+    governor.memory[0] = 950
+
+    figures = governor.enforce()
+
+    assert figures["sessions"] == 1
+    # Only the data owned by the idle session is freed, the shared partition stays referenced
+    assert idle_state == {"original_data": shared, "selected_year": 2023}
+
+
+def test_partitions_are_cleared_in_lru_order_down_to_the_low_watermark(governor):
+    cleared = []
+
+    def clear(selected_dept, selected_year):
+        cleared.append((selected_dept, selected_year))
+        governor.memory[0] -= 300
+
+    governor.register_cache(clear)
+    governor.active.update({"a", "b", "c"})
+    for session_id, dept in (("a", "13"), ("b", "75"), ("c", "69")):
+        governor.touch(session_id, {"selected_department": dept, "selected_year": 2023})
+        governor.now[0] += 1
+
+    governor.memory[0] = 950
+    figures = governor.enforce()
+
+    # 950 -> 650 -> 350: the low watermark is reached before the most recently used partition
+    assert cleared == [("13", 2023), ("75", 2023)]
+    assert figures["process_anonymous_bytes"] == 350
+
+    # Between the watermarks, nothing is cleared
+    governor.memory[0] = 850
+    governor.enforce()
+    assert len(cleared) == 2
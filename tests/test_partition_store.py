@@ -0,0 +1,144 @@
+"""Tests for the partition store module."""
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pytest
+
+from src.core.data.partition_store import (
+    DELETED_COLUMN,
+    LISTING_KEY_COLUMN,
+    STREAM_BATCH_SIZE,
+    PartitionStore,
+    table_to_pandas,
+)
+
+NUM_ROWS = 3 * STREAM_BATCH_SIZE + 123
+
+
+@pytest.fixture
+def store(tmp_path):
+    return PartitionStore(root=str(tmp_path))
+
+
+def make_partition(num_rows: int = NUM_ROWS) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "type_local": rng.choice(["Maison", "Appartement"], num_rows),
+            "valeur_fonciere": rng.uniform(50_000, 900_000, num_rows),
+            "code_postal": rng.choice(["72000", "72100"], num_rows),
+            "longitude": rng.uniform(0, 1, num_rows),
+            "latitude": rng.uniform(47, 48, num_rows),
+        }
+    )
+
+
+TEXT_COLUMNS = ["type_local", "code_postal"]
+
+
+def as_read(properties_data: pd.DataFrame) -> pd.DataFrame:
+    """Get a frame with the types of the columns read from the store."""
+    return properties_data.astype({column: pd.ArrowDtype(pa.string()) for column in TEXT_COLUMNS})
+
+
+def assert_zero_copy(store: PartitionStore, selected_dept: str, selected_year: int, column: str) -> None:
+    table = store.read_table(selected_dept, selected_year)
+    properties_data = table_to_pandas(table)
+    for name in (column, *TEXT_COLUMNS):
+        assert table[name].num_chunks == 1
+
+    assert np.shares_memory(properties_data[column].to_numpy(), table[column].chunk(0).to_numpy())
+    for name in TEXT_COLUMNS:
+        # The characters of the text columns are not copied to Python objects
+        read_chunks = pa.chunked_array(pa.array(properties_data[name].array)).chunks
+        assert len(read_chunks) == 1
+        assert read_chunks[0].buffers()[2].address == table[name].chunk(0).buffers()[2].address
+
+
+def test_write_round_trip(store):
+    properties_data = make_partition()
+    store.write("72", 2023, properties_data)
+
+    assert store.exists("72", 2023)
+    assert store.list_partitions() == [("72", 2023)]
+    pd.testing.assert_frame_equal(store.read("72", 2023), as_read(properties_data))
+    pd.testing.assert_frame_equal(store.read("72", 2023, columns=["latitude"]), properties_data[["latitude"]])
+
+
+def test_write_is_zero_copy(store):
+    store.write("72", 2023, make_partition())
+    assert_zero_copy(store, "72", 2023, "valeur_fonciere")
+
+
+def test_write_batches_is_zero_copy(store):
+    properties_data = make_partition()
+    table = pa.Table.from_pandas(properties_data, preserve_index=False)
+    # Small batches, as produced by the chunked cleaning
+    store.write_batches("72", 2023, table.to_batches(max_chunksize=10_000), table.schema)
+
+    pd.testing.assert_frame_equal(store.read("72", 2023), as_read(properties_data))
+    assert_zero_copy(store, "72", 2023, "valeur_fonciere")
+    assert [path.name for path in store.path("72", 2023).parent.iterdir()] == ["72.arrow"]
+
+
+def test_write_batches_holds_one_column_at_a_time(store, monkeypatch):
+    table = pa.Table.from_pandas(make_partition(), preserve_index=False)
+    combine_column = PartitionStore._combine_column
+    allocated = []
+
+    def record_allocations(column, path):
+        array = combine_column(column, path)
+        allocated.append(pa.total_allocated_bytes())
+        return array
+
+    monkeypatch.setattr(PartitionStore, "_combine_column", staticmethod(record_allocations))
+    batches = table.to_batches(max_chunksize=10_000)
+    baseline = pa.total_allocated_bytes()
+    store.write_batches("72", 2023, batches, table.schema)
+
+    # The combined columns are read back from their files instead of accumulating in memory
+    assert len(allocated) == table.num_columns
+    assert max(allocated) - baseline < min(column.nbytes for column in table.columns)
+
+
+def test_compact_is_zero_copy(store):
+    properties_data = make_partition()
+    live_data = properties_data.assign(
+        **{LISTING_KEY_COLUMN: np.arange(NUM_ROWS, dtype=np.uint64), DELETED_COLUMN: False}
+    )
+    store.write("72", 2025, live_data)
+
+    # One listing changed, one removed
+    segment = live_data.iloc[[0, 1]].copy()
+    segment.loc[segment.index[0], "valeur_fonciere"] = 1.0
+    segment.loc[segment.index[1], DELETED_COLUMN] = True
+    store.append_segment("72", 2025, pa.Table.from_pandas(segment, preserve_index=False))
+
+    expected = as_read(properties_data).drop(index=1)
+    expected.loc[0, "valeur_fonciere"] = 1.0
+
+    def current() -> pd.DataFrame:
+        return store.read("72", 2025).sort_values("valeur_fonciere").reset_index(drop=True)
+
+    assert len(store.read("72", 2025)) == NUM_ROWS - 1
+    before = current()
+    store.compact("72", 2025)
+
+    assert store.segment_paths("72", 2025) == []
+    pd.testing.assert_frame_equal(current(), before)
+    pd.testing.assert_frame_equal(current(), expected.sort_values("valeur_fonciere").reset_index(drop=True))
+    assert_zero_copy(store, "72", 2025, "valeur_fonciere")
+
+
+def test_version_changes_with_segments(store):
+    live_data = make_partition(10).assign(
+        **{LISTING_KEY_COLUMN: np.arange(10, dtype=np.uint64), DELETED_COLUMN: False}
+    )
+    store.write("72", 2025, live_data)
+    version = store.version("72", 2025)
+
+    store.append_segment("72", 2025, pa.Table.from_pandas(live_data.iloc[:1], preserve_index=False))
+
+    assert store.version("72", 2025) != version
+    assert store.version("72", 2024) is None
@@ -0,0 +1,101 @@
+"""Tests for the percentiles module."""
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.core.data.percentiles import PercentileTable
+
+
+@pytest.fixture(scope="module")
+def properties_data() -> pd.DataFrame:
+    rng = np.random.default_rng(7)
+    num_rows = 2_000
+    surface = rng.integers(20, 150, num_rows).astype(np.float64)
+    # Rounded prices, so that ties are frequent
+    price = np.round(rng.lognormal(12, 0.5, num_rows), -4)
+    return pd.DataFrame(
+        {
+            "code_postal": rng.choice(["72000", "72100", "72230"], num_rows),
+            "nom_commune": rng.choice(["Le Mans", "Arnage"], num_rows),
+            "valeur_fonciere": price,
+            "surface_reelle_bati": surface,
+            "prix_m2": price / surface,
+        }
+    )
+
+
+@pytest.fixture(scope="module")
+def percentile_table(properties_data) -> PercentileTable:
+    return PercentileTable(PercentileTable.build(properties_data))
+
+
+def reference_rank(values: pd.Series, price: float) -> float:
+    values = values.to_numpy(dtype=np.float32)
+    return stats.percentileofscore(values, np.float32(price), kind="mean")
+
+
+def test_rank_department(properties_data, percentile_table):
+    prices = [0.0, 50_000.0, 160_000.0, 1e9] + properties_data["valeur_fonciere"].iloc[:5].tolist()
+
+    ranks = percentile_table.rank("department", "valeur_fonciere", "ignored", prices)
+
+    expected = [reference_rank(properties_data["valeur_fonciere"], price) for price in prices]
+    np.testing.assert_allclose(ranks, expected, atol=1e-9)
+    assert ranks[0] == 0.0
+    assert ranks[3] == 100.0
+
+
+def test_rank_ties_count_for_half():
+    table = PercentileTable(
+        PercentileTable.build(
+            pd.DataFrame(
+                {
+                    "code_postal": ["72000"] * 4,
+                    "nom_commune": ["Le Mans"] * 4,
+                    "valeur_fonciere": [100.0] * 4,
+                    "prix_m2": [1.0, 2.0, 2.0, 3.0],
+                }
+            )
+        )
+    )
+
+    assert table.rank("department", "valeur_fonciere", "", 100.0) == 50.0
+    np.testing.assert_array_equal(table.rank("communes", "prix_m2", "Le Mans", [2.0, 3.0]), [50.0, 87.5])
+
+
+def test_rank_batch_matches_rank_per_key(properties_data, percentile_table):
+    rng = np.random.default_rng(0)
+    keys = rng.choice(["72000", "72100", "72230", "99999"], 300).tolist()
+    prices = rng.uniform(500, 5_000, 300)
+
+    ranks = percentile_table.rank_batch("postal-codes", "prix_m2", keys, prices)
+
+    for key in set(keys):
+        positions = [i for i, other in enumerate(keys) if other == key]
+        if key == "99999":
+            assert np.isnan(ranks[positions]).all()
+            continue
+        values = properties_data.loc[properties_data["code_postal"] == key, "prix_m2"]
+        expected = [reference_rank(values, prices[i]) for i in positions]
+        np.testing.assert_allclose(ranks[positions], expected, atol=1e-9)
+        single_key_ranks = percentile_table.rank("postal-codes", "prix_m2", key, prices[positions])
+        np.testing.assert_array_equal(ranks[positions], single_key_ranks)
+
+
+def test_rank_batch_department_ignores_keys(percentile_table):
+    prices = [100_000.0, 200_000.0]
+    np.testing.assert_array_equal(
+        percentile_table.rank_batch("department", "valeur_fonciere", None, prices),
+        percentile_table.rank("department", "valeur_fonciere", "", prices),
+    )
+
+
+def test_distributions_are_sorted(properties_data, percentile_table):
+    assert percentile_table.keys("communes", "prix_m2") == ["Arnage", "Le Mans"]
+    for key in percentile_table.keys("postal-codes", "valeur_fonciere"):
+        distribution = percentile_table.distribution("postal-codes", "valeur_fonciere", key)
+        assert len(distribution) == (properties_data["code_postal"] == key).sum()
+        assert (np.diff(distribution) >= 0).all()
+    assert len(percentile_table.distribution("communes", "prix_m2", "Unknown")) == 0
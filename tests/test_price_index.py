@@ -0,0 +1,95 @@
+"""Tests for the price index module."""
+
+import numpy as np
+import pandas as pd
+
+from src.core.data.price_index import compute_price_index
+
+# Prices per square meter of each (property type, postal code, commune, year)
+PRICES = {
+    ("Maison", "72000", "Le Mans", 2019): [1000, 2000, 3000],
+    ("Maison", "72000", "Le Mans", 2020): [2200],
+    ("Maison", "72000", "Le Mans", 2021): [2400, 2600],
+    ("Maison", "72000", "Le Mans", 2022): [3000],
+    ("Maison", "72100", "Allonnes", 2019): [1500],
+    ("Maison", "72100", "Allonnes", 2021): [1800],
+    ("Appartement", "72000", "Le Mans", 2019): [5000],
+    ("Appartement", "72000", "Le Mans", 2020): [4000],
+}
+
+
+def make_transactions() -> pd.DataFrame:
+    rows = [
+        (local_type, postal_code, commune, year, price)
+        for (local_type, postal_code, commune, year), prices in PRICES.items()
+        for price in prices
+    ]
+    transactions = pd.DataFrame(rows, columns=["type_local", "code_postal", "nom_commune", "annee", "prix_m2"])
+    # As built from the partitions: categorical keys, compact numbers
+    return transactions.astype(
+        {
+            "type_local": "category",
+            "code_postal": "category",
+            "nom_commune": "category",
+            "annee": np.int16,
+            "prix_m2": np.float32,
+        }
+    )
+
+
+def get_group(index: pd.DataFrame, local_type: str, postal_code: str) -> pd.DataFrame:
+    group = index[(index["type_local"] == local_type) & (index["code_postal"] == postal_code)]
+    return group.set_index("annee")
+
+
+def test_yearly_medians_and_counts():
+    index = compute_price_index(make_transactions(), ["code_postal"])
+
+    assert len(index) == 8
+    le_mans = get_group(index, "Maison", "72000")
+    assert le_mans["prix_m2_median"].tolist() == [2000, 2200, 2500, 3000]
+    assert le_mans["nombre_transactions"].tolist() == [3, 1, 2, 1]
+    assert get_group(index, "Appartement", "72000")["prix_m2_median"].tolist() == [5000, 4000]
+
+
+def test_rolling_medians_pool_the_last_years():
+    index = compute_price_index(make_transactions(), ["code_postal"])
+
+    # 2021 pools 2019 to 2021, 2022 drops 2019
+    le_mans = get_group(index, "Maison", "72000")
+    assert le_mans["prix_m2_median_glissant"].tolist() == [2000, 2100, 2300, 2500]
+
+    # Years without transactions have no row, but their neighbours still pool the years around them
+    allonnes = get_group(index, "Maison", "72100")
+    assert allonnes.index.tolist() == [2019, 2021]
+    assert allonnes["prix_m2_median_glissant"].tolist() == [1500, 1650]
+
+    # Property types are not pooled together
+    assert get_group(index, "Appartement", "72000")["prix_m2_median_glissant"].tolist() == [5000, 4500]
+
+
+def test_yearly_changes_between_consecutive_years_only():
+    index = compute_price_index(make_transactions(), ["code_postal"])
+
+    le_mans = get_group(index, "Maison", "72000")
+    np.testing.assert_allclose(le_mans["variation_annuelle"], [np.nan, 10, 2500 / 2200 * 100 - 100, 20], rtol=1e-6)
+
+    # 2020 is missing, so no change is computed for 2021
+    assert get_group(index, "Maison", "72100")["variation_annuelle"].isna().all()
+    np.testing.assert_allclose(get_group(index, "Appartement", "72000")["variation_annuelle"], [np.nan, -20])
+
+
+def test_commune_level_groups():
+    transactions = make_transactions()
+    transactions["nom_commune"] = transactions["nom_commune"].cat.add_categories("Coulaines")
+    transactions.loc[transactions["prix_m2"] == 3000, "nom_commune"] = "Coulaines"
+
+    index = compute_price_index(transactions, ["code_postal", "nom_commune"])
+
+    le_mans = index[(index["type_local"] == "Maison") & (index["nom_commune"] == "Le Mans")].set_index("annee")
+    assert le_mans.index.tolist() == [2019, 2020, 2021]
+    assert le_mans["prix_m2_median"].tolist() == [1500, 2200, 2500]
+    coulaines = index[index["nom_commune"] == "Coulaines"].set_index("annee")
+    assert coulaines["prix_m2_median"].tolist() == [3000, 3000]
+    assert coulaines["variation_annuelle"].isna().all()
+    assert index.dtypes["annee"] == np.int16
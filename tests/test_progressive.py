@@ -0,0 +1,166 @@
+"""Tests for the progressive loading module."""
+
+import functools
+import gzip
+import threading
+from http.server import SimpleHTTPRequestHandler, ThreadingHTTPServer
+
+import numpy as np
+import pandas as pd
+import pytest
+from scipy import stats
+
+from src.core.data import progressive
+from src.core.data.partition_store import get_partition_store
+from src.core.data.progressive import (
+    PreviewBuilder,
+    mean_confidence_interval,
+    median_confidence_interval,
+    start_partition_ingestion,
+)
+
+
+def make_source(num_rows: int = 20_000) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    data = pd.DataFrame(
+        {
+            "id_mutation": np.arange(num_rows),
+            "type_local": rng.choice(["Maison", "Appartement"], num_rows, p=[0.3, 0.7]),
+            "valeur_fonciere": np.round(rng.lognormal(12, 0.5, num_rows), -2),
+            "code_postal": rng.choice(["1000", "72000.0", "72100"], num_rows),
+            "nom_commune": rng.choice(["Bourg", "Le Mans", "Allonnes, le \"bourg\""], num_rows),
+            "surface_reelle_bati": rng.integers(10, 200, num_rows).astype(float),
+            "longitude": rng.uniform(0, 1, num_rows),
+            "latitude": rng.uniform(47, 48, num_rows),
+        }
+    )
+    data.loc[rng.choice(num_rows, 200, replace=False), "surface_reelle_bati"] = np.nan
+    return data
+
+
+@pytest.fixture(scope="module")
+def source() -> pd.DataFrame:
+    return make_source()
+
+
+@pytest.fixture(scope="module")
+def source_bytes(source) -> bytes:
+    return gzip.compress(source.to_csv(index=False).encode())
+
+
+def test_median_confidence_interval_coverage():
+    rng = np.random.default_rng(1)
+    true_median = np.log(2)
+    trials = 2_000
+    covered = 0
+    for _ in range(trials):
+        low, high = median_confidence_interval(rng.exponential(size=200))
+        covered += low <= true_median <= high
+
+    assert 0.93 <= covered / trials <= 0.98
+
+
+def test_median_confidence_interval_order_statistics():
+    values = np.arange(1.0, 101.0)
+    rng = np.random.default_rng(2)
+
+    # 100 values: ranks 50 -/+ 1.96 * sqrt(100) / 2, rounded outwards, ignoring missing values
+    low, high = median_confidence_interval(np.concatenate([rng.permutation(values), [np.nan]]))
+
+    assert (low, high) == (41.0, 61.0)
+    assert median_confidence_interval(np.array([3.0])) == (3.0, 3.0)
+    assert all(np.isnan(median_confidence_interval(np.array([np.nan]))))
+
+
+def test_mean_confidence_interval_matches_scipy():
+    values = np.random.default_rng(3).normal(100, 15, size=500)
+
+    expected = stats.norm.interval(0.95, loc=values.mean(), scale=stats.sem(values))
+
+    np.testing.assert_allclose(mean_confidence_interval(np.append(values, np.nan)), expected)
+    np.testing.assert_allclose(
+        mean_confidence_interval(values, confidence=0.9),
+        stats.norm.interval(0.9, loc=values.mean(), scale=stats.sem(values)),
+    )
+    assert all(np.isnan(mean_confidence_interval(np.array([1.0]))))
+
+
+def test_preview_builder_refines_a_uniform_sample(source, source_bytes):
+    builder = PreviewBuilder(sample_rows=2_000, batch_bytes=64 * 1024)
+    previews = []
+    for start in range(0, len(source_bytes), 4096):
+        builder.feed(source_bytes[start:start + 4096], len(source_bytes))
+        if builder.preview is not None and (not previews or builder.preview is not previews[-1]):
+            previews.append(builder.preview)
+
+    cleaned = source.dropna()
+    final = previews[-1]
+    assert len(previews) > 3
+    assert [preview.rows_read for preview in previews] == sorted({preview.rows_read for preview in previews})
+    assert final.rows_read == len(cleaned)
+    assert final.fraction == 1.0
+    assert len(final.properties_data) == 2_000
+    # Earlier previews are left as they were published
+    assert len(previews[0].properties_data) == min(previews[0].rows_read, 2_000)
+
+    sample = final.properties_data
+    assert set(sample["code_postal"]) == {"01000", "72000", "72100"}
+    assert sample["nom_commune"].isin(source["nom_commune"]).all()
+    # The sample is spread over the whole file, in file order
+    assert sample["surface_reelle_bati"].notna().all()
+    rows = source.loc[source["valeur_fonciere"].isin(sample["valeur_fonciere"])].index
+    assert rows.max() > 0.9 * len(source) and rows.min() < 0.1 * len(source)
+
+    houses = (sample["type_local"] == "Maison").sum()
+    assert final.estimate_rows(houses) == pytest.approx((cleaned["type_local"] == "Maison").sum(), rel=0.1)
+
+
+def test_preview_builder_without_size(source_bytes):
+    builder = PreviewBuilder(batch_bytes=64 * 1024)
+    builder.feed(source_bytes[: len(source_bytes) // 2])
+
+    assert builder.preview is not None
+    assert builder.preview.fraction is None
+    assert builder.preview.estimate_rows(10) is None
+
+
+@pytest.fixture
+def source_server(tmp_path, source_bytes, monkeypatch):
+    path = tmp_path / "2023" / "departements" / "98.csv.gz"
+    path.parent.mkdir(parents=True)
+    path.write_bytes(source_bytes)
+    requested = []
+
+    class CountingHandler(SimpleHTTPRequestHandler):
+        def do_GET(self):
+            requested.append(self.path)
+            super().do_GET()
+
+        def log_message(self, format, *args):
+            pass
+
+    httpd = ThreadingHTTPServer(("127.0.0.1", 0), functools.partial(CountingHandler, directory=str(tmp_path)))
+    threading.Thread(target=httpd.serve_forever, daemon=True).start()
+    monkeypatch.setenv("DATA_GOUV_URL", f"http://127.0.0.1:{httpd.server_port}")
+    yield requested
+    httpd.shutdown()
+    httpd.server_close()
+
+
+def test_ingestion_previews_its_own_download(source_server, monkeypatch, source):
+    previews = []
+
+    class RecordingBuilder(PreviewBuilder):
+        def _parse(self, final):
+            super()._parse(final)
+            previews.append(self.preview)
+
+    monkeypatch.setattr(progressive, "PreviewBuilder", functools.partial(RecordingBuilder, batch_bytes=64 * 1024))
+
+    start_partition_ingestion("98", 2023).result(timeout=60)
+
+    assert source_server == ["/2023/departements/98.csv.gz"]
+    assert get_partition_store().exists("98", 2023)
+    assert previews[-1].rows_read == len(source.dropna())
+    # The preview is dropped once the partition is stored
+    assert progressive.get_partition_preview("98", 2023) is None
@@ -0,0 +1,66 @@
+"""Tests for the incremental refresh module."""
+
+import json
+
+import pytest
+
+from src.core.data import refresh
+from src.core.data.artifacts import DerivedArtifact
+from src.core.data.refresh import IncrementalRefresher, PartitionManifest
+
+
+def fail(selected_dept, selected_year):
+    raise ValueError("corrupted partition")
+
+
+@pytest.fixture
+def refresher(tmp_path, monkeypatch):
+    built = []
+    artifacts = {
+        "broken": DerivedArtifact("broken", fail),
+        "working": DerivedArtifact("working", lambda dept, year: built.append((dept, year))),
+    }
+    monkeypatch.setattr(refresh, "DERIVED_ARTIFACTS", artifacts)
+    refresher = IncrementalRefresher(PartitionManifest(str(tmp_path / "manifest.json")))
+    refresher.built = built
+    return refresher
+
+
+def test_failing_artifact_does_not_stop_the_run(refresher, monkeypatch):
+    def refresh_partition(selected_dept, selected_year):
+        refresher.manifest.update(selected_dept, selected_year, content_hash="abc")
+
+    monkeypatch.setattr(refresher, "_refresh_partition", refresh_partition)
+    report = refresher.run([("72", 2023), ("75", 2023)])
+
+    assert refresher.built == [("72", 2023), ("75", 2023)]
+    assert report.rebuilt == [("2023/72", ["working"]), ("2023/75", ["working"])]
+    assert report.failed == [("2023/72 broken", "corrupted partition"), ("2023/75 broken", "corrupted partition")]
+
+
+def test_manifest_saved_when_interrupted(refresher, monkeypatch):
+    def refresh_partition(selected_dept, selected_year):
+        if selected_dept == "75":
+            raise KeyboardInterrupt
+        refresher.manifest.update(selected_dept, selected_year, content_hash="abc")
+
+    monkeypatch.setattr(refresher, "_refresh_partition", refresh_partition)
+    with pytest.raises(KeyboardInterrupt):
+        refresher.run([("72", 2023), ("75", 2023)])
+
+    saved = json.loads(refresher.manifest.path.read_text())["partitions"]
+    assert saved["2023/72"]["content_hash"] == "abc"
+
+
+def test_failing_partition_does_not_stop_the_run(refresher, monkeypatch):
+    def refresh_partition(selected_dept, selected_year):
+        if selected_dept == "72":
+            raise ValueError("unexpected column")
+        refresher.manifest.update(selected_dept, selected_year, content_hash="abc")
+
+    monkeypatch.setattr(refresher, "_refresh_partition", refresh_partition)
+    report = refresher.run([("72", 2023), ("75", 2023)])
+
+    assert report.failed[0] == ("2023/72", "unexpected column")
+    assert report.rebuilt == [("2023/75", ["working"])]
+    assert refresher.built == [("75", 2023)]
@@ -0,0 +1,72 @@
+"""Tests for the geometry simplification module."""
+
+import numpy as np
+
+from src.core.geo.simplify import douglas_peucker, simplify_polygons
+
+
+def wiggly_line(start, end, num_points: int = 200, amplitude: float = 0.02) -> np.ndarray:
+    """Points from start to end, with a deterministic noise across the line."""
+    rng = np.random.default_rng(1)
+    t = np.linspace(0.0, 1.0, num_points)[:, None]
+    line = np.asarray(start, dtype=np.float64) * (1 - t) + np.asarray(end, dtype=np.float64) * t
+    normal = np.array([end[1] - start[1], start[0] - end[0]], dtype=np.float64)
+    noise = rng.uniform(-amplitude, amplitude, num_points)
+    noise[[0, -1]] = 0.0
+    return line + noise[:, None] * normal / np.linalg.norm(normal)
+
+
+def close(points: np.ndarray) -> np.ndarray:
+    return np.vstack([points, points[:1]])
+
+
+def point_set(ring: np.ndarray, predicate) -> set:
+    return {tuple(point) for point in ring if predicate(point)}
+
+
+def test_douglas_peucker_keeps_endpoints():
+    line = wiggly_line((0, 0), (10, 0), amplitude=0.001)
+    simplified = douglas_peucker(line, 0.01)
+
+    assert len(simplified) == 2
+    np.testing.assert_array_equal(simplified, line[[0, -1]])
+    assert len(douglas_peucker(line, 0.0)) > 2
+
+
+def test_shared_border_is_simplified_identically():
+    border = wiggly_line((1, 0), (1, 1))
+    left = close(np.vstack([[[0, 0]], border, [[0, 1]]]))
+    right = close(np.vstack([border[::-1], [[2, 0], [2, 1]]]))
+
+    (left_polygon,), (right_polygon,) = simplify_polygons([[[left]], [[right]]], tolerance=0.05)
+    left_ring, right_ring = left_polygon[0], right_polygon[0]
+
+    def on_border(point):
+        return abs(point[0] - 1) < 0.1
+
+    assert len(left_ring) < len(left)
+    assert point_set(left_ring, on_border) == point_set(right_ring, on_border)
+    # The junctions of the border with the other edges are never moved
+    assert {(1.0, 0.0), (1.0, 1.0)} <= point_set(left_ring, on_border)
+
+
+def test_enclave_matches_hole():
+    outer = close(np.array([[0, 0], [4, 0], [4, 4], [0, 4]], dtype=np.float64))
+    theta = np.linspace(0, 2 * np.pi, 300, endpoint=False)
+    enclave = close(np.column_stack([2 + np.cos(theta), 2 + np.sin(theta)]))
+
+    (host,), (island,) = simplify_polygons([[[outer, enclave[::-1]]], [[enclave]]], tolerance=0.05)
+
+    assert len(island[0]) < len(enclave)
+    assert {tuple(point) for point in host[1]} == {tuple(point) for point in island[0]}
+
+
+def test_collapsed_polygon_is_dropped():
+    # A sliver thinner than the tolerance, apart from the square
+    sliver = close(np.array([[5, 5], [6, 5], [5.5, 5.001]], dtype=np.float64))
+    square = close(np.array([[0, 0], [1, 0], [1, 1], [0, 1]], dtype=np.float64))
+
+    (simplified,) = simplify_polygons([[[sliver], [square]]], tolerance=0.01)
+
+    assert len(simplified) == 1
+    assert len(simplified[0][0]) == 5
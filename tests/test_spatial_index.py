@@ -0,0 +1,46 @@
+"""Tests for the spatial index module."""
+
+import numpy as np
+import pandas as pd
+
+from src.core.data.spatial_index import COMPARABLE_COLUMNS, SpatialIndex
+
+
+def make_transactions(coordinates) -> pd.DataFrame:
+    coordinates = np.asarray(coordinates, dtype=np.float64).reshape(-1, 2)
+    return pd.DataFrame(
+        {
+            "nom_commune": ["Paris"] * len(coordinates),
+            "code_postal": ["75001"] * len(coordinates),
+            "valeur_fonciere": np.full(len(coordinates), 300_000.0),
+            "surface_reelle_bati": np.full(len(coordinates), 30.0),
+            "prix_m2": np.full(len(coordinates), 10_000.0),
+            "latitude": coordinates[:, 0],
+            "longitude": coordinates[:, 1],
+        }
+    )
+
+
+def test_empty_index():
+    spatial_index = SpatialIndex(make_transactions([]))
+
+    assert len(spatial_index) == 0
+    assert spatial_index.tree is None
+
+    distances, positions = spatial_index.query_batch(np.array([[48.86, 2.35], [48.85, 2.34]]))
+    assert distances.shape == (2, 0)
+    assert positions.shape == (2, 0)
+
+    comparables = spatial_index.query_comparables(48.86, 2.35)
+    assert comparables.empty
+    assert list(comparables.columns) == ["distance_km"] + COMPARABLE_COLUMNS
+
+
+def test_query_within_radius():
+    # About 111 m and 11 km north of the query point
+    spatial_index = SpatialIndex(make_transactions([[48.861, 2.35], [48.96, 2.35]]))
+
+    comparables = spatial_index.query_comparables(48.86, 2.35, k=5, radius_km=1.0)
+
+    assert len(comparables) == 1
+    assert 0.1 < comparables["distance_km"].iloc[0] < 0.12
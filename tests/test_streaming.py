@@ -0,0 +1,72 @@
+"""Tests for the streaming module."""
+
+import io
+
+import numpy as np
+import pandas as pd
+import pyarrow as pa
+import pyarrow.csv as pa_csv
+import pyarrow.parquet as pq
+import pytest
+
+from src.core.data.partition_store import STREAM_BATCH_SIZE, PartitionStore
+from src.core.data.streaming import iter_csv_chunks, iter_parquet_chunks
+
+NUM_ROWS = 3 * STREAM_BATCH_SIZE + 123
+
+
+@pytest.fixture(scope="module")
+def store(tmp_path_factory):
+    rng = np.random.default_rng(0)
+    store = PartitionStore(root=str(tmp_path_factory.mktemp("partitions")))
+    store.write(
+        "72",
+        2023,
+        pd.DataFrame(
+            {
+                "type_local": rng.choice(["Maison", "Appartement"], NUM_ROWS),
+                "valeur_fonciere": rng.uniform(50_000, 900_000, NUM_ROWS),
+                "code_postal": rng.choice(["72000", "72100"], NUM_ROWS),
+                "nom_commune": rng.choice(["Le Mans", "Allonnes, le \"bourg\""], NUM_ROWS),
+            }
+        ),
+    )
+    return store
+
+
+def test_parquet_round_trip(store):
+    chunks = list(iter_parquet_chunks(store.iter_batches("72", 2023)))
+
+    # One chunk per batch, and the footer
+    assert len(chunks) == 5
+    parquet_file = pq.ParquetFile(io.BytesIO(b"".join(chunks)))
+    assert parquet_file.metadata.num_row_groups == 4
+    assert parquet_file.read().equals(store.read_table("72", 2023))
+
+
+def test_csv_round_trip(store):
+    chunks = list(iter_csv_chunks(store.iter_batches("72", 2023)))
+
+    assert len(chunks) >= 4
+    # The header is only written once
+    assert sum(chunk.count(b'"type_local"') for chunk in chunks) == 1
+    table = store.read_table("72", 2023)
+    read = pa_csv.read_csv(
+        io.BytesIO(b"".join(chunks)), convert_options=pa_csv.ConvertOptions(column_types=table.schema)
+    )
+    assert read.equals(table)
+
+
+@pytest.mark.parametrize("serialize", [iter_csv_chunks, iter_parquet_chunks])
+def test_empty_result_needs_a_schema(store, serialize):
+    with pytest.raises(ValueError):
+        list(serialize(iter([])))
+
+    schema = store.schema("72", 2023)
+    content = b"".join(serialize(iter([]), schema))
+    if serialize is iter_csv_chunks:
+        assert content.decode().strip() == ",".join(f'"{name}"' for name in schema.names)
+    else:
+        read = pq.read_table(io.BytesIO(content))
+        assert read.num_rows == 0
+        assert read.schema.equals(schema, check_metadata=False)
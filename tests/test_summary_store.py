@@ -0,0 +1,62 @@
+"""Tests for the summary store module."""
+
+import gzip
+
+import pyarrow as pa
+
+from src.core.data.summary_store import SummaryStore
+
+SUMMARY_CSV = """code_departement,annee,type_local,code_postal,nom_commune,prix_m2_moyen
+01,2023,Maison,01000,Bourg-en-Bresse,2500.0
+13,2023,Appartement,13001,Marseille 1er,3500.0
+2A,2023,Maison,20000,Ajaccio,4200.0
+2B,2022,Appartement,20200,Bastia,3100.0
+"""
+
+
+def build_store(tmp_path, csv: str = SUMMARY_CSV) -> SummaryStore:
+    csv_path = tmp_path / "summary.csv.gz"
+    with gzip.open(csv_path, "wt") as file:
+        file.write(csv)
+
+    store = SummaryStore(path=str(tmp_path / "summary.arrow"))
+    store.convert(str(csv_path))
+    return store
+
+
+def test_key_columns_are_strings(tmp_path):
+    store = build_store(tmp_path)
+    schema = store.table.schema
+
+    assert schema.field("code_departement").type == pa.string()
+    assert schema.field("type_local").type == pa.string()
+    assert schema.field("code_postal").type == pa.string()
+    assert pa.types.is_integer(schema.field("annee").type)
+
+
+def test_query_corsican_department(tmp_path):
+    store = build_store(tmp_path)
+
+    result = store.query(departments=["2A"])
+    assert result["nom_commune"].tolist() == ["Ajaccio"]
+
+    # Leading zeros must be preserved as well
+    result = store.query(departments=["01"], postal_codes=["01000"])
+    assert result["nom_commune"].tolist() == ["Bourg-en-Bresse"]
+
+
+def test_query_filters_and_columns(tmp_path):
+    store = build_store(tmp_path)
+
+    result = store.query(years=[2023], property_types=["Maison"], columns=["code_departement", "prix_m2_moyen"])
+    assert list(result.columns) == ["code_departement", "prix_m2_moyen"]
+    assert sorted(result["code_departement"]) == ["01", "2A"]
+
+
+def test_corsican_department_in_later_block(tmp_path, monkeypatch):
+    # Types are inferred from the first block: "2A" only appears after purely numeric codes
+    monkeypatch.setattr("src.core.data.summary_store.CSV_BLOCK_SIZE", 128)
+    store = build_store(tmp_path)
+
+    assert store.table.num_rows == 4
+    assert store.query(departments=["2B"])["nom_commune"].tolist() == ["Bastia"]
@@ -0,0 +1,92 @@
+"""Tests for the tile builder module."""
+
+import json
+
+import numpy as np
+import pandas as pd
+import pytest
+
+from src.core.tiles.builder import MAX_ZOOM, MIN_ZOOM, TileBuilder
+
+
+def make_transactions(num_rows: int = 200) -> pd.DataFrame:
+    rng = np.random.default_rng(0)
+    return pd.DataFrame(
+        {
+            "latitude": rng.uniform(47.9, 48.1, num_rows),
+            "longitude": rng.uniform(0.1, 0.3, num_rows),
+            "prix_m2": rng.uniform(1000, 4000, num_rows),
+        }
+    )
+
+
+def test_build_replaces_previous_pyramid(tmp_path):
+    output_dir = tmp_path / "maison" / "median_prix_m2"
+    TileBuilder(make_transactions()).build(output_dir, "median_prix_m2")
+    stale_tile = output_dir / str(MAX_ZOOM) / "stale.png"
+    stale_tile.write_bytes(b"")
+    previous_tile = stale_tile.resolve()
+
+    metadata = TileBuilder(make_transactions()).build(output_dir, "median_prix_m2")
+
+    assert json.loads((output_dir / "meta.json").read_text()) == metadata
+    assert sorted(int(path.name) for path in output_dir.iterdir() if path.is_dir()) == list(
+        range(MIN_ZOOM, MAX_ZOOM + 1)
+    )
+    assert not stale_tile.exists()
+    # The pyramid links to the new build, the previous one is kept for the requests which resolved it
+    assert output_dir.is_symlink()
+    assert len(list(output_dir.parent.iterdir())) == 3
+    assert previous_tile.exists()
+
+    TileBuilder(make_transactions()).build(output_dir, "median_prix_m2")
+    assert not previous_tile.exists()
+    assert len(list(output_dir.parent.iterdir())) == 3
+
+
+def test_pyramid_is_never_missing(tmp_path, monkeypatch):
+    output_dir = tmp_path / "density"
+    TileBuilder(make_transactions()).build(output_dir, "density")
+    build_pyramid = TileBuilder._build_pyramid
+    seen = []
+
+    def record_output_dir(self, build_dir, layer):
+        metadata = build_pyramid(self, build_dir, layer)
+        seen.append((output_dir / "meta.json").exists())
+        return metadata
+
+    def fail(self, build_dir, layer):
+        raise RuntimeError("disk full")
+
+    monkeypatch.setattr(TileBuilder, "_build_pyramid", record_output_dir)
+    TileBuilder(make_transactions()).build(output_dir, "density")
+    assert seen == [True]
+    assert (output_dir / "meta.json").exists()
+
+    # A failed build leaves the current pyramid untouched
+    current = output_dir.resolve()
+    monkeypatch.setattr(TileBuilder, "_build_pyramid", fail)
+    with pytest.raises(RuntimeError):
+        TileBuilder(make_transactions()).build(output_dir, "density")
+    assert output_dir.resolve() == current
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_build_replaces_unversioned_pyramid(tmp_path):
+    output_dir = tmp_path / "density"
+    (output_dir / str(MAX_ZOOM)).mkdir(parents=True)
+
+    TileBuilder(make_transactions()).build(output_dir, "density")
+    TileBuilder(make_transactions()).build(output_dir, "density")
+
+    assert output_dir.is_symlink()
+    assert (output_dir / "meta.json").exists()
+    assert len(list(tmp_path.iterdir())) == 3
+
+
+def test_build_empty_partition(tmp_path):
+    output_dir = tmp_path / "density"
+    metadata = TileBuilder(make_transactions(0)).build(output_dir, "density")
+
+    assert metadata["bounds"] is None
+    assert (output_dir / "meta.json").exists()
@@ -0,0 +1,50 @@
+"""Tests for the data transformation module."""
+
+import numpy as np
+import pandas as pd
+
+from src.core.data.transforms import HISTOGRAM_BINS, KDE_POINTS, compute_price_histogram, format_postal_code
+
+
+def test_format_postal_code():
+    postal_codes = pd.Series(["1000", "72000.0", "2000", "75001"])
+    assert format_postal_code(postal_codes).tolist() == ["01000", "72000", "02000", "75001"]
+
+
+def test_price_histogram_matches_numpy():
+    rng = np.random.default_rng(3)
+    values = np.concatenate([rng.lognormal(8, 0.4, 10_000), [np.nan, np.inf]])
+    finite = values[np.isfinite(values)]
+
+    histogram = compute_price_histogram(values)
+
+    expected_counts, expected_edges = np.histogram(finite, bins=HISTOGRAM_BINS)
+    np.testing.assert_array_equal(histogram["counts"], expected_counts)
+    np.testing.assert_array_equal(histogram["edges"], expected_edges)
+    assert histogram["count"] == len(finite) == histogram["counts"].sum()
+    assert histogram["mean"] == finite.mean()
+    assert histogram["median"] == np.median(finite)
+
+
+def test_price_histogram_density_is_scaled_to_the_counts():
+    rng = np.random.default_rng(4)
+    values = rng.normal(3_000, 400, 60_000)
+
+    histogram = compute_price_histogram(values)
+
+    assert len(histogram["kde_x"]) == len(histogram["kde_y"]) == KDE_POINTS
+    # Scaled to transactions per bin: the curve follows the tops of the bars
+    bin_width = histogram["edges"][1] - histogram["edges"][0]
+    area = np.trapezoid(histogram["kde_y"], histogram["kde_x"]) / bin_width
+    assert abs(area - len(values)) / len(values) < 0.02
+    peak_bin = histogram["counts"].max()
+    assert abs(histogram["kde_y"].max() - peak_bin) / peak_bin < 0.1
+
+
+def test_price_histogram_degenerate_inputs():
+    assert compute_price_histogram(np.array([])) is None
+    assert compute_price_histogram(np.array([np.nan, np.nan])) is None
+
+    histogram = compute_price_histogram(np.full(10, 2_500.0))
+    assert histogram["counts"].sum() == 10
+    assert not histogram["kde_y"].any()